@@ -0,0 +1,122 @@
+"""Frames per second of the compositing backends of the CPU renderer.
+
+Composites a full-frame video with a few text overlays with every backend,
+reports their throughput and how far their output is from the PIL backend.
+
+run command: python -m benchmarks.bench_compositor
+"""
+
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from composery import Timeline
+from composery.components import Position, Text, Video
+from composery.reader import free
+from composery.renderer.cpu import CPURenderer
+from composery.renderer.options import CompositorBackend, VideoWriterOptions
+
+from .media import make_video
+
+WIDTH = 1920
+HEIGHT = 1080
+FRAMERATE = 30
+DURATION = 4
+
+
+def build_timeline(source: str) -> Timeline:
+    components = [
+        Video(
+            source=source,
+            start_at=0,
+            duration=DURATION,
+            width=WIDTH,
+            height=HEIGHT,
+            allow_audio=False,
+        ),
+        Text(content="Subscribe!", start_at=0, duration=DURATION, z_index=1),
+        Text(
+            content="Speaker name",
+            start_at=1,
+            duration=DURATION - 1,
+            z_index=2,
+            position=Position(x="left", y="bottom"),
+        ),
+    ]
+    timeline = Timeline()
+    timeline.add_composition(components).with_duration(DURATION).with_framerate(
+        FRAMERATE
+    ).with_resolution(WIDTH, HEIGHT).build()
+    return timeline
+
+
+def create_renderer(backend: CompositorBackend, timeline: Timeline) -> CPURenderer:
+    renderer = CPURenderer(
+        os.devnull,
+        WIDTH,
+        HEIGHT,
+        DURATION,
+        FRAMERATE,
+        VideoWriterOptions(frame_cache_size=0),
+        compositor=backend,
+    )
+    renderer.timeline = timeline
+    return renderer
+
+
+def measure(backend: CompositorBackend, timeline: Timeline) -> float:
+    """Get the frames per second of a backend, up to the yuv420p encoder input"""
+    renderer = create_renderer(backend, timeline)
+    start = perf_counter()
+    frames = sum(
+        1 for frame in renderer.iter_frames() if frame.reformat(format="yuv420p")
+    )
+    elapsed = perf_counter() - start
+    free()
+    return frames / elapsed
+
+
+def compare(backend: CompositorBackend, timeline: Timeline) -> tuple[int, float]:
+    """Get the max and mean difference with the PIL backend
+
+    Frames are compared in yuv420p, the pixel format the encoder receives.
+    """
+    reference = create_renderer(CompositorBackend.PIL, timeline)
+    renderer = create_renderer(backend, timeline)
+    max_difference, total_difference, frames = 0, 0.0, 0
+    for frame, expected in zip(renderer.iter_frames(), reference.iter_frames()):
+        difference = np.abs(
+            frame.reformat(format="yuv420p").to_ndarray().astype(np.int16)
+            - expected.reformat(format="yuv420p").to_ndarray()
+        )
+        max_difference = max(max_difference, int(difference.max()))
+        total_difference += float(difference.mean())
+        frames += 1
+    free()
+    return max_difference, total_difference / frames
+
+
+def main() -> None:
+    with TemporaryDirectory() as directory:
+        source = make_video(
+            os.path.join(directory, "source.mp4"),
+            WIDTH,
+            HEIGHT,
+            FRAMERATE,
+            DURATION,
+            audio=False,
+        )
+        timeline = build_timeline(source)
+        for backend in CompositorBackend:
+            fps = measure(backend, timeline)
+            max_difference, mean_difference = compare(backend, timeline)
+            print(
+                f"{backend.value:>8}: {fps:7.2f} fps, difference with pil: "
+                f"max {max_difference}, mean {mean_difference:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
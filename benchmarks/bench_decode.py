@@ -0,0 +1,82 @@
+"""Decode throughput of 4K sources with each decoder threading.
+
+Decodes every frame of 4K H.264 and HEVC sources through the readers with
+each thread type, and reports the frames per second and the speedup over a
+single threaded decoder. The gain depends on the number of cores.
+
+run command: python -m benchmarks.bench_decode
+"""
+
+import argparse
+import os
+import tempfile
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from composery.reader import open_reader, set_decoder_threading
+
+from .media import get_video
+
+WIDTH = 3840
+HEIGHT = 2160
+FRAMERATE = 24
+
+# (thread type, thread count)
+THREADINGS: List[Tuple[str, int]] = [
+    ("NONE", 1),
+    ("SLICE", 0),
+    ("FRAME", 0),
+    ("AUTO", 0),
+]
+
+
+def decode(path: str) -> Tuple[int, float]:
+    """Decode every frame of a source
+
+    Returns:
+        Tuple[int, float]: The number of frames and the wall time
+    """
+    container = open_reader(path, "video")
+    try:
+        start_time = perf_counter()
+        frames = sum(1 for _ in container.decode(video=0))
+        return frames, perf_counter() - start_time
+    finally:
+        container.close()
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=int, default=4)
+    parser.add_argument(
+        "--media-dir",
+        default=os.path.join(tempfile.gettempdir(), "composery-bench"),
+    )
+    args = parser.parse_args(arguments)
+
+    os.makedirs(args.media_dir, exist_ok=True)
+    print(f"{os.cpu_count()} cores")
+    for codec in ("libx264", "libx265"):
+        source = get_video(
+            args.media_dir,
+            WIDTH,
+            HEIGHT,
+            FRAMERATE,
+            args.duration,
+            codec=codec,
+            audio=False,
+        )
+        single_fps = None
+        for thread_type, thread_count in THREADINGS:
+            set_decoder_threading(thread_type, thread_count)
+            frames, wall_time = decode(source)
+            fps = frames / wall_time
+            single_fps = single_fps or fps
+            print(
+                f"{codec:<8} {thread_type:<6} threads={thread_count or 'auto':<5}"
+                f"{fps:8.2f} fps {fps / single_fps:6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Per-frame cost of looking up the active components of a composition.
+
+Compares the linear scan over `Composition.components` with the
+`ComponentIndex` built by `CompositionBuilder.build()` for subtitle-heavy
+compositions of growing size.
+
+run command: python -m benchmarks.bench_index
+"""
+
+from time import perf_counter
+
+from composery import Timeline
+from composery.components import Text
+
+FRAMERATE = 24
+SUBTITLE_DURATION = 2
+COMPONENT_COUNTS = [10, 100, 1_000, 10_000]
+SAMPLED_FRAMES = 2_000
+
+
+def build_timeline(count: int) -> Timeline:
+    duration = count * SUBTITLE_DURATION
+    subtitles = [
+        Text(
+            content=f"Subtitle {i}",
+            start_at=i * SUBTITLE_DURATION,
+            duration=SUBTITLE_DURATION,
+            z_index=1,
+        )
+        for i in range(count)
+    ]
+    timeline = Timeline()
+    timeline.add_composition(subtitles).with_duration(duration).with_framerate(
+        FRAMERATE
+    ).with_resolution(1920, 1080).build()
+    return timeline
+
+
+def linear_scan(timeline: Timeline, time: float) -> list:
+    return [
+        component
+        for component in timeline.composition.components
+        if component.start_at <= time <= component.end_at
+    ]
+
+
+def indexed(timeline: Timeline, time: float) -> tuple:
+    return timeline.composition.index.at(time)
+
+
+def measure(lookup, timeline: Timeline) -> float:
+    """Get the mean lookup time per frame in microseconds"""
+    total_frames = timeline.composition.duration * FRAMERATE
+    step = max(total_frames // SAMPLED_FRAMES, 1)
+    frames = range(0, total_frames, step)
+    start = perf_counter()
+    for frame_number in frames:
+        lookup(timeline, frame_number / FRAMERATE)
+    return (perf_counter() - start) / len(frames) * 1e6
+
+
+def main() -> None:
+    print(f"{'components':>10} {'scan us/frame':>14} {'index us/frame':>15}")
+    for count in COMPONENT_COUNTS:
+        timeline = build_timeline(count)
+        scan = measure(linear_scan, timeline)
+        index = measure(indexed, timeline)
+        print(f"{count:>10} {scan:>14.2f} {index:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
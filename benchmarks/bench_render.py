@@ -0,0 +1,304 @@
+"""End to end rendering benchmarks over a matrix of scenarios.
+
+Generates its source media locally with PyAV, renders every scenario in a
+fresh process and records the frames per second, the realtime factor, the
+peak resident memory and the time of each render stage as JSON. The fps of
+every scenario is compared to a stored baseline, and the run fails when one
+is slower than the baseline by more than the tolerance.
+
+The baseline depends on the machine, so it is not versioned: save one with
+`--save-baseline` before a change, then run again to compare.
+
+run command: python -m benchmarks.bench_render
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from composery import Timeline
+from composery.components import Position, Text, Video
+from composery.components.audio import Audio
+from composery.components.component import Component
+from composery.renderer.options import Preset, VideoWriterOptions
+
+from .media import get_tone, get_video
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_MEDIA_DIRECTORY = os.path.join(tempfile.gettempdir(), "composery-bench")
+
+RESOLUTIONS = {
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+POSITIONS = [Position(x=x, y=y) for y in ("top", "bottom") for x in ("left", "right")]
+
+
+@dataclass
+class Scenario:
+    """A timeline to render, built from the media directory.
+
+    `build` is a module level function, so that scenarios can be sent to
+    the process rendering them.
+    """
+
+    name: str
+    resolution: str
+    duration: int
+    build: Callable[[str, "Scenario"], List[Component]]
+    framerate: int = 24
+    # The number of subtitles, videos or tones of the scenario
+    count: int = 1
+    # The options of the source videos, see `media.get_video`
+    source: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return RESOLUTIONS[self.resolution]
+
+    def get_video(self, directory: str, audio: bool = False) -> str:
+        width, height = self.size
+        return get_video(
+            directory,
+            width,
+            height,
+            self.framerate,
+            self.duration,
+            audio=audio,
+            **self.source,
+        )
+
+
+def single_video(directory: str, scenario: Scenario) -> List[Component]:
+    width, height = scenario.size
+    return [
+        Video(
+            source=scenario.get_video(directory, audio=True),
+            start_at=0,
+            duration=scenario.duration,
+            width=width,
+            height=height,
+        )
+    ]
+
+
+def with_subtitles(directory: str, scenario: Scenario) -> List[Component]:
+    """A video with `count` subtitles shown one after the other"""
+    step = scenario.duration / scenario.count
+    return single_video(directory, scenario) + [
+        Text(
+            content=f"Subtitle number {index}",
+            start_at=index * step,
+            duration=step,
+            z_index=1,
+            position=Position(x="center", y="bottom"),
+        )
+        for index in range(scenario.count)
+    ]
+
+
+def overlapping_videos(directory: str, scenario: Scenario) -> List[Component]:
+    """A background video with `count - 1` smaller videos over it"""
+    width, height = scenario.size
+    # A quarter of the canvas, generated at that size
+    overlay_size = (width // 8 * 2, height // 8 * 2)
+    source = get_video(
+        directory, *overlay_size, scenario.framerate, scenario.duration, audio=False
+    )
+    return single_video(directory, scenario) + [
+        Video(
+            source=source,
+            start_at=0,
+            duration=scenario.duration,
+            width=overlay_size[0],
+            height=overlay_size[1],
+            z_index=index + 1,
+            position=POSITIONS[index % len(POSITIONS)],
+            allow_audio=False,
+        )
+        for index in range(scenario.count - 1)
+    ]
+
+
+def audio_heavy(directory: str, scenario: Scenario) -> List[Component]:
+    """A video with `count` overlapping tones of different pitches"""
+    step = scenario.duration / scenario.count
+    return single_video(directory, scenario) + [
+        Audio(
+            source=get_tone(directory, scenario.duration, 220 + 20 * index),
+            start_at=index * step / 2,
+            end_at=scenario.duration,
+            duration=scenario.duration - index * step / 2,
+            volume=1 / scenario.count,
+        )
+        for index in range(scenario.count)
+    ]
+
+
+def get_scenarios(quick: bool) -> List[Scenario]:
+    duration = 2 if quick else 10
+    long_duration = 4 if quick else 120
+    scenarios = [
+        Scenario(f"single_video_{name}", name, duration, single_video)
+        for name in RESOLUTIONS
+    ]
+    scenarios += [
+        Scenario(
+            f"single_video_720p_{codec}_gop{gop_size}",
+            "720p",
+            duration,
+            single_video,
+            source={"codec": codec, "gop_size": gop_size},
+        )
+        for codec in ("libx264", "libx265", "libvpx-vp9", "mpeg4")
+        for gop_size in (12, 250)
+    ]
+    scenarios += [
+        Scenario(f"subtitles_{count}", "720p", duration, with_subtitles, count=count)
+        for count in (10, 100)
+    ]
+    scenarios += [
+        Scenario(
+            f"overlapping_videos_{count}",
+            "720p",
+            duration,
+            overlapping_videos,
+            count=count,
+        )
+        for count in (4, 16)
+    ]
+    scenarios.append(
+        Scenario("long_duration_480p", "480p", long_duration, single_video)
+    )
+    scenarios.append(
+        Scenario("audio_heavy_24", "480p", duration, audio_heavy, count=24)
+    )
+    return scenarios
+
+
+def run_scenario(
+    scenario: Scenario, directory: str, options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Render a scenario, in its own process so the peak memory is its own"""
+    width, height = scenario.size
+    timeline = Timeline()
+    timeline.add_composition(scenario.build(directory, scenario)).with_duration(
+        scenario.duration
+    ).with_framerate(scenario.framerate).with_resolution(width, height).build()
+    writer_options = VideoWriterOptions(
+        width=width, height=height, framerate=scenario.framerate, **options
+    )
+    start_time = perf_counter()
+    render_stats = timeline.render(os.devnull, options=writer_options)
+    wall_time = perf_counter() - start_time
+    frames = scenario.duration * scenario.framerate
+    return {
+        "frames": frames,
+        "duration": scenario.duration,
+        "wall_time": wall_time,
+        "fps": frames / wall_time,
+        "realtime_factor": scenario.duration / wall_time,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": {
+            stage: values["time"]
+            for stage, values in render_stats.to_dict()["stages"].items()
+        },
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """Print the fps of every scenario against the baseline
+
+    Returns:
+        List[str]: The scenarios slower than the baseline beyond the tolerance
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<36} {result['fps']:8.2f} fps   (no baseline)")
+            continue
+        change = result["fps"] / baseline[name]["fps"] - 1
+        regressed = change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<36} {result['fps']:8.2f} fps   "
+            f"baseline {baseline[name]['fps']:8.2f}   {change:+7.1%}"
+            f"{'   REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Short durations")
+    parser.add_argument("--scenario", action="append", help="Only run these")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--media-dir", default=DEFAULT_MEDIA_DIRECTORY)
+    parser.add_argument(
+        "--preset", default=Preset.ultrafast.value, choices=[p.value for p in Preset]
+    )
+    args = parser.parse_args(arguments)
+
+    os.makedirs(args.media_dir, exist_ok=True)
+    scenarios = [
+        scenario
+        for scenario in get_scenarios(args.quick)
+        if not args.scenario or scenario.name in args.scenario
+    ]
+    options = {"preset": args.preset}
+    results: Dict[str, Dict[str, Any]] = {}
+    # A fresh process for every scenario isolates its peak memory and caches
+    context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(
+                run_scenario, scenario, args.media_dir, options
+            ).result()
+        results[scenario.name] = result
+        print(
+            f"{scenario.name:<36} {result['fps']:8.2f} fps "
+            f"{result['realtime_factor']:6.2f}x realtime "
+            f"{result['peak_rss_mib']:8.1f} MiB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, save one with --save-baseline")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    print()
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} scenarios regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Synthetic test media generated locally with PyAV."""
+
+import os
+
+import numpy as np
+from av import AudioFrame, VideoFrame
+from av import open as av_open
+from av.audio.stream import AudioStream
+from av.container import OutputContainer
+
+
+def make_video(
+    path: str,
+    width: int = 1280,
+    height: int = 720,
+    framerate: int = 24,
+    duration: int = 10,
+    codec: str = "libx264",
+    gop_size: int = 48,
+    audio: bool = True,
+) -> str:
+    """Write a moving test pattern with an optional sine tone
+
+    Args:
+        path (str): The output path
+        width (int): The width of the video
+        height (int): The height of the video
+        framerate (int): The framerate of the video
+        duration (int): The duration in seconds
+        codec (str): The video codec
+        gop_size (int): The distance between keyframes
+        audio (bool): Whether to add a 440hz stereo tone
+
+    Returns:
+        str: The output path
+    """
+    with av_open(path, "w", format="mp4") as container:
+        video_stream = container.add_stream(codec, rate=framerate)
+        video_stream.width = width
+        video_stream.height = height
+        video_stream.pix_fmt = "yuv420p"
+        video_stream.codec_context.gop_size = gop_size
+        audio_stream = container.add_stream("aac", rate=44100) if audio else None
+        columns = np.arange(width, dtype=np.uint16)[None, :]
+        rows = np.arange(height, dtype=np.uint16)[:, None]
+        for index in range(duration * framerate):
+            image = np.empty((height, width, 3), dtype=np.uint8)
+            image[..., 0] = (columns + index * 4) % 256
+            image[..., 1] = (rows + index * 2) % 256
+            image[..., 2] = (index * 7) % 256
+            frame = VideoFrame.from_ndarray(image, format="rgb24")
+            frame.pts = index
+            container.mux(video_stream.encode(frame))
+        container.mux(video_stream.encode(None))
+
+        if audio_stream is not None:
+            write_tone(container, audio_stream, duration)
+    return path
+
+
+def make_tone(
+    path: str, duration: int = 10, frequency: float = 440, sample_rate: int = 44100
+) -> str:
+    """Write an AAC stereo sine tone without video
+
+    Returns:
+        str: The output path
+    """
+    with av_open(path, "w", format="mp4") as container:
+        audio_stream = container.add_stream("aac", rate=sample_rate)
+        write_tone(container, audio_stream, duration, frequency)
+    return path
+
+
+def get_video(
+    directory: str,
+    width: int = 1280,
+    height: int = 720,
+    framerate: int = 24,
+    duration: int = 10,
+    codec: str = "libx264",
+    gop_size: int = 48,
+    audio: bool = True,
+) -> str:
+    """Get a test video of the media directory, writing it on first use
+
+    The files are named after their parameters, so a kept directory makes
+    later runs skip the generation.
+    """
+    name = f"{width}x{height}-{framerate}fps-{duration}s-{codec}-gop{gop_size}"
+    path = os.path.join(directory, f"{name}{'-audio' if audio else ''}.mp4")
+    if not os.path.exists(path):
+        make_video(
+            path + ".tmp", width, height, framerate, duration, codec, gop_size, audio
+        )
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def get_tone(directory: str, duration: int = 10, frequency: float = 440) -> str:
+    """Get a test tone of the media directory, writing it on first use"""
+    path = os.path.join(directory, f"tone-{frequency:g}hz-{duration}s.m4a")
+    if not os.path.exists(path):
+        make_tone(path + ".tmp", duration, frequency)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def write_tone(
+    container: OutputContainer,
+    audio_stream: AudioStream,
+    duration: float,
+    frequency: float = 440,
+) -> None:
+    """Encode a stereo sine tone"""
+    sample_rate = audio_stream.rate
+    samples = 1024
+    for index in range(int(duration * sample_rate) // samples):
+        time = (np.arange(samples) + index * samples) / sample_rate
+        tone = (0.3 * np.sin(2 * np.pi * frequency * time)).astype(np.float32)
+        frame = AudioFrame.from_ndarray(
+            np.stack([tone, tone]), format="fltp", layout="stereo"
+        )
+        frame.sample_rate = sample_rate
+        frame.pts = index * samples
+        container.mux(audio_stream.encode(frame))
+    container.mux(audio_stream.encode(None))
@@ -2,7 +2,13 @@ from typing import Callable, Literal, Optional, TypeVar, cast
 
 from fastnanoid import generate
 from PIL import Image, ImageDraw
-from pydantic import BaseModel, Field, ValidationInfo, computed_field, field_validator
+from pydantic import (
+    BaseModel,
+    Field,
+    computed_field,
+    field_validator,
+    model_validator,
+)
 
 TComponent = TypeVar("TComponent", bound="Component")
 
@@ -93,20 +99,14 @@ class Component(BaseModel):
         description="The styles of the component",
     )
 
-    @field_validator("end_at", mode="before")
-    def validate_end_at(cls, value: float, info: ValidationInfo) -> float:
-
-        if value == -1:
-            start_at = info.data.get("start_at", 0)
-            if value < start_at:
-                raise ValueError("end_at must be greater than start_at")
-            return value
-        # in case valeu is none, return the duration value
-        duration = info.data.get("duration")
-        assert (
-            duration is not None
-        ), "duration must be provided if end_at is not provided"
-        return duration
+    @model_validator(mode="after")
+    def validate_end_at(self) -> "Component":
+        # A component without an explicit end lasts for its whole duration
+        if self.end_at is None or self.end_at == -1:
+            self.end_at = self.start_at + self.duration
+        elif self.end_at < self.start_at:
+            raise ValueError("end_at must be greater than start_at")
+        return self
 
     def get_frame_at_time(self) -> Callable[[int], None]:
         raise NotImplementedError("get_frame_at_time method must be implemented")
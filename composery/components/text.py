@@ -1,6 +1,7 @@
 import platform
 from os import path
-from typing import Literal
+from threading import Lock
+from typing import Dict, Literal, Tuple, Union
 
 from PIL import Image, ImageFont
 from pilmoji import Pilmoji, getsize
@@ -10,6 +11,29 @@ from .component import Component, Styles
 
 system = platform.system()
 
+Font = Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]
+
+# (font path, size) -> font, shared by every text of the process
+FONTS: Dict[Tuple[str, int], Font] = {}
+_FONTS_LOCK = Lock()
+
+
+def get_font(font_path: str, size: int) -> Font:
+    """Get a font, loading it only once per process.
+
+    Falls back to the default font of PIL when the font cannot be loaded.
+    """
+    key = (font_path, size)
+    with _FONTS_LOCK:
+        font = FONTS.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(font_path, size)
+            except IOError:
+                font = ImageFont.load_default()
+            FONTS[key] = font
+        return font
+
 
 class TextStyle(Styles):
     text_align: Literal["left", "center", "right"] = Field(
@@ -66,14 +90,7 @@ class Text(Component):
         text_style: TextStyle,
     ):
 
-        try:
-            font = ImageFont.truetype(
-                text_style.font_path,
-                text_style.font_size,
-            )
-        except IOError:
-            font = ImageFont.load_default()
-
+        font = get_font(text_style.font_path, text_style.font_size)
         width, height = getsize(content.strip(), font=font)
         offset = text_style.font_size // 2
         image = Image.new(
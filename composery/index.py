@@ -0,0 +1,129 @@
+from bisect import bisect_right
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+
+class Interval(Protocol):
+    """Anything shown from a start time to an end time at a z-index"""
+
+    @property
+    def start_at(self) -> float: ...
+
+    @property
+    def end_at(self) -> float: ...
+
+    @property
+    def z_index(self) -> int: ...
+
+
+T = TypeVar("T", bound=Interval)
+
+
+class ComponentIndex(Generic[T]):
+    """A sweep-line index of the components active at a given time.
+
+    The timeline is split at every component start and end. For each
+    boundary the index stores the components active exactly at that time,
+    and the ones active in the open span up to the next boundary, both
+    already in z-order. A lookup is then a binary search instead of a scan
+    over every component of the composition. The components are stored
+    by their rank in z-order, which also holds once the index is pickled.
+    """
+
+    __slots__ = (
+        "components",
+        "boundaries",
+        "_at_boundary",
+        "_after_boundary",
+    )
+
+    def __init__(self, components: Sequence[T]):
+        # A stable sort keeps the insertion order for equal z-indexes
+        self.components: Tuple[T, ...] = tuple(
+            sorted(components, key=lambda component: component.z_index)
+        )
+        self.boundaries: List[float] = sorted(
+            {component.start_at for component in self.components}
+            | {component.end_at for component in self.components}
+        )
+        # The ranks of the active components, in z-order
+        self._at_boundary: List[Tuple[int, ...]] = []
+        self._after_boundary: List[Tuple[int, ...]] = []
+        self._build()
+
+    def _build(self) -> None:
+        starts: Dict[float, List[int]] = {}
+        ends: Dict[float, List[int]] = {}
+        for rank, component in enumerate(self.components):
+            starts.setdefault(component.start_at, []).append(rank)
+            ends.setdefault(component.end_at, []).append(rank)
+
+        active: Set[int] = set()
+        for boundary in self.boundaries:
+            active.update(starts.get(boundary, ()))
+            self._at_boundary.append(tuple(sorted(active)))
+            # Components are active up to and including their end time
+            active.difference_update(ends.get(boundary, ()))
+            self._after_boundary.append(tuple(sorted(active)))
+
+    def _z_ordered(self, ranks: Iterable[int]) -> Tuple[T, ...]:
+        return tuple(self.components[rank] for rank in ranks)
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def at(self, time: float) -> Tuple[T, ...]:
+        """Get the components active at a time
+
+        Args:
+            time (float): The time in seconds
+
+        Returns:
+            Tuple[T, ...]: The active components in z-order
+        """
+        return self._z_ordered(self._ranks_at(time))
+
+    def _ranks_at(self, time: float) -> Tuple[int, ...]:
+        index = bisect_right(self.boundaries, time) - 1
+        if index < 0:
+            return ()
+        if self.boundaries[index] == time:
+            return self._at_boundary[index]
+        return self._after_boundary[index]
+
+    def between(self, start: float, end: float) -> Tuple[T, ...]:
+        """Get the components active at any time of a range
+
+        Args:
+            start (float): The start of the range in seconds
+            end (float): The end of the range in seconds, inclusive
+
+        Returns:
+            Tuple[T, ...]: The active components in z-order
+        """
+        assert start <= end, "start must be lower or equal to end"
+        first = max(bisect_right(self.boundaries, start) - 1, 0)
+        last = bisect_right(self.boundaries, end)
+        found = set(self._ranks_at(start))
+        for index in range(first, last):
+            if self.boundaries[index] >= start:
+                found.update(self._at_boundary[index])
+            if self.boundaries[index] < end:
+                found.update(self._after_boundary[index])
+        return self._z_ordered(sorted(found))
+
+    def between_frames(
+        self, start_frame: int, end_frame: int, framerate: int
+    ) -> Tuple[T, ...]:
+        """Get the components active in a range of frames, end exclusive"""
+        assert end_frame > start_frame, "end_frame must be greater than start_frame"
+        return self.between(start_frame / framerate, (end_frame - 1) / framerate)
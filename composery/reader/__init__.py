@@ -1,11 +1,63 @@
 from threading import get_ident
-from typing import Dict, Literal
+from typing import TYPE_CHECKING, Dict, Literal, Set, Tuple
 
 from av import open as av_open
 from av.container import InputContainer
 
+from .decoder import free_cursors
+from .pcm import free_pcm
+from .scaler import free_scalers
+
+if TYPE_CHECKING:
+    from .video import VideoReader
+
 READERS: Dict[str, InputContainer] = {}
 
+# The video readers of the layers with open containers, see `VideoReader`
+VIDEO_READERS: Set["VideoReader"] = set()
+
+# (thread type, thread count) of the video decoders of the readers opened
+# from now on, a count of 0 lets FFmpeg pick one from the number of cores
+DECODER_THREADING: Tuple[str, int] = ("AUTO", 0)
+
+
+def set_decoder_threading(thread_type: str, thread_count: int) -> None:
+    """Set the threading of the video decoders.
+
+    The threading of a decoder can not change once it decoded a frame, so it
+    applies to the readers opened next and to those that did not decode yet.
+
+    Args:
+        thread_type (str): "AUTO", "FRAME", "SLICE" or "NONE"
+        thread_count (int): The number of threads, 0 picks it automatically
+    """
+    assert thread_type in ("AUTO", "FRAME", "SLICE", "NONE"), "Invalid thread type"
+    assert thread_count >= 0, "Thread count must be greater or equal to 0"
+    global DECODER_THREADING
+    DECODER_THREADING = (thread_type, thread_count)
+    for container in READERS.values():
+        set_threading(container)
+    for video_reader in VIDEO_READERS:
+        for container in video_reader.containers:
+            set_threading(container)
+
+
+def set_threading(container: InputContainer) -> None:
+    if not container.streams.video:
+        return
+    codec_context = container.streams.video[0].codec_context
+    if codec_context.is_open:
+        return
+    codec_context.thread_type, codec_context.thread_count = DECODER_THREADING
+
+
+def open_reader(path: str, mode: Literal["video", "audio"]) -> InputContainer:
+    """Open a source, with the decoder threading of its video stream set"""
+    container = av_open(path, "r")
+    if mode == "video":
+        set_threading(container)
+    return container
+
 
 def get_reader_id(path: str, mode: Literal["video", "audio"]) -> str:
     """Get the reader id for a given path and mode
@@ -21,12 +73,18 @@ def get_reader_id(path: str, mode: Literal["video", "audio"]) -> str:
     thread_id = get_ident()
     reader_id = f"{path}-{mode}-{thread_id}"
     if reader_id not in READERS:
-        READERS[reader_id] = av_open(path, "r")
+        READERS[reader_id] = open_reader(path, mode)
     return reader_id
 
 
 def free() -> None:
     """Free all readers."""
+    free_cursors()
+    free_pcm()
+    free_scalers()
     for reader in READERS.values():
         reader.close()
     READERS.clear()
+    for video_reader in VIDEO_READERS:
+        video_reader.close()
+    VIDEO_READERS.clear()
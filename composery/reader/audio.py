@@ -4,7 +4,7 @@ import av
 from av.container import InputContainer
 
 from . import READERS, get_reader_id
-from .decoder import get_frame_time
+from .decoder import seek_frame
 
 
 def seek_audio_frame(container: InputContainer, time: float) -> Optional[av.AudioFrame]:
@@ -14,14 +14,11 @@ def seek_audio_frame(container: InputContainer, time: float) -> Optional[av.Audi
         time: The time in seconds
     """
     audio_stream = container.streams.audio[0]
-    assert audio_stream.time_base
-
-    try:
-        for frame in container.decode(audio_stream):
-            if get_frame_time(frame, audio_stream) >= time:
-                return frame
-    except:
-        return
+    frame = seek_frame(container, audio_stream, time)
+    assert (
+        isinstance(frame, av.AudioFrame) or frame is None
+    ), "Frame is not an AudioFrame instance"
+    return frame
 
 
 def get_audio_frame_from_video(video_path: str, time: float) -> Optional[av.AudioFrame]:
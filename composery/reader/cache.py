@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from math import ceil
+from threading import Lock
+from typing import Optional, Tuple
+
+from av.video.frame import VideoFrame
+from av.video.stream import VideoStream
+
+from composery import stats
+
+from . import scaler
+from .decoder import DecodeCursor, seek_cursor, time_to_pts
+
+# (width, height)
+FrameSize = Tuple[int, int]
+
+# (source, stream index, pts, target size, pixel format, interpolation)
+FrameKey = Tuple[str, int, int, FrameSize, str, str]
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def get_frame_size(frame: VideoFrame) -> int:
+    """Get the number of bytes held by the planes of a frame"""
+    return sum(plane.buffer_size for plane in frame.planes)
+
+
+class FrameCache:
+    """A thread safe LRU cache of decoded video frames with a byte budget.
+
+    The cache is shared by every reader of the process, so components that
+    reference the same source, and consecutive renders of the same
+    template, only decode each frame once.
+    """
+
+    __slots__ = ("max_size", "size", "hits", "misses", "_frames", "_lock")
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames: OrderedDict[FrameKey, Tuple[VideoFrame, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, key: FrameKey) -> Optional[VideoFrame]:
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: FrameKey, frame: VideoFrame) -> None:
+        frame_size = get_frame_size(frame)
+        if frame_size > self.max_size:
+            return
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._frames[key] = (frame, frame_size)
+            self.size += frame_size
+            self._evict()
+
+    def resize(self, max_size: int) -> None:
+        """Change the byte budget, evicting frames if needed"""
+        assert max_size >= 0, "Cache size must be greater or equal to 0"
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self) -> None:
+        while self.size > self.max_size and self._frames:
+            _, (_, frame_size) = self._frames.popitem(last=False)
+            self.size -= frame_size
+
+
+FRAME_CACHE = FrameCache()
+
+
+def get_frame_pts(stream: VideoStream, time: float) -> int:
+    """Get the pts of the frame shown at a time, snapped to the frame grid
+
+    Times between two frames of a constant frame rate stream are snapped up
+    to the next frame, the one the cursor decodes for them, so they share
+    its cache entry. Streams without an average rate keep the exact pts.
+    """
+    pts = time_to_pts(time, stream)
+    if not stream.average_rate:
+        return pts
+    assert stream.time_base, "Stream does not have a time_base"
+    start_time = stream.start_time or 0
+    # The duration of a frame, in ticks of the stream
+    ticks = 1 / (stream.average_rate * stream.time_base)
+    return start_time + round(ceil((pts - start_time) / ticks) * ticks)
+
+
+def decode_frame(
+    cursor: DecodeCursor,
+    time: float,
+    size: Optional[FrameSize] = None,
+    format: Optional[str] = None,
+) -> Optional[VideoFrame]:
+    """Decode the frame at a time, scaled and converted when asked"""
+    with stats.timer("decode"):
+        frame = seek_cursor(cursor, time)
+    assert isinstance(frame, VideoFrame) or frame is None
+    if frame is None or (size is None and format is None):
+        return frame
+    return scaler.scale_frame(
+        frame, size or (frame.width, frame.height), format or frame.format.name
+    )
+
+
+def read_frame(
+    source: str,
+    cursor: DecodeCursor,
+    time: float,
+    size: Optional[FrameSize] = None,
+    format: Optional[str] = None,
+) -> Optional[VideoFrame]:
+    """Get a frame from the cache, decoding and caching it on a miss.
+
+    Args:
+        source (str): The path of the video source
+        cursor (DecodeCursor): The cursor of the video stream to decode from
+            on a miss
+        time (float): The time in seconds
+        size (Optional[FrameSize]): The size to scale the frame to
+        format (Optional[str]): The pixel format to convert the frame to
+
+    Returns:
+        Optional[VideoFrame]: The frame or None if the stream ended. Frames
+        of each size and format are cached apart
+    """
+    if not FRAME_CACHE.max_size:
+        return decode_frame(cursor, time, size, format)
+
+    stream = cursor.stream
+    assert isinstance(stream, VideoStream), "Cursor is not on a video stream"
+    key: FrameKey = (
+        source,
+        stream.index,
+        get_frame_pts(stream, time),
+        size or (stream.width, stream.height),
+        format or stream.format.name,
+        scaler.INTERPOLATION,
+    )
+    frame = FRAME_CACHE.get(key)
+    if frame is not None:
+        return frame
+    frame = decode_frame(cursor, time, size, format)
+    if frame is not None:
+        FRAME_CACHE.put(key, frame)
+    return frame
@@ -1,5 +1,4 @@
-from logging import getLogger
-from typing import Optional, Union
+from typing import Dict, Iterator, Optional, Tuple, Union
 
 from av.audio.frame import AudioFrame
 from av.audio.stream import AudioStream
@@ -8,24 +7,153 @@ from av.subtitles.subtitle import SubtitleSet
 from av.video.frame import VideoFrame
 from av.video.stream import VideoStream
 
+from composery import stats
 from composery.logger import logger
 
+Frame = Union[AudioFrame, VideoFrame]
+Stream = Union[AudioStream, VideoStream]
+
+# Forward jumps longer than this (in seconds) are resolved with a keyframe
+# seek instead of decoding every frame in between.
+SEEK_THRESHOLD = 2.0
+
+
+def time_to_pts(time: float, stream: Stream) -> int:
+    """Convert a time in seconds to a pts in the stream time base.
 
-def get_frame_time(
-    frame: Union[AudioFrame, VideoFrame], stream: Union[AudioStream, VideoStream]
-) -> float:
-    """Get the time of a frame in milliseconds.
     Args:
-        frame (av.AudioFrame): The audio frame
-        video_stream (av.Video
+        time (float): The time in seconds, relative to the start of the stream
+        stream: The stream object
+
+    Returns:
+        int: The pts in stream time_base ticks
+    """
+    assert stream.time_base, "Stream does not have a time_base"
+    start_time = stream.start_time or 0
+    return start_time + round(time / stream.time_base)
+
+
+def get_frame_time(frame: Frame, stream: Stream) -> float:
+    """Get the time of a frame in seconds, relative to the start of the stream.
+
+    Args:
+        frame (Frame): The audio or video frame
+        stream (Stream): The stream the frame was decoded from
     """
     assert frame.pts is not None, "Frame does not have a pts"
-    return float(frame.pts or 1 / stream.frames)
+    assert stream.time_base, "Stream does not have a time_base"
+    start_time = stream.start_time or 0
+    return float((frame.pts - start_time) * stream.time_base)
+
+
+class DecodeCursor:
+    """A forward decode cursor over a single stream of a container.
+
+    The cursor remembers the last frame it returned, so consecutive requests
+    only decode the frames in between. Backward jumps and forward jumps
+    longer than `seek_threshold` seconds seek to the nearest keyframe before
+    the target and decode from there.
+    """
+
+    __slots__ = (
+        "container",
+        "stream",
+        "seek_threshold",
+        "frame",
+        "previous_pts",
+        "_frames",
+    )
+
+    def __init__(
+        self,
+        container: InputContainer,
+        stream: Stream,
+        seek_threshold: float = SEEK_THRESHOLD,
+    ):
+        self.container = container
+        self.stream = stream
+        self.seek_threshold = seek_threshold
+        self.frame: Optional[Frame] = None
+        # pts of the frame decoded before `frame`, None when unknown
+        self.previous_pts: Optional[int] = None
+        self._frames: Optional[Iterator[Frame]] = None
+
+    def seek(self, time: float) -> Optional[Frame]:
+        """Get the first frame presented at or after `time`.
+
+        Args:
+            time (float): The time in seconds
+
+        Returns:
+            Optional[Frame]: The frame or None if the stream ended
+        """
+        target = time_to_pts(time, self.stream)
+        frame = self.frame
+        if frame is not None and frame.pts is not None:
+            if frame.pts == target or (
+                frame.pts > target
+                and self.previous_pts is not None
+                and self.previous_pts < target
+            ):
+                return frame
+            jump = float((target - frame.pts) * self.stream.time_base)
+            if jump < 0 or jump > self.seek_threshold:
+                self._seek_keyframe(target)
+        elif self._frames is None and target > time_to_pts(
+            self.seek_threshold, self.stream
+        ):
+            self._seek_keyframe(target)
+        return self._decode_until(target)
+
+    def _seek_keyframe(self, target: int) -> None:
+        with stats.timer("seek"):
+            self.container.seek(
+                target, backward=True, any_frame=False, stream=self.stream
+            )
+        self.frame = None
+        self.previous_pts = None
+        self._frames = None
+
+    def _decode_until(self, target: int) -> Optional[Frame]:
+        if self._frames is None:
+            self._frames = self.container.decode(self.stream)
+        for frame in self._frames:
+            assert not isinstance(frame, SubtitleSet)
+            if frame.pts is None:
+                continue
+            if self.frame is not None:
+                self.previous_pts = self.frame.pts
+            self.frame = frame
+            if frame.pts >= target:
+                return frame
+        return
+
+
+CURSORS: Dict[Tuple[int, int], DecodeCursor] = {}
+
+
+def get_cursor(container: InputContainer, stream: Stream) -> DecodeCursor:
+    """Get the decode cursor of a container stream, creating it if needed.
+
+    Args:
+        container (InputContainer): The av.container object
+        stream (Stream): The stream object
+
+    Returns:
+        DecodeCursor: The cursor
+    """
+    key = (id(container), stream.index)
+    cursor = CURSORS.get(key)
+    # The cursor holds a reference to its container, so the id can only be
+    # reused by a different container after the cursor has been freed.
+    if cursor is None or cursor.container is not container:
+        cursor = CURSORS[key] = DecodeCursor(container, stream)
+    return cursor
 
 
 def seek_frame(
-    container: InputContainer, stream: Union[AudioStream, VideoStream], time: float
-) -> Optional[Union[AudioFrame, VideoFrame]]:
+    container: InputContainer, stream: Stream, time: float
+) -> Optional[Frame]:
     """Seek to a frame in a video file.
     Args:
         container (av.container): The av.container object
@@ -33,14 +161,32 @@ def seek_frame(
         time: The time in seconds
     """
 
+    return seek_cursor(get_cursor(container, stream), time)
+
+
+def seek_cursor(cursor: DecodeCursor, time: float) -> Optional[Frame]:
+    """Seek a decode cursor to a frame, None if the stream ended or failed
+
+    Args:
+        cursor (DecodeCursor): The cursor of the stream
+        time (float): The time in seconds
+    """
     try:
-        for frame in container.decode(stream):
-            assert not isinstance(frame, SubtitleSet)
-            if get_frame_time(frame, stream) - time >= 0:
-                return frame
+        return cursor.seek(time)
     except Exception as error:
         logger.error(f"Error seeking frame: {error}")
         return
 
 
-__all__ = ["seek_frame", "get_frame_time"]
+def free_cursors() -> None:
+    """Free all decode cursors."""
+    CURSORS.clear()
+
+
+__all__ = [
+    "seek_frame",
+    "seek_cursor",
+    "get_frame_time",
+    "time_to_pts",
+    "DecodeCursor",
+]
@@ -0,0 +1,147 @@
+import os
+from hashlib import blake2b
+from tempfile import NamedTemporaryFile, gettempdir
+from typing import BinaryIO, Dict, Optional, Tuple
+
+import numpy as np
+from av import open as av_open
+from av import time_base as AV_TIME_BASE
+from av.audio.layout import AudioLayout
+from av.audio.resampler import AudioResampler
+
+DEFAULT_PCM_DIRECTORY = os.path.join(gettempdir(), "composery-pcm")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (content hash, sample rate, layout, cache directory) -> (samples, channels)
+# float32 memory map
+PCM_CACHE: Dict[Tuple[str, int, str, str], np.ndarray] = {}
+
+# (absolute path, size, modification time) -> content hash
+CONTENT_HASHES: Dict[Tuple[str, int, int], str] = {}
+
+
+def get_content_hash(path: str) -> str:
+    """Get the hash of the content of a file.
+
+    The hash is remembered for as long as the size and modification time of
+    the file do not change, so each file is only read once per process.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    content_hash = CONTENT_HASHES.get(key)
+    if content_hash is None:
+        digest = blake2b(digest_size=16)
+        with open(path, "rb") as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        content_hash = CONTENT_HASHES[key] = digest.hexdigest()
+    return content_hash
+
+
+def decode_pcm(path: str, sample_rate: int, layout: str, output: BinaryIO) -> None:
+    """Decode the first audio stream of a source as interleaved float32 samples
+
+    The first sample is the start of the source, so the audio stream is
+    offset with silence when it starts after the other streams.
+
+    Args:
+        path (str): The path to the source
+        sample_rate (int): The sample rate to resample to
+        layout (str): The channel layout to remix to
+        output (BinaryIO): The file the samples are written to
+    """
+    with av_open(path, "r") as container:
+        if not container.streams.audio:
+            return
+        stream = container.streams.audio[0]
+        assert stream.time_base, "Stream does not have a time_base"
+        start_time = (stream.start_time or 0) * stream.time_base - (
+            container.start_time or 0
+        ) / AV_TIME_BASE
+        offset = round(start_time * sample_rate)
+        if offset > 0:
+            channels = AudioLayout(layout).nb_channels
+            output.write(np.zeros((offset, channels), dtype=np.float32).tobytes())
+        resampler = AudioResampler(format="flt", layout=layout, rate=sample_rate)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                output.write(resampled.to_ndarray().tobytes())
+        for resampled in resampler.resample(None):
+            output.write(resampled.to_ndarray().tobytes())
+
+
+def get_pcm(
+    path: str, sample_rate: int, layout: str, directory: Optional[str] = None
+) -> np.ndarray:
+    """Get the decoded samples of the audio of a source.
+
+    The source is decoded once and its samples are written to a file of the
+    cache directory named after the hash of its content, so every process
+    that uses the same source, at the same sample rate and layout, maps the
+    same file instead of decoding it again.
+
+    Args:
+        path (str): The path to the source
+        sample_rate (int): The sample rate of the samples
+        layout (str): The channel layout of the samples
+        directory (Optional[str]): The cache directory, defaults to
+            `DEFAULT_PCM_DIRECTORY`
+
+    Returns:
+        np.ndarray: The read only (samples, channels) float32 memory map,
+        empty if the source does not have audio
+    """
+    directory = directory or DEFAULT_PCM_DIRECTORY
+    content_hash = get_content_hash(path)
+    key = (content_hash, sample_rate, layout, directory)
+    pcm = PCM_CACHE.get(key)
+    if pcm is not None:
+        return pcm
+    filename = os.path.join(directory, f"{content_hash}-{sample_rate}-{layout}.f32")
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed, so concurrent renders never map a
+        # partially written file
+        with NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as output:
+            try:
+                decode_pcm(path, sample_rate, layout, output)
+            except BaseException:
+                output.close()
+                os.remove(output.name)
+                raise
+        os.replace(output.name, filename)
+    channels = AudioLayout(layout).nb_channels
+    if os.path.getsize(filename) == 0:
+        pcm = np.zeros((0, channels), dtype=np.float32)
+    else:
+        pcm = np.memmap(filename, dtype=np.float32, mode="r").reshape(-1, channels)
+    PCM_CACHE[key] = pcm
+    return pcm
+
+
+def read_pcm(pcm: np.ndarray, start: int, count: int) -> np.ndarray:
+    """Read a range of samples.
+
+    Args:
+        pcm (np.ndarray): The (samples, channels) samples from `get_pcm`
+        start (int): The index of the first sample
+        count (int): The number of samples
+
+    Returns:
+        np.ndarray: The (channels, count) samples, a view of the memory map
+        when the range is inside of the source, or a copy padded with
+        silence when it is not
+    """
+    if start >= 0 and start + count <= len(pcm):
+        return pcm[start : start + count].T
+    samples = np.zeros((pcm.shape[1], count), dtype=np.float32)
+    first, last = max(start, 0), min(start + count, len(pcm))
+    if first < last:
+        samples[:, first - start : last - start] = pcm[first:last].T
+    return samples
+
+
+def free_pcm() -> None:
+    """Unmap the decoded samples, the cache files are kept"""
+    PCM_CACHE.clear()
@@ -0,0 +1,147 @@
+from queue import Empty, Full, Queue
+from threading import Event
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from av.video.frame import VideoFrame
+
+from composery import stats
+from composery.logger import logger
+
+from .cache import FrameSize, read_frame
+
+if TYPE_CHECKING:
+    from .video import VideoReader
+
+# (time, size, pixel format) of a frame requested by the renderer, see
+# `read_frame`
+FrameRequest = Tuple[float, Optional[FrameSize], Optional[str]]
+
+PREFETCHERS: Dict["VideoReader", "FramePrefetcher"] = {}
+
+_DONE = None
+
+
+class FramePrefetcher:
+    """Decodes the frames of a video reader ahead of the renderer.
+
+    The prefetcher runs a decoder thread, with the cursor of the reader for
+    that thread, that walks `schedule`, the exact sequence of frames the
+    renderer will request from the reader, and pushes the decoded frames
+    into a bounded queue. When decoding fails, the error is logged and the
+    renderer decodes the remaining frames itself.
+    """
+
+    __slots__ = ("reader", "schedule", "queue", "_stop", "_thread")
+
+    def __init__(self, reader: "VideoReader", schedule: List[FrameRequest], depth: int):
+        assert depth > 0, "Prefetch depth must be greater than 0"
+        self.reader = reader
+        self.schedule = schedule
+        self.queue: Queue[Optional[Tuple[FrameRequest, Optional[VideoFrame]]]] = Queue(
+            maxsize=depth
+        )
+        self._stop = Event()
+        self._thread = stats.thread(self._run, f"prefetch-{reader.path}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def get(self, request: FrameRequest) -> Tuple[bool, Optional[VideoFrame]]:
+        """Get the next scheduled frame.
+
+        Args:
+            request (FrameRequest): The frame the renderer is requesting
+
+        Returns:
+            Tuple[bool, Optional[VideoFrame]]: Whether the frame was prefetched
+            and the frame itself
+        """
+        item = self.queue.get()
+        if item is _DONE:
+            self.queue.put(_DONE)
+            return False, None
+        scheduled_request, frame = item
+        if scheduled_request != request:
+            logger.warning(
+                f"Prefetch schedule mismatch for {self.reader.path}: "
+                f"expected {scheduled_request}, got {request}"
+            )
+            return False, None
+        return True, frame
+
+    def _put(self, item: Optional[Tuple[FrameRequest, Optional[VideoFrame]]]) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        try:
+            cursor = self.reader.cursor()
+            for request in self.schedule:
+                frame = read_frame(self.reader.path, cursor, *request)
+                if not self._put((request, frame)):
+                    return
+        except Exception as error:
+            logger.error(f"Error prefetching frames of {self.reader.path}: {error}")
+        finally:
+            self._put(_DONE)
+
+
+def start(schedules: Dict["VideoReader", List[FrameRequest]], depth: int) -> None:
+    """Start a prefetcher for each video reader.
+
+    Args:
+        schedules (Dict[VideoReader, List[FrameRequest]]): The frames that
+            will be requested from each reader, in request order
+        depth (int): The number of frames to decode ahead per reader
+    """
+    for reader, schedule in schedules.items():
+        if not schedule or reader in PREFETCHERS:
+            continue
+        prefetcher = FramePrefetcher(reader, schedule, depth)
+        PREFETCHERS[reader] = prefetcher
+        prefetcher.start()
+
+
+def get(
+    reader: "VideoReader", request: FrameRequest
+) -> Tuple[bool, Optional[VideoFrame]]:
+    """Get a prefetched frame, if the reader has a prefetcher.
+
+    A prefetcher whose schedule no longer matches the requests is stopped,
+    and the caller should decode the frame itself.
+    """
+    prefetcher = PREFETCHERS.get(reader)
+    if prefetcher is None:
+        return False, None
+    with stats.timer("prefetch_wait"):
+        found, frame = prefetcher.get(request)
+    if not found:
+        PREFETCHERS.pop(reader, None)
+        _drain(prefetcher)
+    return found, frame
+
+
+def _drain(prefetcher: FramePrefetcher) -> None:
+    prefetcher._stop.set()
+    while True:
+        try:
+            prefetcher.queue.get_nowait()
+        except Empty:
+            break
+    prefetcher.stop()
+
+
+def stop() -> None:
+    """Stop all prefetchers."""
+    for prefetcher in PREFETCHERS.values():
+        _drain(prefetcher)
+    PREFETCHERS.clear()
@@ -0,0 +1,60 @@
+from threading import get_ident
+from typing import Dict, Tuple
+
+from av.video.frame import VideoFrame
+from av.video.reformatter import VideoReformatter
+
+from composery import stats
+
+# (thread id, source width, source height, source format, width, height, format)
+ScalerKey = Tuple[int, int, int, str, int, int, str]
+
+# The reformatters keep their libswscale context between frames of the same
+# geometry. They are not thread safe, so each thread has its own
+SCALERS: Dict[ScalerKey, VideoReformatter] = {}
+
+# The interpolation of the frames scaled from now on
+INTERPOLATION = "BILINEAR"
+
+
+def set_interpolation(interpolation: str) -> None:
+    """Set the interpolation used to scale the video frames
+
+    Args:
+        interpolation (str): The name of a libswscale interpolation, for
+            instance "BILINEAR", "BICUBIC", "AREA" or "LANCZOS"
+    """
+    global INTERPOLATION
+    INTERPOLATION = interpolation
+
+
+def scale_frame(frame: VideoFrame, size: Tuple[int, int], format: str) -> VideoFrame:
+    """Scale a frame and convert its pixel format in a single libswscale pass
+
+    Args:
+        frame (VideoFrame): The decoded frame
+        size (Tuple[int, int]): The width and height to scale to
+        format (str): The pixel format to convert to
+
+    Returns:
+        VideoFrame: The frame itself when it already has the size and format
+    """
+    source_format = frame.format.name
+    if (frame.width, frame.height) == size and source_format == format:
+        return frame
+    key = (get_ident(), frame.width, frame.height, source_format, *size, format)
+    scaler = SCALERS.get(key)
+    if scaler is None:
+        scaler = SCALERS[key] = VideoReformatter()
+    with stats.timer("scale"):
+        return scaler.reformat(
+            frame,
+            width=size[0],
+            height=size[1],
+            format=format,
+            interpolation=INTERPOLATION,
+        )
+
+
+def free_scalers() -> None:
+    SCALERS.clear()
@@ -1,17 +1,85 @@
-from typing import Optional, cast
+from threading import get_ident
+from typing import Dict, List, Optional, cast
 
+from av import open as av_open
+from av.container import InputContainer
 from av.video.frame import VideoFrame
 
-from . import READERS, get_reader_id
-from .decoder import seek_frame
+from . import READERS, VIDEO_READERS, get_reader_id, open_reader, prefetch
+from .cache import FrameSize, read_frame
+from .decoder import DecodeCursor, get_cursor
 
 
-def get_frame_from_video(video_path: str, time: float) -> Optional[VideoFrame]:
+class VideoReader:
+    """Reads the frames of a video source for a single layer.
+
+    Each reader decodes with a cursor of its own per thread, on a container
+    of its own, so layers that show the same source at different times do
+    not seek the cursor of one another. The decoded frames are still shared
+    through the frame cache. The containers are opened on the first read
+    and closed by `free`, after which they are opened again when needed.
+    """
+
+    __slots__ = ("path", "_cursors")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cursors: Dict[int, DecodeCursor] = {}
+
+    @property
+    def containers(self) -> List[InputContainer]:
+        return [cursor.container for cursor in self._cursors.values()]
+
+    def cursor(self) -> DecodeCursor:
+        """Get the cursor of the calling thread, opening its container if needed"""
+        thread_id = get_ident()
+        cursor = self._cursors.get(thread_id)
+        if cursor is None:
+            container = open_reader(self.path, "video")
+            cursor = DecodeCursor(container, container.streams.video[0])
+            self._cursors[thread_id] = cursor
+            VIDEO_READERS.add(self)
+        return cursor
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """The width and height of the source, probed with the reader's cursor"""
+        stream = self.cursor().stream
+        return (stream.width, stream.height)
+
+    def read(
+        self,
+        time: float,
+        size: Optional[FrameSize] = None,
+        format: Optional[str] = None,
+    ) -> Optional[VideoFrame]:
+        """Get the frame at a time, see `get_frame_from_video`"""
+        prefetched, frame = prefetch.get(self, (time, size, format))
+        if prefetched:
+            return frame
+        return read_frame(self.path, self.cursor(), time, size, format)
+
+    def close(self) -> None:
+        for cursor in self._cursors.values():
+            cursor.container.close()
+        self._cursors.clear()
+
+
+def get_frame_from_video(
+    video_path: str,
+    time: float,
+    size: Optional[FrameSize] = None,
+    format: Optional[str] = None,
+) -> Optional[VideoFrame]:
     """Get a frame from a video file.
 
     Args:
         video_path (str): The path to the video file
-        frame_index (int): The frame number
+        time (float): The time of the frame in seconds
+        size (Optional[FrameSize]): The size to scale the frame to, the
+            size of the video when not given
+        format (Optional[str]): The pixel format to convert the frame to, the
+            format of the video when not given
 
     Returns:
         Image.Image: The frame image
@@ -19,23 +87,22 @@ def get_frame_from_video(video_path: str, time: float) -> Optional[VideoFrame]:
         IndexError: If the frame number is out of bounds
     """
     reader_id = get_reader_id(video_path, mode="video")
-    video_stream = READERS[reader_id].streams.video[0]
-    frame = seek_frame(READERS[reader_id], video_stream, time)
-    assert (
-        isinstance(frame, VideoFrame) or frame is None
-    ), "Frame is not a VideoFrame instance"
-    return frame
+    container = READERS[reader_id]
+    cursor = get_cursor(container, container.streams.video[0])
+    return read_frame(video_path, cursor, time, size, format)
 
 
 def get_video_size(video_path: str) -> tuple[int, int]:
     """Get the size of a video file.
 
+    The file is only probed, it is not kept open as a reader.
+
     Args:
         video_path (str): The path to the video file
 
     Returns:
         tuple[int, int]: The width and height of the video
     """
-    reader_id = get_reader_id(video_path, mode="video")
-    video_stream = READERS[reader_id].streams.video[0]
-    return cast(tuple[int, int], (video_stream.width, video_stream.height))
+    with av_open(video_path, "r") as container:
+        video_stream = container.streams.video[0]
+        return cast(tuple[int, int], (video_stream.width, video_stream.height))
@@ -0,0 +1,234 @@
+from contextlib import ExitStack
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from av.audio.stream import AudioStream
+from av.container import OutputContainer
+from av.video.stream import VideoStream
+
+from composery import stats
+from composery.components import Text
+from composery.logger import logger
+from composery.reader.prefetch import FrameRequest
+from composery.reader.video import VideoReader
+from composery.renderer import stream
+from composery.renderer.cpu import CPURenderer, reading, recording
+from composery.renderer.options import VideoWriterOptions, resolve_draft
+from composery.renderer.output import Output, open_output
+from composery.renderer.pipeline import FrameItem, encode_item
+from composery.stats import ProgressCallback, RenderStats
+from composery.timeline import Timeline
+
+
+def iter_steps(
+    items: Iterable[FrameItem], video_stream: VideoStream
+) -> Iterator[List[FrameItem]]:
+    """Group the items of an output so that each group ends with a video frame"""
+    step: List[FrameItem] = []
+    for item in items:
+        step.append(item)
+        if item[0] is video_stream:
+            yield step
+            step = []
+    if step:
+        yield step
+
+
+class BatchOutput:
+    """The renderer, container and encoders of a timeline of a batch"""
+
+    __slots__ = ("renderer", "container", "steps", "streams")
+
+    def __init__(
+        self,
+        renderer: CPURenderer,
+        container: OutputContainer,
+        steps: Iterator[List[FrameItem]],
+        streams: Sequence[Union[VideoStream, AudioStream]],
+    ):
+        self.renderer = renderer
+        self.container = container
+        self.steps = steps
+        self.streams = streams
+
+    def write_step(self) -> bool:
+        """Encode and mux the items up to the next video frame
+
+        Returns:
+            bool: False when the output is complete
+        """
+        step = next(self.steps, None)
+        if step is None:
+            return False
+        for item in step:
+            packets = encode_item(item)
+            with stats.timer("mux"):
+                self.container.mux(packets)
+        return True
+
+    def flush(self) -> None:
+        for output_stream in self.streams:
+            with stats.timer("encode"):
+                packets = output_stream.encode(None)
+            with stats.timer("mux"):
+                self.container.mux(packets)
+
+
+class BatchRenderer:
+    """Renders timelines that share their video sources in a single pass.
+
+    The timelines are rendered in groups of `batch_size`, each with its own
+    canvas, encoders and output. The outputs of a group advance in lockstep,
+    one video frame each per step, so a source frame is decoded by the
+    first timeline that draws it and read from the frame cache by the
+    others. The renderers of a group are created for it and freed after it,
+    so memory is bounded by the size of the groups and the budget of the
+    frame cache, whatever the number of timelines.
+
+    The frames of each output are encoded on the render thread, the render
+    pipeline and smart rendering are not used.
+    """
+
+    __slots__ = ("options", "progress", "total_frames")
+
+    def __init__(self, options: VideoWriterOptions):
+        self.options = options
+        self.progress: Optional[ProgressCallback] = None
+        self.total_frames = 0
+
+    def render(
+        self,
+        timelines: Sequence[Timeline],
+        filenames: Sequence[Output],
+        progress: Optional[ProgressCallback] = None,
+    ) -> RenderStats:
+        """Render every timeline to its output
+
+        Args:
+            timelines (Sequence[Timeline]): The timelines to render
+            filenames (Sequence[Output]): The output of each timeline
+            progress (Optional[ProgressCallback]): Called after every step
+                with the frames done over all the timelines, their total
+                frames and the frames per second
+
+        Returns:
+            RenderStats: The time spent in each stage and the counters of
+                the whole batch
+        """
+        assert len(timelines) == len(filenames), "Every timeline needs an output"
+        if not self.options.frame_cache_size:
+            logger.warning("Batch render without frame cache decodes every frame again")
+        self.progress = progress
+        self.total_frames = sum(
+            self.get_total_frames(timeline) for timeline in timelines
+        )
+        batch_size = self.options.batch_size
+        with recording(self.options.trace) as render_stats:
+            for start in range(0, len(timelines), batch_size):
+                self.render_group(
+                    timelines[start : start + batch_size],
+                    filenames[start : start + batch_size],
+                )
+        return render_stats
+
+    def get_total_frames(self, timeline: Timeline) -> int:
+        """Get the number of frames of a timeline, at the framerate of drafts"""
+        composition = timeline.composition
+        framerate = resolve_draft(
+            self.options, composition.width, composition.height, composition.framerate
+        )[3]
+        return composition.duration * framerate
+
+    def create_renderer(self, timeline: Timeline, filename: Output) -> CPURenderer:
+        composition = timeline.composition
+        renderer = CPURenderer(
+            filename,
+            composition.width,
+            composition.height,
+            composition.duration,
+            composition.framerate,
+            self.options,
+        )
+        renderer.timeline = timeline
+        return renderer
+
+    def render_group(
+        self, timelines: Sequence[Timeline], filenames: Sequence[Output]
+    ) -> None:
+        """Render timelines together, decoding their shared frames once"""
+        renderers = [
+            self.create_renderer(timeline, filename)
+            for timeline, filename in zip(timelines, filenames)
+        ]
+        try:
+            with reading(
+                self.options,
+                lambda: get_texts(renderers),
+                lambda: frame_schedule(renderers),
+            ), ExitStack() as stack:
+                outputs = [self.open_output(renderer, stack) for renderer in renderers]
+                active = outputs
+                while active:
+                    active = [output for output in active if output.write_step()]
+                    if self.progress is not None:
+                        frames_done = stats.get_stats().counters.get("frames", 0)
+                        self.progress(
+                            frames_done,
+                            self.total_frames,
+                            frames_done / stats.get_stats().wall_time,
+                        )
+                for output in outputs:
+                    output.flush()
+            stats.count(
+                "reused_frames", sum(renderer.reused_frames for renderer in renderers)
+            )
+        finally:
+            for renderer in renderers:
+                renderer.compositor.free()
+
+    def open_output(self, renderer: CPURenderer, stack: ExitStack) -> BatchOutput:
+        """Open the output of a renderer and its streams, closed with the stack"""
+        container = stack.enter_context(
+            open_output(renderer.output_filename, renderer.options)
+        )
+        video_stream = stream.create_stream(VideoStream, container, renderer.options)
+        audio_stream, audio_items, encoded = stack.enter_context(
+            renderer.audio_output(container)
+        )
+        items = renderer.iter_interleaved_items(video_stream, audio_stream, audio_items)
+        return BatchOutput(
+            renderer,
+            container,
+            iter_steps(items, video_stream),
+            (video_stream, audio_stream) if encoded else (video_stream,),
+        )
+
+
+def get_texts(renderers: Sequence[CPURenderer]) -> List[Text]:
+    return [
+        text
+        for renderer in renderers
+        for text in renderer.get_texts([(0, renderer.total_frames)])
+    ]
+
+
+def frame_schedule(
+    renderers: Sequence[CPURenderer],
+) -> Dict[VideoReader, List[FrameRequest]]:
+    """Get the frames requested from each video reader, in lockstep order
+
+    The readers of the other timelines that request the same frames as a
+    reader read them from the frame cache once it prefetched them, so they
+    get no prefetcher.
+    """
+    schedule: Dict[VideoReader, List[FrameRequest]] = {}
+    total_frames = max(renderer.total_frames for renderer in renderers)
+    for frame_number in range(total_frames):
+        for renderer in renderers:
+            if frame_number >= renderer.total_frames:
+                continue
+            for reader, request in renderer.get_frame_requests(frame_number):
+                schedule.setdefault(reader, []).append(request)
+    readers: Dict[Tuple[str, Tuple[FrameRequest, ...]], VideoReader] = {}
+    for reader, requests in schedule.items():
+        readers.setdefault((reader.path, tuple(requests)), reader)
+    return {reader: schedule[reader] for reader in readers.values()}
@@ -0,0 +1,358 @@
+from typing import Callable, Dict, Generic, Iterator, Optional, Tuple, TypeVar
+
+import numpy as np
+from av.video.frame import VideoFrame
+from PIL import Image
+
+from composery.renderer.options import CompositorBackend
+
+Slices = Tuple[slice, slice]
+
+T = TypeVar("T")
+
+
+def clip_box(
+    canvas_size: tuple[int, int], size: tuple[int, int], position: tuple[int, int]
+) -> Optional[Tuple[Slices, Slices]]:
+    """Clip a box placed at a position to the canvas
+
+    Args:
+        canvas_size (tuple[int, int]): The width and height of the canvas
+        size (tuple[int, int]): The width and height of the box
+        position (tuple[int, int]): The top left corner of the box
+
+    Returns:
+        Optional[Tuple[Slices, Slices]]: The (rows, columns) slices of the
+        canvas and of the box, or None if the box is outside of the canvas
+    """
+    x, y = position
+    left, top = max(x, 0), max(y, 0)
+    right = min(x + size[0], canvas_size[0])
+    bottom = min(y + size[1], canvas_size[1])
+    if left >= right or top >= bottom:
+        return
+    return (
+        (slice(top, bottom), slice(left, right)),
+        (slice(top - y, bottom - y), slice(left - x, right - x)),
+    )
+
+
+def blend(
+    canvas: np.ndarray, target: Slices, color: np.ndarray, inverse_alpha: np.ndarray
+) -> None:
+    """Blend premultiplied color into a region of the canvas, in place
+
+    Args:
+        canvas (np.ndarray): The uint8 canvas
+        target (Slices): The region of the canvas
+        color (np.ndarray): The uint16 color premultiplied by alpha
+        inverse_alpha (np.ndarray): The uint16 255 - alpha
+    """
+    blended = canvas[target] * inverse_alpha
+    blended += color
+    # Same as PIL: (v + 128 + ((v + 128) >> 8)) >> 8 approximates v / 255
+    blended += 128
+    blended += blended >> 8
+    blended >>= 8
+    canvas[target] = blended
+
+
+class Compositor:
+    """Composites the layers of a frame, bottom to top"""
+
+    __slots__ = ("width", "height")
+
+    # The pixel format video frames are converted to when decoded, so the
+    # conversion is done once per frame with the scaling
+    video_format = "rgb24"
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    def begin(self) -> None:
+        """Start a new frame from a blank canvas"""
+        raise NotImplementedError("begin method must be implemented")
+
+    def draw_video(self, frame: VideoFrame, position: tuple[int, int]) -> None:
+        """Draw an opaque video frame"""
+        raise NotImplementedError("draw_video method must be implemented")
+
+    def draw_image(self, image: Image.Image, position: tuple[int, int]) -> None:
+        """Draw an RGBA image using its alpha channel as mask"""
+        raise NotImplementedError("draw_image method must be implemented")
+
+    def finish(self) -> VideoFrame:
+        """Get the composited frame"""
+        raise NotImplementedError("finish method must be implemented")
+
+    def free(self) -> None:
+        """Free the cached resources of the compositor"""
+
+
+class PILCompositor(Compositor):
+    """Composites each frame on a new PIL image"""
+
+    __slots__ = ("frame",)
+
+    def begin(self) -> None:
+        self.frame = Image.new("RGB", self.size)
+
+    def draw_video(self, frame: VideoFrame, position: tuple[int, int]) -> None:
+        self.frame.paste(frame.to_image(), position)
+
+    def draw_image(self, image: Image.Image, position: tuple[int, int]) -> None:
+        self.frame.paste(image, position, mask=image)
+
+    def finish(self) -> VideoFrame:
+        return VideoFrame.from_image(self.frame)
+
+
+def get_rgb_pixels(frame: VideoFrame) -> np.ndarray:
+    """Get the pixels of a frame as a (height, width, 3) RGB array
+
+    Frames already in rgb24, like the frames scaled for the compositor, are
+    viewed without a copy.
+    """
+    if frame.format.name != "rgb24":
+        return frame.to_ndarray(format="rgb24")
+    plane = frame.planes[0]
+    pixels = np.frombuffer(plane, dtype=np.uint8).reshape(frame.height, -1)
+    return pixels[:, : frame.width * 3].reshape(frame.height, frame.width, 3)
+
+
+class OverlayCache(Generic[T]):
+    """The converted overlays of the frame being drawn and of the previous one.
+
+    An overlay drawn on consecutive frames, like a caption over a video, is
+    converted once. Overlays not drawn on a frame are dropped, so the cache
+    does not grow with the number of images drawn over a render.
+    """
+
+    __slots__ = ("_previous", "_current")
+
+    def __init__(self):
+        # id of the image: (image, overlay)
+        self._previous: Dict[int, Tuple[Image.Image, T]] = {}
+        self._current: Dict[int, Tuple[Image.Image, T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._previous.keys() | self._current.keys())
+
+    def begin(self) -> None:
+        """Start a new frame, dropping the overlays not drawn on the last one"""
+        self._previous, self._current = self._current, {}
+
+    def get(self, image: Image.Image, convert: Callable[[Image.Image], T]) -> T:
+        """Get the overlay of an image, converting it if not cached"""
+        key = id(image)
+        entry = self._current.get(key) or self._previous.get(key)
+        # The image reference keeps the id from being reused by another image
+        if entry is None or entry[0] is not image:
+            entry = (image, convert(image))
+        self._current[key] = entry
+        return entry[1]
+
+    def clear(self) -> None:
+        self._previous.clear()
+        self._current.clear()
+
+
+# (premultiplied color, inverse alpha)
+Overlay = Tuple[np.ndarray, np.ndarray]
+
+
+def to_overlay(image: Image.Image) -> Overlay:
+    """Convert an RGBA image to the arrays blended by the NumPy compositor"""
+    pixels = np.asarray(image.convert("RGBA"), dtype=np.uint16)
+    alpha = pixels[..., 3:]
+    return pixels[..., :3] * alpha, 255 - alpha
+
+
+class NumpyCompositor(Compositor):
+    """Composites in place on a single preallocated RGB canvas.
+
+    RGBA overlays are converted once to premultiplied color and inverse
+    alpha arrays and blended with the same rounding as PIL, so the output
+    matches the PIL backend pixel for pixel.
+    """
+
+    __slots__ = ("canvas", "_overlays")
+
+    def __init__(self, width: int, height: int):
+        super().__init__(width, height)
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self._overlays: OverlayCache[Overlay] = OverlayCache()
+
+    def begin(self) -> None:
+        self.canvas.fill(0)
+        self._overlays.begin()
+
+    def draw_video(self, frame: VideoFrame, position: tuple[int, int]) -> None:
+        box = clip_box(self.size, (frame.width, frame.height), position)
+        if box is None:
+            return
+        target, source = box
+        self.canvas[target] = get_rgb_pixels(frame)[source]
+
+    def draw_image(self, image: Image.Image, position: tuple[int, int]) -> None:
+        box = clip_box(self.size, image.size, position)
+        if box is None:
+            return
+        target, source = box
+        color, inverse_alpha = self._overlays.get(image, to_overlay)
+        blend(self.canvas, target, color[source], inverse_alpha[source])
+
+    def finish(self) -> VideoFrame:
+        return VideoFrame.from_ndarray(self.canvas, format="rgb24")
+
+    def free(self) -> None:
+        self._overlays.clear()
+
+
+def get_plane(frame: VideoFrame, index: int) -> np.ndarray:
+    """Get a plane of a frame as a 2D array view, without the line padding"""
+    plane = frame.planes[index]
+    pixels = np.frombuffer(plane, dtype=np.uint8)
+    return pixels.reshape(plane.height, plane.line_size)[:, : plane.width]
+
+
+def rgba_to_yuva420p(pixels: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Convert RGBA pixels to BT.601 limited range premultiplied YUV 4:2:0
+
+    Chroma is averaged over each 2x2 block after premultiplying it by alpha,
+    so transparent pixels do not bleed their color into the edges.
+
+    Args:
+        pixels (np.ndarray): The (height, width, 4) uint8 pixels, with even
+            height and width
+
+    Returns:
+        Tuple[np.ndarray, ...]: The (color, inverse alpha) uint16 pairs of the
+        Y, U and V planes
+    """
+    rgba = pixels.astype(np.float32)
+    rgb, alpha = rgba[..., :3], rgba[..., 3]
+    luma = 16 + rgb @ np.array([65.481, 128.553, 24.966], np.float32) / 255
+    blue = 128 + rgb @ np.array([-37.797, -74.203, 112.0], np.float32) / 255
+    red = 128 + rgb @ np.array([112.0, -93.786, -18.214], np.float32) / 255
+
+    def subsample(values: np.ndarray) -> np.ndarray:
+        height, width = values.shape
+        return values.reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3))
+
+    chroma_alpha = subsample(alpha)
+    planes = [(np.rint(np.rint(luma) * alpha), 255 - alpha)]
+    for chroma in (blue, red):
+        planes.append((np.rint(subsample(chroma * alpha)), np.rint(255 - chroma_alpha)))
+    return tuple(plane.astype(np.uint16) for pair in planes for plane in pair)
+
+
+# (premultiplied Y, inverse alpha Y, ... U, ... V)
+YUVOverlay = Tuple[np.ndarray, ...]
+
+
+def to_yuv_overlay(image: Image.Image) -> YUVOverlay:
+    """Convert an RGBA image to the planes blended by the YUV compositor"""
+    pixels = np.asarray(image.convert("RGBA"))
+    height, width = pixels.shape[:2]
+    # Pad to an even size with transparent pixels
+    pixels = np.pad(pixels, ((0, height % 2), (0, width % 2), (0, 0)))
+    return rgba_to_yuva420p(pixels)
+
+
+class YUVCompositor(Compositor):
+    """Composites directly in YUV 4:2:0, the pixel format of most sources.
+
+    Video frames are copied plane by plane without any color conversion,
+    RGBA overlays are converted once to premultiplied YUVA when they are
+    first drawn, and the canvas is handed to the encoder as a yuv420p frame.
+    """
+
+    __slots__ = ("buffer", "planes", "_overlays")
+
+    video_format = "yuv420p"
+
+    def __init__(self, width: int, height: int):
+        assert width % 2 == 0 and height % 2 == 0, "Size must be even for yuv420p"
+        super().__init__(width, height)
+        luma_size = width * height
+        chroma_size = luma_size // 4
+        # Same layout as VideoFrame.from_ndarray expects for yuv420p
+        self.buffer = np.empty(luma_size + 2 * chroma_size, dtype=np.uint8)
+        self.planes = (
+            self.buffer[:luma_size].reshape(height, width),
+            self.buffer[luma_size : luma_size + chroma_size].reshape(
+                height // 2, width // 2
+            ),
+            self.buffer[luma_size + chroma_size :].reshape(height // 2, width // 2),
+        )
+        self._overlays: OverlayCache[YUVOverlay] = OverlayCache()
+
+    def begin(self) -> None:
+        # Black in limited range
+        self.planes[0].fill(16)
+        self.planes[1].fill(128)
+        self.planes[2].fill(128)
+        self._overlays.begin()
+
+    def _plane_boxes(
+        self, size: tuple[int, int], position: tuple[int, int]
+    ) -> Iterator[Tuple[np.ndarray, Optional[Tuple[Slices, Slices]]]]:
+        # Layers are snapped to even coordinates so the chroma samples of the
+        # layer line up with the ones of the canvas
+        x, y = position[0] - position[0] % 2, position[1] - position[1] % 2
+        chroma_size = ((size[0] + 1) // 2, (size[1] + 1) // 2)
+        yield self.planes[0], clip_box(self.size, size, (x, y))
+        chroma_box = clip_box(
+            (self.width // 2, self.height // 2), chroma_size, (x // 2, y // 2)
+        )
+        yield self.planes[1], chroma_box
+        yield self.planes[2], chroma_box
+
+    def draw_video(self, frame: VideoFrame, position: tuple[int, int]) -> None:
+        if frame.format.name != "yuv420p":
+            frame = frame.reformat(format="yuv420p")
+        boxes = self._plane_boxes((frame.width, frame.height), position)
+        for index, (plane, box) in enumerate(boxes):
+            if box is None:
+                continue
+            target, source = box
+            plane[target] = get_plane(frame, index)[source]
+
+    def draw_image(self, image: Image.Image, position: tuple[int, int]) -> None:
+        overlay = self._overlays.get(image, to_yuv_overlay)
+        width, height = overlay[0].shape[1], overlay[0].shape[0]
+        boxes = self._plane_boxes((width, height), position)
+        for index, (plane, box) in enumerate(boxes):
+            if box is None:
+                continue
+            target, source = box
+            color, inverse_alpha = overlay[index * 2 : index * 2 + 2]
+            blend(plane, target, color[source], inverse_alpha[source])
+
+    def finish(self) -> VideoFrame:
+        return VideoFrame.from_ndarray(
+            self.buffer.reshape(self.height * 3 // 2, self.width), format="yuv420p"
+        )
+
+    def free(self) -> None:
+        self._overlays.clear()
+
+
+COMPOSITORS: Dict[CompositorBackend, type[Compositor]] = {
+    CompositorBackend.PIL: PILCompositor,
+    CompositorBackend.NUMPY: NumpyCompositor,
+    CompositorBackend.YUV: YUVCompositor,
+}
+
+
+def create_compositor(
+    backend: CompositorBackend, width: int, height: int
+) -> Compositor:
+    """Create a compositor for the given backend"""
+    return COMPOSITORS[CompositorBackend(backend)](width, height)
@@ -1,27 +1,130 @@
+import heapq
+from contextlib import contextmanager
 from fractions import Fraction
+from math import ceil
 from time import perf_counter
-from typing import Dict, Iterable, Optional
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-import numpy as np
 from av import VideoStream
 from av.audio.frame import AudioFrame
 from av.audio.stream import AudioStream
+from av.container import OutputContainer
 from av.container import open as open_container
 from av.video.frame import VideoFrame
 from av.video.stream import VideoStream
-from PIL import Image
 
-from composery.components import Text, Video
+from composery import stats
+from composery.components import Text
 from composery.logger import logger
-from composery.reader import audio as audio_reader
 from composery.reader import free as free_readers
-from composery.reader.video import get_video_size
+from composery.reader import prefetch, set_decoder_threading
+from composery.reader.cache import FRAME_CACHE
+from composery.reader.prefetch import FrameRequest
+from composery.reader.scaler import set_interpolation
+from composery.reader.video import VideoReader
 from composery.renderer import stream
-from composery.renderer.options import VideoWriterOptions
-from composery.renderer.processors import video
+from composery.renderer.compositor import create_compositor
+from composery.renderer.options import (
+    CompositorBackend,
+    VideoWriterOptions,
+    resolve_draft,
+)
+from composery.renderer.output import Output, open_output, resolve_options
+from composery.renderer.passthrough import AudioPassthrough
+from composery.renderer.pipeline import FrameItem, RenderPipeline, encode_item
+from composery.renderer.plan import LayerOp, RenderPlan, TextOp, VideoOp
+from composery.renderer.processors import text
+from composery.renderer.processors.audio import AudioMixer
+from composery.renderer.smart import FrameRange, SmartRender
+from composery.stats import ProgressCallback, RenderStats
 from composery.timeline import Timeline
 
 
+@contextmanager
+def recording(trace: bool) -> Iterator[RenderStats]:
+    """Record the stats of a render, including the cache counters"""
+    render_stats = stats.start(trace)
+    caches = {
+        "frame_cache": (FRAME_CACHE, ("hits", "misses")),
+        "text_cache": (text.TEXT_CACHE, ("hits", "disk_hits", "misses")),
+    }
+    counters = {
+        (name, counter): getattr(cache, counter)
+        for name, (cache, names) in caches.items()
+        for counter in names
+    }
+    try:
+        yield render_stats
+    finally:
+        for (name, counter), value in counters.items():
+            render_stats.count(
+                f"{name}_{counter}", getattr(caches[name][0], counter) - value
+            )
+        render_stats.finish()
+
+
+@contextmanager
+def reading(
+    options: VideoWriterOptions,
+    texts: Callable[[], List[Text]],
+    schedule: Callable[[], Dict[VideoReader, List[FrameRequest]]],
+) -> Iterator[float]:
+    """Set up the readers and caches for a render, yielding the rasterize time
+
+    Args:
+        options (VideoWriterOptions): The options of the render
+        texts (Callable[[], List[Text]]): Get the texts to rasterize before
+            rendering, only called with `text_workers`
+        schedule (Callable[[], Dict[VideoReader, List[FrameRequest]]]): Get
+            the frames that will be requested from each video reader, only
+            called with `prefetch_frames`
+    """
+    FRAME_CACHE.resize(options.frame_cache_size)
+    text.TEXT_CACHE.resize(options.text_cache_size)
+    text.TEXT_CACHE.directory = options.text_cache_directory
+    set_decoder_threading(options.decode_thread_type.value, options.decode_threads)
+    set_interpolation(options.interpolation.value)
+    # The worker processes are started before any decoder thread
+    rasterizer = (
+        text.TextRasterizer(texts(), options.text_workers)
+        if options.text_workers
+        else None
+    )
+    if options.prefetch_frames:
+        prefetch.start(schedule(), options.prefetch_frames)
+    try:
+        rasterize_time = 0.0
+        if rasterizer is not None:
+            rasterize_time = rasterizer.wait()
+            logger.info(
+                f"Rasterized {len(rasterizer)} texts in {rasterize_time:.3f} seconds"
+            )
+        yield rasterize_time
+    finally:
+        prefetch.stop()
+
+
+def is_static(ops: Sequence[LayerOp]) -> bool:
+    """Check that none of the layers changes from a frame to the next"""
+    return all(op.static for op in ops)
+
+
+def is_same_ops(ops: Sequence[LayerOp], other: Sequence[LayerOp]) -> bool:
+    return len(ops) == len(other) and all(
+        op is other_op for op, other_op in zip(ops, other)
+    )
+
+
 class CPURenderer:
     __slots__ = (
         "output_filename",
@@ -31,144 +134,371 @@ class CPURenderer:
         "duration",
         "timeline",
         "options",
-        "BLANK_FRAME",
-        "BLANK_AUDIO_FRAME",
+        "scale",
+        "compositor",
+        "mixer",
+        "reused_frames",
+        "rasterize_time",
+        "progress",
     )
-    READERS = {}
-    COMPUTED_FRAMES: Dict[str, Image.Image] = {}
 
     def __init__(
         self,
-        output_filename: str,
+        output_filename: Output,
         width: int,
         height: int,
         duration: int,
         framerate: int,
         options: VideoWriterOptions,
+        compositor: Optional[CompositorBackend] = None,
+        scale: float = 1,
     ):
+        # The layout is drawn at `scale` on a canvas of `width` by `height`,
+        # drafts render the composition scaled further, at a lower framerate
+        self.scale = scale * (options.draft_scale if options.draft else 1)
+        options, width, height, framerate = resolve_draft(
+            options, width, height, framerate
+        )
         self.output_filename = output_filename
         self.width = width
         self.height = height
         self.framerate = framerate
         self.duration = duration
-        self.options = options
-        self.BLANK_FRAME = np.zeros((height, width, 3), dtype=np.uint8)
-        self.BLANK_AUDIO_FRAME = AudioFrame(
-            format="fltp", layout="stereo", samples=self.options.audio_samples
+        self.options = resolve_options(output_filename, options)
+        self.compositor = create_compositor(
+            compositor or options.compositor, width, height
         )
-        self.BLANK_AUDIO_FRAME.sample_rate = self.options.audio_sample_rate
+        self.mixer = AudioMixer(options)
+        self.reused_frames = 0
+        self.rasterize_time = 0.0
+        self.progress: Optional[ProgressCallback] = None
 
-    def render(self, timeline: Timeline):
-        self.timeline = timeline
-        self.render_frames()
+    def render(
+        self, timeline: Timeline, progress: Optional[ProgressCallback] = None
+    ) -> RenderStats:
+        """Render the timeline
 
-    def get_audio_frame_at_time(self, time: float, index: int) -> Optional[AudioFrame]:
-        audio_frame = self.BLANK_AUDIO_FRAME
-        for audio_component in self.timeline.composition.audio_components:
-            if time > self.duration or not (
-                audio_component.start_at <= time <= audio_component.end_at
-            ):
-                continue
-            raw_audio_frame = audio_reader.get_audio_frame_from_video(
-                audio_component.source, time
+        Args:
+            timeline (Timeline): The timeline to render
+            progress (Optional[ProgressCallback]): Called after every frame
+                with the frames done, the total frames and the frames per second
+
+        Returns:
+            RenderStats: The time spent in each stage and the counters
+        """
+        self.timeline = timeline
+        self.progress = progress
+        with self.recording() as render_stats:
+            smart_render = (
+                SmartRender.create(self) if self.options.smart_render else None
             )
-            if not raw_audio_frame:
-                continue
-            audio_frame = raw_audio_frame
-        audio_frame.rate = self.options.audio_sample_rate
-        audio_frame.time_base = Fraction(1, self.options.audio_sample_rate)
-        audio_frame.pts = int(index * self.options.audio_samples)
-        return audio_frame
+            if smart_render is not None:
+                # Only the frames that are not copied are decoded
+                with self.reading(smart_render.dirty_ranges):
+                    smart_render.render()
+                return render_stats
+            with self.reading():
+                self.render_frames()
+        return render_stats
 
-    def get_frame_at_time(self, time: float) -> VideoFrame:
-        frame = Image.fromarray(self.BLANK_FRAME)
-        for component in self.timeline.composition.components:
-            if time > self.duration or not (
-                component.start_at <= time <= component.end_at
-            ):
-                continue
+    def render_segment(
+        self, timeline: Timeline, start_frame: int, end_frame: int
+    ) -> RenderStats:
+        """Render the video of a range of frames, without audio
 
-            frame_time = time - component.start_at
-            if isinstance(component, Video):
-
-                video.process_frame(
-                    frame,
-                    component.source,
-                    frame_time,
-                    component.fixed_position(
-                        frame.size,
-                        get_video_size(component.source),
-                        0,
-                    ),
+        Args:
+            timeline (Timeline): The timeline to render
+            start_frame (int): The first frame of the segment
+            end_frame (int): The frame after the last frame of the segment
+        """
+        self.timeline = timeline
+        with self.recording() as render_stats, self.reading([(start_frame, end_frame)]):
+            with open_container(
+                self.output_filename, "w", format="mp4"
+            ) as output_container:
+                video_stream = stream.create_stream(
+                    VideoStream, output_container, self.options
                 )
-
-            elif isinstance(component, Text):
-                if component.id not in CPURenderer.COMPUTED_FRAMES:
-                    CPURenderer.COMPUTED_FRAMES[component.id] = (
-                        component.generate_frame()
-                    )
-                computed_frame = CPURenderer.COMPUTED_FRAMES[component.id]
-                frame.paste(
-                    computed_frame,
-                    component.fixed_position(
-                        frame.size,
-                        (
-                            computed_frame.size[0] + component.content_length,
-                            computed_frame.size[1],
-                        ),
-                        component.style.font_size,
-                    ),
-                    mask=computed_frame,
+                self.encode(
+                    output_container,
+                    self.iter_video_items(video_stream, start_frame, end_frame),
+                    (video_stream,),
                 )
+        return render_stats
 
-        return VideoFrame.from_image(frame)
-
-    def render_frames(self):
-
+    def render_audio(self, timeline: Timeline):
+        """Render the audio of the timeline, without video"""
+        self.timeline = timeline
         with open_container(
             self.output_filename, "w", format="mp4"
         ) as output_container:
-            video_stream = stream.create_stream(
-                VideoStream, output_container, self.options
-            )
+            with self.audio_output(output_container) as (audio_stream, items, encoded):
+                self.encode(output_container, items, (audio_stream,) if encoded else ())
+
+    @contextmanager
+    def audio_output(
+        self, output_container: OutputContainer
+    ) -> Iterator[Tuple[AudioStream, Iterable[FrameItem], bool]]:
+        """Add the audio stream of an output
+
+        The audio packets of the source are copied when the mix would leave
+        them unchanged, otherwise the audio is mixed and encoded.
+
+        Yields:
+            Tuple[AudioStream, Iterable[FrameItem], bool]: The stream, its
+                items and whether its encoder has to be flushed
+        """
+        passthrough = (
+            AudioPassthrough.create(self) if self.options.audio_passthrough else None
+        )
+        if passthrough is None:
             audio_stream = stream.create_stream(
                 AudioStream, output_container, self.options
             )
-            for i, frame in enumerate(self.iter_frames()):
-                frame.pts = i
-                output_container.mux(video_stream.encode(frame))
-                del frame
-
-            for i, audio_frame in enumerate(self.iter_audio_frames()):
-                if audio_frame is None:
-                    continue
-                output_container.mux(audio_stream.encode(audio_frame))
-                del audio_frame
-            output_container.mux(video_stream.encode(None))
-            output_container.mux(audio_stream.encode(None))
+            yield audio_stream, self.iter_audio_items(audio_stream), True
+            return
+        try:
+            audio_stream = passthrough.add_stream(output_container)
+            yield audio_stream, passthrough.iter_items(audio_stream), False
+        finally:
+            passthrough.close()
+
+    @contextmanager
+    def recording(self) -> Iterator[RenderStats]:
+        """Record the stats of a render, including the cache counters"""
+        with recording(self.options.trace) as render_stats:
+            try:
+                yield render_stats
+            finally:
+                render_stats.count("reused_frames", self.reused_frames)
+
+    @contextmanager
+    def reading(self, ranges: Optional[Sequence[FrameRange]] = None):
+        """Set up the readers and caches for rendering ranges of frames
+
+        Args:
+            ranges (Optional[Sequence[FrameRange]]): The (start, end) frames
+                that will be rendered, every frame when not given
+        """
+        ranges = ranges if ranges is not None else [(0, self.total_frames)]
+        with reading(
+            self.options,
+            lambda: self.get_texts(ranges),
+            lambda: self.frame_schedule(ranges),
+        ) as rasterize_time:
+            self.rasterize_time = rasterize_time
+            yield
+
+    def get_texts(self, ranges: Sequence[FrameRange]) -> List[Text]:
+        """Get the texts shown in ranges of frames"""
+        return [
+            op.text
+            for start_frame, end_frame in ranges
+            if start_frame < end_frame
+            for op in self.plan.index.between_frames(
+                start_frame, end_frame, self.framerate
+            )
+            if isinstance(op, TextOp)
+        ]
+
+    def frame_schedule(
+        self, ranges: Sequence[FrameRange]
+    ) -> Dict[VideoReader, List[FrameRequest]]:
+        """Get the frames that will be requested from each video reader
+
+        Args:
+            ranges (Sequence[FrameRange]): The (start, end) frames to render
+
+        Returns:
+            Dict[VideoReader, List[FrameRequest]]: The frames of each reader,
+                in request order
+        """
+        schedule: Dict[VideoReader, List[FrameRequest]] = {}
+        frame_numbers = (
+            frame_number
+            for start_frame, end_frame in ranges
+            for frame_number in range(start_frame, end_frame)
+        )
+        for frame_number in frame_numbers:
+            for reader, request in self.get_frame_requests(frame_number):
+                schedule.setdefault(reader, []).append(request)
+        return schedule
+
+    def get_frame_requests(
+        self, frame_number: int
+    ) -> Iterator[Tuple[VideoReader, FrameRequest]]:
+        """Get the reader and request of the video frames drawn on a frame"""
+        time = frame_number / self.framerate
+        for op in self.plan.at(time):
+            if isinstance(op, VideoOp):
+                yield op.reader, (
+                    time - op.start_at,
+                    op.size,
+                    self.compositor.video_format,
+                )
+
+    @property
+    def plan(self) -> RenderPlan:
+        """The plan of the composition at the scale of the render"""
+        return self.timeline.composition.get_plan(self.scale)
+
+    @property
+    def total_frames(self) -> int:
+        return self.duration * self.framerate
+
+    def get_audio_frame_at_time(self, time: float) -> AudioFrame:
+        sample_rate = self.options.audio_sample_rate
+        start = round(time * sample_rate)
+        end_time = (start + self.options.audio_samples) / sample_rate
+        audio_components = (
+            self.timeline.composition.audio_index.between(time, end_time)
+            if time <= self.duration
+            else ()
+        )
+        stats.count("audio_frames")
+        with stats.timer("mix"):
+            return self.mixer.mix(audio_components, start)
+
+    def get_ops_at_time(self, time: float) -> Tuple[LayerOp, ...]:
+        return self.plan.at(time) if time <= self.duration else ()
+
+    def get_frame_at_time(self, time: float) -> VideoFrame:
+        return self.composite(self.get_ops_at_time(time), time)
+
+    def composite(self, ops: Sequence[LayerOp], time: float) -> VideoFrame:
+        """Draw the layer ops drawn at a time, bottom to top"""
+        compositor = self.compositor
+        with stats.timer("composite"):
+            compositor.begin()
+            for op in ops:
+                op.draw(compositor, time)
+        with stats.timer("convert"):
+            return compositor.finish()
+
+    def render_frames(self):
+        with open_output(self.output_filename, self.options) as output_container:
+            video_stream = stream.create_stream(
+                VideoStream, output_container, self.options
+            )
+            with self.audio_output(output_container) as (audio_stream, items, encoded):
+                self.encode(
+                    output_container,
+                    self.iter_interleaved_items(video_stream, audio_stream, items),
+                    (video_stream, audio_stream) if encoded else (video_stream,),
+                )
             output_container.close()
 
-    def iter_frames(
+    def encode(
         self,
+        output_container: OutputContainer,
+        items: Iterable[FrameItem],
+        streams: Sequence[Union[VideoStream, AudioStream]],
+    ) -> None:
+        """Encode and mux frames, then flush the encoders of the streams
+
+        With `pipeline_depth` set, frame production, encoding and muxing run
+        on separate threads.
+        """
+        if self.options.pipeline_depth:
+            RenderPipeline(self.options.pipeline_depth).run(
+                items, streams, output_container
+            )
+            return
+        for item in items:
+            packets = encode_item(item)
+            with stats.timer("mux"):
+                output_container.mux(packets)
+            del item
+        for output_stream in streams:
+            with stats.timer("encode"):
+                packets = output_stream.encode(None)
+            with stats.timer("mux"):
+                output_container.mux(packets)
+
+    def iter_interleaved_items(
+        self,
+        video_stream: VideoStream,
+        audio_stream: AudioStream,
+        audio_items: Optional[Iterable[FrameItem]] = None,
+    ) -> Iterable[FrameItem]:
+        """Get the video and audio frames to encode in presentation time order
+
+        Producing both streams in lockstep lets the muxer write packets as
+        they come instead of buffering one stream until the other catches up.
+        The audio items are mixed from the audio components when not given.
+        """
+        time_bases = {
+            video_stream.index: Fraction(1, self.framerate),
+            audio_stream.index: Fraction(1, self.options.audio_sample_rate),
+        }
+        if audio_items is None:
+            audio_items = self.iter_audio_items(audio_stream)
+        return heapq.merge(
+            self.iter_video_items(video_stream),
+            audio_items,
+            key=lambda item: item[2] * time_bases[item[0].index],
+        )
+
+    def iter_video_items(
+        self,
+        video_stream: VideoStream,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+    ) -> Iterable[FrameItem]:
+        """Get the frames of a range to encode, pts start at 0"""
+        for pts, frame in enumerate(self.iter_frames(start_frame, end_frame)):
+            yield video_stream, frame, pts
+            stats.count("frames")
+            if self.progress is not None:
+                done = pts + 1
+                end = self.total_frames if end_frame is None else end_frame
+                total = end - start_frame
+                self.progress(done, total, done / stats.get_stats().wall_time)
+
+    def iter_audio_items(self, audio_stream: AudioStream) -> Iterable[FrameItem]:
+        """Get the audio frames to encode"""
+        # The pts is only set by the encoder, as frames can be shared
+        for index, audio_frame in enumerate(self.iter_audio_frames()):
+            yield audio_stream, audio_frame, index * self.options.audio_samples
+
+    def iter_frames(
+        self, start_frame: int = 0, end_frame: Optional[int] = None
     ) -> Iterable[VideoFrame]:
-        video_frames = self.duration * self.framerate
-        for frame_number in range(video_frames):
-            video_frame = self.get_frame_at_time(frame_number / self.framerate)
-            if video_frame is None:
+        """Get the composited frames of a range.
+
+        While the drawn layers do not change and none of them varies in time,
+        the frame of the span is composited once and yielded for every tick,
+        which is safe because the pts is only set by the encoder.
+        """
+        self.reused_frames = 0
+        previous_ops: Tuple[LayerOp, ...] = ()
+        video_frame: Optional[VideoFrame] = None
+        if end_frame is None:
+            end_frame = self.total_frames
+        for frame_number in range(start_frame, end_frame):
+            time = frame_number / self.framerate
+            ops = self.get_ops_at_time(time)
+            if (
+                video_frame is not None
+                and is_static(ops)
+                and is_same_ops(ops, previous_ops)
+            ):
+                self.reused_frames += 1
+                yield video_frame
                 continue
+            previous_ops = ops
+            video_frame = self.composite(ops, time)
             yield video_frame
+        logger.info(f"Reused {self.reused_frames} frames of static spans")
 
     def iter_audio_frames(self) -> Iterable[AudioFrame]:
-        audio_frames = (
-            int(self.duration * self.options.audio_sample_rate) // 1000
-        ) - self.duration
+        samples = self.options.audio_samples
+        sample_rate = self.options.audio_sample_rate
+        audio_frames = ceil(self.duration * sample_rate / samples)
         for index in range(audio_frames):
-            time = index / self.options.audio_sample_rate * 1000
-            audio_frame = self.get_audio_frame_at_time(time, index)
-            if audio_frame is None:
-                continue
-            yield audio_frame
+            time = index * samples / sample_rate
+            yield self.get_audio_frame_at_time(time)
 
     def __del__(self):
+        self.compositor.free()
         free_readers()
-        CPURenderer.COMPUTED_FRAMES = {}
@@ -0,0 +1,262 @@
+from contextlib import ExitStack
+from typing import List, Optional, Sequence, Tuple
+
+from av.audio.stream import AudioStream
+from av.container import OutputContainer
+from av.packet import Packet
+from av.video.frame import VideoFrame
+from av.video.stream import VideoStream
+
+from composery import stats
+from composery.logger import logger
+from composery.reader.scaler import scale_frame
+from composery.renderer import stream
+from composery.renderer.cpu import CPURenderer
+from composery.renderer.options import VideoWriterOptions, resolve_draft, scale_size
+from composery.renderer.output import Rendition, open_output
+from composery.renderer.pipeline import FrameItem, StageQueue, Stream, encode_item
+from composery.stats import ProgressCallback, RenderStats
+from composery.timeline import Timeline
+
+# The depth of the frame queue of each rendition without `pipeline_depth`
+RENDITION_QUEUE_DEPTH = 8
+
+_DONE = None
+
+
+def copy_packet(packet: Packet) -> Packet:
+    """Copy a packet to mux it in another output, muxing takes its data"""
+    copy = Packet(bytes(packet))
+    copy.pts = packet.pts
+    copy.dts = packet.dts
+    copy.duration = packet.duration
+    copy.time_base = packet.time_base
+    copy.is_keyframe = packet.is_keyframe
+    return copy
+
+
+def copy_frame(frame: VideoFrame) -> VideoFrame:
+    """Copy a frame to encode it in another output, encoding sets its pts"""
+    copy = VideoFrame(frame.width, frame.height, frame.format.name)
+    for plane, copy_plane in zip(frame.planes, copy.planes):
+        copy_plane.update(plane)
+    return copy
+
+
+class RenditionEncoder:
+    """Encodes and muxes the frames of a rendition on a thread of its own"""
+
+    __slots__ = ("container", "streams", "frames", "error", "_thread")
+
+    def __init__(
+        self,
+        name: str,
+        container: OutputContainer,
+        streams: Sequence[Stream],
+        depth: int,
+    ):
+        self.container = container
+        self.streams = streams
+        self.frames = StageQueue(name, depth)
+        self.error: Optional[BaseException] = None
+        self._thread = stats.thread(self._run, f"rendition-{name}")
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def put(self, item: FrameItem) -> None:
+        self.frames.put(item)
+
+    def stop(self) -> None:
+        """Flush the encoders once every queued frame is encoded"""
+        self.frames.put(_DONE)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while (item := self.frames.get()) is not _DONE:
+            if self.error is not None:
+                continue
+            try:
+                packets = encode_item(item)
+                with stats.timer("mux"):
+                    self.container.mux(packets)
+            except BaseException as error:
+                self.error = error
+        if self.error is not None:
+            return
+        try:
+            for output_stream in self.streams:
+                with stats.timer("encode"):
+                    packets = output_stream.encode(None)
+                with stats.timer("mux"):
+                    self.container.mux(packets)
+        except BaseException as error:
+            self.error = error
+
+
+class LadderRenderer:
+    """Renders a timeline to several renditions from a single composite pass.
+
+    The composition is composited once, scaled to the largest rendition, and
+    each frame is scaled down to every other rendition by the cached
+    libswscale contexts of the scaler. Every rendition is encoded and muxed
+    on a thread of its own. The audio is mixed and encoded once, or copied
+    from its source, and its packets are muxed to every output.
+    """
+
+    __slots__ = ("renderer", "renditions", "options", "_frame", "_scaled_frames")
+
+    def __init__(
+        self,
+        renditions: Sequence[Rendition],
+        width: int,
+        height: int,
+        duration: int,
+        framerate: int,
+        options: VideoWriterOptions,
+    ):
+        assert renditions, "At least one rendition is needed"
+        scale = max(
+            max(rendition.width / width, rendition.height / height)
+            for rendition in renditions
+        )
+        canvas_width, canvas_height = scale_size((width, height), scale)
+        self.renderer = CPURenderer(
+            renditions[0].filename,
+            canvas_width,
+            canvas_height,
+            duration,
+            framerate,
+            options,
+            scale=scale,
+        )
+        # Drafts scale every rendition like the composite
+        draft_scale = options.draft_scale if options.draft else 1
+        draft_options = resolve_draft(options, width, height, framerate)[0]
+        self.renditions = renditions
+        self.options = [
+            rendition.get_options(draft_options, draft_scale)
+            for rendition in renditions
+        ]
+        self._frame: Optional[VideoFrame] = None
+        self._scaled_frames: List[VideoFrame] = []
+
+    def render(
+        self, timeline: Timeline, progress: Optional[ProgressCallback] = None
+    ) -> RenderStats:
+        """Render the timeline to every rendition
+
+        Args:
+            timeline (Timeline): The timeline to render
+            progress (Optional[ProgressCallback]): Called after every frame
+                with the frames done, the total frames and the frames per second
+
+        Returns:
+            RenderStats: The time spent in each stage and the counters
+        """
+        renderer = self.renderer
+        renderer.timeline = timeline
+        renderer.progress = progress
+        with renderer.recording() as render_stats, renderer.reading(), ExitStack() as stack:
+            containers = [
+                stack.enter_context(open_output(rendition.filename, options))
+                for rendition, options in zip(self.renditions, self.options)
+            ]
+            video_streams = [
+                stream.create_stream(VideoStream, container, options)
+                for container, options in zip(containers, self.options)
+            ]
+            audio_stream, audio_items, encoded = stack.enter_context(
+                renderer.audio_output(containers[0])
+            )
+            audio_streams = self.add_audio_streams(containers, audio_stream)
+            encoders = [
+                RenditionEncoder(
+                    f"{options.width}x{options.height}",
+                    container,
+                    (video_stream,),
+                    renderer.options.pipeline_depth or RENDITION_QUEUE_DEPTH,
+                )
+                for container, video_stream, options in zip(
+                    containers, video_streams, self.options
+                )
+            ]
+            for encoder in encoders:
+                encoder.start()
+            try:
+                items = renderer.iter_interleaved_items(
+                    video_streams[0], audio_stream, audio_items
+                )
+                for item in items:
+                    output_stream, frame, pts = item
+                    if output_stream is video_streams[0]:
+                        assert isinstance(frame, VideoFrame)
+                        scaled_frames = self.scale(frame)
+                        for encoder, video_stream, scaled_frame in zip(
+                            encoders, video_streams, scaled_frames
+                        ):
+                            encoder.put((video_stream, scaled_frame, pts))
+                        continue
+                    self.put_audio(encoders, audio_streams, encode_item(item))
+                if encoded:
+                    with stats.timer("encode"):
+                        packets = audio_stream.encode(None)
+                    self.put_audio(encoders, audio_streams, packets)
+            finally:
+                for encoder in encoders:
+                    encoder.stop()
+            for encoder in encoders:
+                if encoder.error is not None:
+                    raise encoder.error
+            stats.get_stats().queues.update(
+                {encoder.frames.name: encoder.frames.stats() for encoder in encoders}
+            )
+        logger.info(f"Rendered {len(self.renditions)} renditions")
+        return render_stats
+
+    def add_audio_streams(
+        self, containers: Sequence[OutputContainer], audio_stream: AudioStream
+    ) -> List[AudioStream]:
+        """Add the audio stream of the first output to the others and start them"""
+        containers[0].start_encoding()
+        audio_streams = [audio_stream]
+        for container in containers[1:]:
+            audio_streams.append(container.add_stream(template=audio_stream))
+            container.start_encoding()
+        return audio_streams
+
+    def scale(self, frame: VideoFrame) -> List[VideoFrame]:
+        """Scale a composited frame to every rendition
+
+        The frames of static spans are yielded again, and scaled only once.
+        Each rendition gets a frame of its own, as the encoder threads set
+        the pts of their frames: renditions at the size and format of the
+        composite would otherwise share it.
+        """
+        if frame is not self._frame:
+            self._frame = frame
+            self._scaled_frames = []
+            for options in self.options:
+                scaled_frame = scale_frame(
+                    frame, (options.width, options.height), options.pixel_format.value
+                )
+                if any(scaled_frame is other for other in self._scaled_frames):
+                    scaled_frame = copy_frame(scaled_frame)
+                self._scaled_frames.append(scaled_frame)
+        return self._scaled_frames
+
+    def put_audio(
+        self,
+        encoders: Sequence[RenditionEncoder],
+        audio_streams: Sequence[AudioStream],
+        packets: List[Packet],
+    ) -> None:
+        """Queue audio packets to every output, the first one muxes the originals"""
+        for packet in packets:
+            copies: List[Tuple[AudioStream, Packet]] = [
+                (audio_stream, copy_packet(packet))
+                for audio_stream in audio_streams[1:]
+            ]
+            for encoder, (audio_stream, copy) in zip(encoders[1:], copies):
+                encoder.put((audio_stream, copy, 0))
+            encoders[0].put((audio_streams[0], packet, 0))
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Literal
+from typing import Literal, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -23,6 +23,42 @@ class PixelFormat(str, Enum):
     yuv420p = "yuv420p"
 
 
+class DecodeThreadType(str, Enum):
+    """An enum for the threading of the video decoders"""
+
+    AUTO = "AUTO"
+    FRAME = "FRAME"
+    SLICE = "SLICE"
+    NONE = "NONE"
+
+
+class Interpolation(str, Enum):
+    """An enum for the libswscale interpolation of the scaled video frames"""
+
+    FAST_BILINEAR = "FAST_BILINEAR"
+    BILINEAR = "BILINEAR"
+    BICUBIC = "BICUBIC"
+    POINT = "POINT"
+    AREA = "AREA"
+    LANCZOS = "LANCZOS"
+
+
+class CompositorBackend(str, Enum):
+    """An enum for the compositing backend of the CPU renderer"""
+
+    PIL = "pil"
+    NUMPY = "numpy"
+    YUV = "yuv"
+
+
+class StreamingFormat(str, Enum):
+    """An enum for the outputs that can be played while they are written"""
+
+    FRAGMENTED_MP4 = "fmp4"
+    HLS = "hls"
+    DASH = "dash"
+
+
 SCALE_PATTERN = r"(\d+):(\d+)"
 
 
@@ -33,8 +69,9 @@ class VideoWriterOptions(BaseModel):
     preset: Preset = Field(
         default=Preset.medium, description="The preset of the video writer"
     )
-    crf: int = Field(
-        default=23, description="The constant rate factor of the video writer"
+    crf: Optional[int] = Field(
+        default=23,
+        description="The constant rate factor of the video writer, None encodes at the bitrate",
     )
     scale: str = Field(
         default="1920:1080",
@@ -48,6 +85,20 @@ class VideoWriterOptions(BaseModel):
     codec: Literal["h264", "mpeg4"] = Field(
         default="h264", description="The codec of the video writer"
     )
+    streaming: Optional[StreamingFormat] = Field(
+        default=None,
+        description="Write a fragmented MP4, or HLS or DASH segments and their playlist to the output directory",
+    )
+    fragment_duration: float = Field(
+        default=2,
+        gt=0,
+        description="The duration in seconds of the fragments or segments of streaming outputs",
+    )
+    gop_size: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="The number of frames between keyframes, defaults to the encoder default",
+    )
     pixel_format: PixelFormat = Field(
         default=PixelFormat.yuv420p, description="The pixel format of the video writer"
     )
@@ -62,6 +113,134 @@ class VideoWriterOptions(BaseModel):
     )
     audio_sample_rate: int = Field(default=44100, description="Audio sample rate")
     audio_channels: int = Field(default=2, description="Audio channels")
+    decode_thread_type: DecodeThreadType = Field(
+        default=DecodeThreadType.AUTO,
+        description="The threading of the video decoders, frame threads decode several frames at once and slice threads parts of a frame",
+    )
+    decode_threads: int = Field(
+        default=0,
+        ge=0,
+        description="The number of threads of each video decoder, 0 picks it from the number of cores",
+    )
+    interpolation: Interpolation = Field(
+        default=Interpolation.BILINEAR,
+        description="The interpolation used to scale video components to their size",
+    )
+    compositor: CompositorBackend = Field(
+        default=CompositorBackend.NUMPY,
+        description="The compositing backend of the CPU renderer",
+    )
+    workers: int = Field(
+        default=0,
+        ge=0,
+        description="The number of processes of the parallel CPU renderer, 0 uses every core",
+    )
+    segment_duration: float = Field(
+        default=10,
+        gt=0,
+        description="The duration in seconds of the segments of the parallel CPU renderer",
+    )
+    pipeline_depth: int = Field(
+        default=0,
+        ge=0,
+        description="The queue depth of the threaded encode pipeline, 0 encodes on the render thread",
+    )
+    prefetch_frames: int = Field(
+        default=0,
+        ge=0,
+        description="The number of frames decoded ahead per video source, 0 disables prefetching",
+    )
+    frame_cache_size: int = Field(
+        default=256 * 1024 * 1024,
+        ge=0,
+        description="The memory budget in bytes of the decoded frame cache, 0 disables it",
+    )
+    text_cache_size: int = Field(
+        default=64 * 1024 * 1024,
+        ge=0,
+        description="The memory budget in bytes of the rasterized text cache, 0 disables it",
+    )
+    text_cache_directory: Optional[str] = Field(
+        default=None,
+        description="The directory where rasterized texts are also stored, shared between renders",
+    )
+    text_workers: int = Field(
+        default=0,
+        ge=0,
+        description="The number of processes that rasterize every text before rendering, 0 rasterizes them when first shown",
+    )
+    trace: bool = Field(
+        default=False,
+        description="Record every timed block of the render stats, to export them as a Chrome trace",
+    )
+    audio_cache_directory: Optional[str] = Field(
+        default=None,
+        description="The directory of the decoded audio cache, defaults to a directory in the temporary directory",
+    )
+    smart_render: bool = Field(
+        default=False,
+        description="Copy the compressed GOPs of a full frame H.264 background that nothing is drawn over, and only encode the others",
+    )
+    batch_size: int = Field(
+        default=16,
+        gt=0,
+        description="The number of timelines of a batch render rendered together, each with its own canvas and encoders",
+    )
+    audio_passthrough: bool = Field(
+        default=True,
+        description="Copy the audio packets of the only audio component when the mix would leave them unchanged",
+    )
+    draft: bool = Field(
+        default=False,
+        description="Render a preview at draft_scale of the resolution and at most draft_framerate, with the ultrafast preset",
+    )
+    draft_scale: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        description="The fraction of the resolution of draft renders, applied to the sources, layout and texts",
+    )
+    draft_framerate: int = Field(
+        default=12, gt=0, description="The maximum framerate of draft renders"
+    )
 
 
 DEFAULT_OPTIONS = VideoWriterOptions()
+
+
+def scale_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    """Scale a size, rounded to even numbers for the chroma planes of yuv420p"""
+    if scale == 1:
+        return size
+    return (
+        max(round(size[0] * scale / 2) * 2, 2),
+        max(round(size[1] * scale / 2) * 2, 2),
+    )
+
+
+def resolve_draft(
+    options: VideoWriterOptions, width: int, height: int, framerate: int
+) -> Tuple[VideoWriterOptions, int, int, int]:
+    """Get the options, size and framerate that are actually rendered.
+
+    The options of a draft are replaced by those of the scaled output, and
+    are no longer a draft so that resolving them again changes nothing.
+
+    Returns:
+        Tuple[VideoWriterOptions, int, int, int]: The options, the width, the
+        height and the framerate
+    """
+    if not options.draft:
+        return options, width, height, framerate
+    width, height = scale_size((width, height), options.draft_scale)
+    framerate = min(framerate, options.draft_framerate)
+    draft_options = options.model_copy(
+        update={
+            "width": width,
+            "height": height,
+            "framerate": framerate,
+            "preset": Preset.ultrafast,
+            "draft": False,
+        }
+    )
+    return draft_options, width, height, framerate
@@ -0,0 +1,129 @@
+import os
+from typing import BinaryIO, Dict, Literal, Optional, Union
+
+from av.container import OutputContainer
+from av.container import open as open_container
+from pydantic import BaseModel, ConfigDict, Field, SkipValidation
+
+from composery.renderer.options import (
+    StreamingFormat,
+    VideoWriterOptions,
+    scale_size,
+)
+
+# A filename, a directory for segmented outputs, or a writable binary file
+Output = Union[str, BinaryIO]
+
+# Write a moov without samples first and a fragment from every keyframe, so
+# the output never has to be seeked back and can be played while written
+FRAGMENTED_MP4_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+PLAYLISTS: Dict[StreamingFormat, str] = {
+    StreamingFormat.HLS: "index.m3u8",
+    StreamingFormat.DASH: "manifest.mpd",
+}
+
+
+class Rendition(BaseModel):
+    """An output of a render to several sizes and qualities, as an ABR ladder"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    filename: SkipValidation[Output] = Field(
+        ..., description="The filename or writable binary file object of the rendition"
+    )
+    width: int = Field(..., gt=0, description="The width of the rendition")
+    height: int = Field(..., gt=0, description="The height of the rendition")
+    codec: Optional[Literal["h264", "mpeg4"]] = Field(
+        default=None,
+        description="The codec of the rendition, defaults to the codec option",
+    )
+    crf: Optional[int] = Field(
+        default=None,
+        description="The constant rate factor of the rendition, defaults to the crf option without a bitrate",
+    )
+    bitrate: Optional[str] = Field(
+        default=None,
+        description="The bitrate of the rendition, encoded at that bitrate without a crf",
+    )
+
+    def get_options(
+        self, options: VideoWriterOptions, scale: float = 1
+    ) -> VideoWriterOptions:
+        """Get the options of the rendition from the options of the render
+
+        Args:
+            options (VideoWriterOptions): The options of the render
+            scale (float): The scale of the size of the rendition, for drafts
+        """
+        width, height = scale_size((self.width, self.height), scale)
+        update = {
+            "width": width,
+            "height": height,
+            "scale": f"{width}:{height}",
+            "codec": self.codec or options.codec,
+        }
+        if self.bitrate is not None:
+            update["bitrate"] = self.bitrate
+            update["crf"] = self.crf
+        elif self.crf is not None:
+            update["crf"] = self.crf
+        return resolve_options(self.filename, options.model_copy(update=update))
+
+
+def resolve_options(output: Output, options: VideoWriterOptions) -> VideoWriterOptions:
+    """Get the options for an output.
+
+    File objects, and pipes in particular, can not be seeked back to write
+    the index of a regular MP4 at the end, so they are always fragmented.
+    """
+    if isinstance(output, str) or options.streaming is not None:
+        return options
+    return options.model_copy(update={"streaming": StreamingFormat.FRAGMENTED_MP4})
+
+
+def open_output(output: Output, options: VideoWriterOptions) -> OutputContainer:
+    """Open the container of an output
+
+    Args:
+        output (Output): The filename or file object, or the directory of the
+            segments and playlist for HLS and DASH
+        options (VideoWriterOptions): The options from `resolve_options`
+
+    Returns:
+        OutputContainer: The container to mux to
+    """
+    if options.streaming is None:
+        return open_container(output, "w", format="mp4")
+    if options.streaming == StreamingFormat.FRAGMENTED_MP4:
+        return open_container(
+            output,
+            "w",
+            format="mp4",
+            container_options={"movflags": FRAGMENTED_MP4_FLAGS},
+        )
+
+    assert isinstance(output, str), "Segmented outputs are written to a directory"
+    os.makedirs(output, exist_ok=True)
+    playlist = os.path.join(output, PLAYLISTS[options.streaming])
+    fragment_duration = str(options.fragment_duration)
+    if options.streaming == StreamingFormat.HLS:
+        return open_container(
+            playlist,
+            "w",
+            format="hls",
+            container_options={
+                "hls_time": fragment_duration,
+                "hls_segment_type": "fmp4",
+                # The playlist is updated with every segment while rendering
+                "hls_playlist_type": "event",
+                "hls_segment_filename": os.path.join(output, "segment-%05d.m4s"),
+                "hls_fmp4_init_filename": "init.mp4",
+            },
+        )
+    return open_container(
+        playlist,
+        "w",
+        format="dash",
+        container_options={"seg_duration": fragment_duration},
+    )
@@ -0,0 +1,224 @@
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from math import ceil
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from av.container import InputContainer
+from av.container import open as open_container
+from av.packet import Packet
+
+from composery import stats
+from composery.renderer.options import VideoWriterOptions, resolve_draft
+from composery.renderer.output import Output, open_output, resolve_options
+from composery.stats import ProgressCallback, RenderStats
+from composery.timeline import Composition, Timeline
+
+
+def render_segment(
+    filename: str,
+    composition: Composition,
+    options: VideoWriterOptions,
+    start_frame: int,
+    end_frame: int,
+) -> Tuple[str, Dict[str, Any]]:
+    """Render the video of a segment in a worker process
+
+    Each worker builds its own index and plan, opens its own readers and has
+    its own renderer.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The filename and the stats of the segment
+    """
+    from .cpu import CPURenderer
+
+    timeline = Timeline()
+    timeline.composition = composition
+    composition.build_index()
+    renderer = CPURenderer(
+        filename,
+        composition.width,
+        composition.height,
+        composition.duration,
+        composition.framerate,
+        options,
+    )
+    render_stats = renderer.render_segment(timeline, start_frame, end_frame)
+    return filename, render_stats.to_dict()
+
+
+def get_segments(
+    total_frames: int, framerate: int, options: VideoWriterOptions
+) -> List[Tuple[int, int]]:
+    """Split the frames of a render in segments aligned to the GOP size
+
+    Returns:
+        List[Tuple[int, int]]: The (start, end) frames of each segment
+    """
+    segment_frames = max(round(options.segment_duration * framerate), 1)
+    if options.gop_size:
+        segment_frames = ceil(segment_frames / options.gop_size) * options.gop_size
+    return [
+        (start, min(start + segment_frames, total_frames))
+        for start in range(0, total_frames, segment_frames)
+    ]
+
+
+class ParallelCPURenderer:
+    """Renders segments of the timeline in a pool of worker processes.
+
+    Every segment is encoded to its own file starting with a keyframe. The
+    audio is rendered once in the main process while the workers run, and
+    the segments and the audio are then joined into the output without
+    re-encoding.
+    """
+
+    __slots__ = (
+        "output_filename",
+        "width",
+        "height",
+        "framerate",
+        "duration",
+        "options",
+    )
+
+    def __init__(
+        self,
+        output_filename: Output,
+        width: int,
+        height: int,
+        duration: int,
+        framerate: int,
+        options: VideoWriterOptions,
+    ):
+        # The workers resolve the draft options themselves
+        _, width, height, framerate = resolve_draft(options, width, height, framerate)
+        self.output_filename = output_filename
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.duration = duration
+        self.options = resolve_options(output_filename, options)
+
+    def render(
+        self, timeline: Timeline, progress: Optional[ProgressCallback] = None
+    ) -> RenderStats:
+        """Render the timeline
+
+        Args:
+            timeline (Timeline): The timeline to render
+            progress (Optional[ProgressCallback]): Called after every segment
+                with the frames done, the total frames and the frames per second
+
+        Returns:
+            RenderStats: The wall time of the render, and the stages and
+            counters of every process added up
+        """
+        from .cpu import CPURenderer
+
+        render_stats = stats.start(self.options.trace)
+        total_frames = self.duration * self.framerate
+        segments = get_segments(total_frames, self.framerate, self.options)
+        workers = min(self.options.workers or os.cpu_count() or 1, len(segments))
+        worker_options = self.options
+        if not worker_options.decode_threads:
+            # The cores are shared by the decoders of every worker
+            worker_options = worker_options.model_copy(
+                update={"decode_threads": max((os.cpu_count() or 1) // workers, 1)}
+            )
+        with TemporaryDirectory() as directory:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(
+                        render_segment,
+                        os.path.join(directory, f"segment-{index}.mp4"),
+                        timeline.composition.detached(),
+                        worker_options,
+                        start_frame,
+                        end_frame,
+                    )
+                    for index, (start_frame, end_frame) in enumerate(segments)
+                ]
+                audio_filename = os.path.join(directory, "audio.mp4")
+                CPURenderer(
+                    audio_filename,
+                    self.width,
+                    self.height,
+                    self.duration,
+                    self.framerate,
+                    self.options,
+                ).render_audio(timeline)
+                segment_filenames = []
+                frames_done = 0
+                for future, (start_frame, end_frame) in zip(futures, segments):
+                    segment_filename, segment_stats = future.result()
+                    segment_filenames.append(segment_filename)
+                    render_stats.merge(segment_stats)
+                    frames_done += end_frame - start_frame
+                    if progress is not None:
+                        progress(
+                            frames_done,
+                            total_frames,
+                            frames_done / render_stats.wall_time,
+                        )
+            with render_stats.timer("join"):
+                self.join(segment_filenames, segments, audio_filename)
+        render_stats.finish()
+        return render_stats
+
+    def join(
+        self,
+        segment_filenames: List[str],
+        segments: List[Tuple[int, int]],
+        audio_filename: str,
+    ) -> None:
+        """Concatenate the segments and mux the audio, without re-encoding"""
+        inputs = [open_container(filename) for filename in segment_filenames]
+        audio_input = open_container(audio_filename)
+        try:
+            with open_output(self.output_filename, self.options) as output_container:
+                video_stream = output_container.add_stream(
+                    template=inputs[0].streams.video[0]
+                )
+                audio_stream = output_container.add_stream(
+                    template=audio_input.streams.audio[0]
+                )
+                video_packets = self._concat_video(inputs, segments)
+                audio_packets = audio_input.demux(audio_input.streams.audio[0])
+                for packet in interleave(video_packets, audio_packets):
+                    packet.stream = (
+                        video_stream if packet.stream.type == "video" else audio_stream
+                    )
+                    output_container.mux(packet)
+        finally:
+            for container in (*inputs, audio_input):
+                container.close()
+
+    def _concat_video(
+        self, inputs: List[InputContainer], segments: List[Tuple[int, int]]
+    ) -> Iterator[Packet]:
+        for container, (start_frame, _) in zip(inputs, segments):
+            input_stream = container.streams.video[0]
+            assert input_stream.time_base, "Segment does not have a time_base"
+            offset = round(
+                Fraction(start_frame, self.framerate) / input_stream.time_base
+            )
+            for packet in container.demux(input_stream):
+                if packet.dts is None:
+                    continue
+                packet.pts += offset
+                packet.dts += offset
+                yield packet
+
+
+def interleave(*packet_streams: Iterator[Packet]) -> Iterator[Packet]:
+    """Merge packet streams that are each in dts order, in dts time order"""
+    return heapq.merge(
+        *(
+            (packet for packet in packets if packet.dts is not None)
+            for packets in packet_streams
+        ),
+        key=lambda packet: packet.dts * packet.time_base,
+    )
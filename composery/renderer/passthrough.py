@@ -0,0 +1,106 @@
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from av import Codec
+from av.audio.stream import AudioStream
+from av.container import InputContainer, OutputContainer
+from av.container import open as open_container
+
+from composery import stats
+from composery.components.audio import Audio
+from composery.logger import logger
+from composery.renderer.pipeline import FrameItem
+
+if TYPE_CHECKING:
+    from composery.renderer.cpu import CPURenderer
+
+
+class AudioPassthrough:
+    """Copies the audio packets of a source that the mix would leave unchanged.
+
+    A render qualifies when its only audio component plays its source from
+    the start at full volume, and the source is stored with the codec,
+    sample rate and channels of the output. The packets of the source are
+    then muxed as they are, shifted to the start of the component and cut
+    at its end, instead of being decoded, mixed and encoded again. The
+    limiter is not applied to them.
+    """
+
+    __slots__ = ("component", "container", "stream", "offset", "end_time")
+
+    def __init__(
+        self, renderer: "CPURenderer", component: Audio, container: InputContainer
+    ):
+        self.component = component
+        self.container = container
+        self.stream = container.streams.audio[0]
+        assert self.stream.time_base, "Stream does not have a time_base"
+        # The shift of the timestamps, in ticks of the stream
+        self.offset = round(component.start_at / self.stream.time_base)
+        self.end_time = min(component.end_at, renderer.duration)
+
+    @classmethod
+    def create(cls, renderer: "CPURenderer") -> Optional["AudioPassthrough"]:
+        """Open the source, None with the reason logged if it does not qualify"""
+        components = renderer.timeline.composition.audio_components
+        if len(components) != 1:
+            logger.info(
+                f"Audio passthrough disabled: {len(components)} audio components"
+            )
+            return
+        component = components[0]
+        if component.volume != 1 or component.trim.start or component.trim.end:
+            logger.info(
+                "Audio passthrough disabled: the audio is trimmed or its volume changed"
+            )
+            return
+        container = open_container(component.source, "r")
+        reason = get_incompatibility(renderer, container)
+        if reason is not None:
+            container.close()
+            logger.info(f"Audio passthrough disabled: {reason}")
+            return
+        logger.info(f"Audio passthrough copies the audio of {component.source}")
+        return cls(renderer, component, container)
+
+    def add_stream(self, output_container: OutputContainer) -> AudioStream:
+        """Add an output stream with the codec parameters of the source"""
+        return output_container.add_stream(template=self.stream)
+
+    def iter_items(self, audio_stream: AudioStream) -> Iterator[FrameItem]:
+        """Get the packets of the source to mux, in decode order
+
+        The pts of the items is in samples of the output, to interleave them
+        with the video frames.
+        """
+        time_base = self.stream.time_base
+        sample_rate = self.stream.sample_rate
+        for packet in self.container.demux(self.stream):
+            if packet.dts is None or packet.pts is None:
+                continue
+            packet.pts += self.offset
+            packet.dts += self.offset
+            if packet.pts * time_base >= self.end_time:
+                break
+            stats.count("copied_audio_packets")
+            yield audio_stream, packet, round(packet.pts * time_base * sample_rate)
+
+    def close(self) -> None:
+        self.container.close()
+
+
+def get_incompatibility(
+    renderer: "CPURenderer", container: InputContainer
+) -> Optional[str]:
+    """Get why the audio packets of a source can not be copied, None if they can"""
+    options = renderer.options
+    if not container.streams.audio:
+        return "the source has no audio"
+    audio_stream = container.streams.audio[0]
+    # Decoders and encoders of a format have different names, as mp3float and libmp3lame
+    if audio_stream.codec_context.codec.id != Codec(options.audio_codec, "w").id:
+        return f"the source codec is {audio_stream.codec_context.name}"
+    if audio_stream.sample_rate != options.audio_sample_rate:
+        return f"the source sample rate is {audio_stream.sample_rate}"
+    if audio_stream.channels != options.audio_channels:
+        return f"the source has {audio_stream.channels} channels"
+    return
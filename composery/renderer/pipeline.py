@@ -0,0 +1,181 @@
+from queue import Queue
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from av.audio.frame import AudioFrame
+from av.audio.stream import AudioStream
+from av.container import OutputContainer
+from av.packet import Packet
+from av.video.frame import VideoFrame
+from av.video.stream import VideoStream
+
+from composery import stats
+from composery.logger import logger
+
+Frame = Union[VideoFrame, AudioFrame]
+Stream = Union[VideoStream, AudioStream]
+
+# (stream, frame, pts), the frame can be a packet copied from a source, and
+# the pts then only orders the items
+FrameItem = Tuple[Stream, Union[Frame, Packet], int]
+
+_DONE = None
+
+
+def encode_item(item: FrameItem) -> List[Packet]:
+    """Encode the frame of an item, setting its pts right before
+
+    A packet is muxed as it is, in the time base it was read with.
+    """
+    stream, frame, pts = item
+    if isinstance(frame, Packet):
+        frame.stream = stream
+        return [frame]
+    frame.pts = pts
+    with stats.timer("encode"):
+        return stream.encode(frame)
+
+
+class StageQueue:
+    """A bounded queue that records its occupancy and the time spent waiting
+
+    A queue that is mostly full means its consumer is the bottleneck, and one
+    that is mostly empty means its producer is.
+    """
+
+    __slots__ = (
+        "name",
+        "queue",
+        "gets",
+        "total_occupancy",
+        "max_occupancy",
+        "put_wait",
+        "get_wait",
+    )
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.queue: Queue[Any] = Queue(maxsize=depth)
+        self.gets = 0
+        self.total_occupancy = 0
+        self.max_occupancy = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def put(self, item: Any) -> None:
+        start = perf_counter()
+        self.queue.put(item)
+        self.put_wait += perf_counter() - start
+
+    def get(self) -> Any:
+        occupancy = self.queue.qsize()
+        self.gets += 1
+        self.total_occupancy += occupancy
+        self.max_occupancy = max(self.max_occupancy, occupancy)
+        start = perf_counter()
+        item = self.queue.get()
+        self.get_wait += perf_counter() - start
+        return item
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": self.queue.maxsize,
+            "mean_occupancy": self.total_occupancy / self.gets if self.gets else 0,
+            "max_occupancy": self.max_occupancy,
+            "producer_wait": self.put_wait,
+            "consumer_wait": self.get_wait,
+        }
+
+
+class RenderPipeline:
+    """Runs frame production, encoding and muxing on separate threads.
+
+    The production thread iterates the frames, which is where decoding and
+    compositing happen, the encoding thread encodes them in order, setting
+    each pts right before encoding so a frame object can be queued more than
+    once, and the calling thread muxes the packets.
+    """
+
+    __slots__ = ("frames", "packets", "_error")
+
+    def __init__(self, depth: int):
+        assert depth > 0, "Pipeline depth must be greater than 0"
+        self.frames = StageQueue("frames", depth)
+        self.packets = StageQueue("packets", depth)
+        self._error: Optional[BaseException] = None
+
+    def run(
+        self,
+        frames: Iterable[FrameItem],
+        streams: Sequence[Stream],
+        output_container: OutputContainer,
+    ) -> None:
+        """Encode and mux frames, then flush the encoders of the streams
+
+        Args:
+            frames (Iterable[FrameItem]): The (stream, frame, pts) to encode,
+                or the packets to copy
+            streams (Sequence[Stream]): The streams to flush at the end
+            output_container (OutputContainer): The container to mux to
+        """
+        # Open the encoders and write the header before any thread encodes
+        output_container.start_encoding()
+        threads = [
+            stats.thread(self._produce, "render-produce", args=(frames,)),
+            stats.thread(self._encode, "render-encode", args=(streams,)),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while (packets := self.packets.get()) is not _DONE:
+                with stats.timer("mux"):
+                    output_container.mux(packets)
+        except BaseException as error:
+            self._error = error
+            # Unblock the encoder
+            while self.packets.get() is not _DONE:
+                pass
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+        stats.get_stats().queues.update(self.stats())
+        logger.info(f"Render pipeline stats: {self.stats()}")
+
+    def _produce(self, frames: Iterable[FrameItem]) -> None:
+        try:
+            for item in frames:
+                if self._error is not None:
+                    break
+                self.frames.put(item)
+        except BaseException as error:
+            self._error = error
+        finally:
+            self.frames.put(_DONE)
+
+    def _encode(self, streams: Sequence[Stream]) -> None:
+        produced = False
+        try:
+            while (item := self.frames.get()) is not _DONE:
+                if self._error is not None:
+                    continue
+                self.packets.put(encode_item(item))
+            produced = True
+            if self._error is None:
+                for stream in streams:
+                    with stats.timer("encode"):
+                        packets = stream.encode(None)
+                    self.packets.put(packets)
+        except BaseException as error:
+            self._error = error
+            # Unblock the producer
+            while not produced and self.frames.get() is not _DONE:
+                pass
+        finally:
+            self.packets.put(_DONE)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the occupancy and wait times of each queue"""
+        return {queue.name: queue.stats() for queue in (self.frames, self.packets)}
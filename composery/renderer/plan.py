@@ -0,0 +1,222 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from composery.components import Component, Text, Video
+from composery.index import ComponentIndex
+from composery.reader.cache import FrameSize
+from composery.reader.video import VideoReader
+from composery.renderer.compositor import Compositor
+from composery.renderer.options import scale_size
+from composery.renderer.processors import text, video
+
+
+def get_position(
+    component: Component,
+    canvas_size: tuple[int, int],
+    size: tuple[int, int],
+    offset: int,
+    scale: float,
+) -> tuple[int, int]:
+    """Get the position of a component on a canvas scaled by `scale`
+
+    Positions in pixels are scaled, aligned positions are resolved on the
+    scaled canvas.
+    """
+    x, y = component.fixed_position(canvas_size, size, offset)
+    if isinstance(component.position.x, int):
+        x = round(x * scale)
+    if isinstance(component.position.y, int):
+        y = round(y * scale)
+    return x, y
+
+
+class LayerOp:
+    """A layer drawn on every frame from `start_at` to `end_at`.
+
+    Ops are compiled once per composition with everything the frame loop
+    needs already resolved, so drawing a layer does no layout math and no
+    attribute access on the components.
+    """
+
+    __slots__ = ("start_at", "end_at", "z_index")
+
+    # Whether the layer looks the same on every frame it is drawn
+    static = True
+
+    def __init__(self, component: Component):
+        self.start_at = component.start_at
+        self.end_at = component.end_at
+        self.z_index = component.z_index
+
+    def draw(self, compositor: Compositor, time: float) -> None:
+        """Draw the layer at a time of the composition"""
+        raise NotImplementedError("draw method must be implemented")
+
+    def describe(self) -> Dict[str, Any]:
+        """Get the resolved values of the op, for inspection"""
+        return {
+            "type": type(self).__name__,
+            "start_at": self.start_at,
+            "end_at": self.end_at,
+            "z_index": self.z_index,
+        }
+
+
+class VideoOp(LayerOp):
+    """Draws the frames of a video source at the size of the component.
+
+    The frames are scaled once when decoded, with the conversion to the
+    pixel format of the compositor, and the scaled frames are cached. Each
+    op reads the source with a reader of its own.
+    """
+
+    __slots__ = ("source", "reader", "rect", "_source_size")
+
+    static = False
+
+    def __init__(
+        self, component: Video, canvas_size: tuple[int, int], scale: float = 1
+    ):
+        super().__init__(component)
+        self.source = component.source
+        self.reader = VideoReader(component.source)
+        size = scale_size((component.width, component.height), scale)
+        position = get_position(component, canvas_size, size, 0, scale)
+        # (x, y, width, height) in pixels of the canvas
+        self.rect = (*position, *size)
+        # Probed by the reader when the size is first needed, so building a
+        # plan does not open the sources
+        self._source_size: Optional[FrameSize] = None
+
+    @property
+    def size(self) -> Optional[FrameSize]:
+        """The size the frames are decoded to, None for the source size"""
+        if self._source_size is None:
+            self._source_size = self.reader.size
+        size = self.rect[2:]
+        return size if size != self._source_size else None
+
+    def draw(self, compositor: Compositor, time: float) -> None:
+        video.process_frame(
+            compositor, self.reader, time - self.start_at, self.rect[:2], self.size
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "source": self.source, "rect": self.rect}
+
+
+class TextOp(LayerOp):
+    """Draws the rasterized image of a text.
+
+    The image is taken from the text cache, or rasterized, the first time
+    the text is drawn and kept by the op, so the cache only shares images
+    between ops and renders. The position depends on the size of the image,
+    so it is resolved at the same time. On a scaled plan, the text is
+    rasterized with scaled font sizes.
+    """
+
+    __slots__ = ("text", "key", "canvas_size", "scale", "rect", "image")
+
+    def __init__(self, component: Text, canvas_size: tuple[int, int], scale: float = 1):
+        super().__init__(component)
+        self.text = scale_text(component, scale)
+        self.key = text.get_text_key(self.text.content, self.text.style)
+        self.canvas_size = canvas_size
+        self.scale = scale
+        self.rect: Optional[Tuple[int, int, int, int]] = None
+        self.image: Optional[Image.Image] = None
+
+    def draw(self, compositor: Compositor, time: float) -> None:
+        if self.image is None or self.rect is None:
+            self.image = text.get_text_frame(self.text, self.key)
+            self.rect = self.resolve(self.image)
+        compositor.draw_image(self.image, self.rect[:2])
+
+    def resolve(self, image: Image.Image) -> Tuple[int, int, int, int]:
+        """Get the rectangle of the text from the size of its image"""
+        position = get_position(
+            self.text,
+            self.canvas_size,
+            (
+                image.size[0] + round(self.text.content_length * self.scale),
+                image.size[1],
+            ),
+            self.text.style.font_size,
+            self.scale,
+        )
+        return (*position, *image.size)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            **super().describe(),
+            "content": self.text.content,
+            "key": self.key,
+            "rect": self.rect,
+        }
+
+
+def scale_text(component: Text, scale: float) -> Text:
+    """Get a copy of a text with its font and stroke scaled"""
+    if scale == 1:
+        return component
+    style = component.style
+    return component.model_copy(
+        update={
+            "style": style.model_copy(
+                update={
+                    "font_size": max(round(style.font_size * scale), 1),
+                    "stroke_width": round(style.stroke_width * scale),
+                }
+            )
+        }
+    )
+
+
+def compile_op(
+    component: Component, canvas_size: tuple[int, int], scale: float = 1
+) -> Optional[LayerOp]:
+    """Compile the op drawing a component, None if the component is not drawn"""
+    if isinstance(component, Video):
+        return VideoOp(component, canvas_size, scale)
+    if isinstance(component, Text):
+        return TextOp(component, canvas_size, scale)
+    return
+
+
+class RenderPlan:
+    """The flat list of layer ops of a composition, indexed by time.
+
+    A plan with a `scale` lower than 1 draws the composition on a canvas
+    scaled by it, for drafts.
+    """
+
+    __slots__ = ("canvas_size", "scale", "ops", "index")
+
+    def __init__(
+        self,
+        components: Sequence[Component],
+        canvas_size: tuple[int, int],
+        scale: float = 1,
+    ):
+        self.canvas_size = scale_size(canvas_size, scale)
+        self.scale = scale
+        ops = (
+            compile_op(component, self.canvas_size, scale) for component in components
+        )
+        self.ops: Tuple[LayerOp, ...] = tuple(op for op in ops if op is not None)
+        self.index = ComponentIndex(self.ops)
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __iter__(self) -> Iterator[LayerOp]:
+        return iter(self.index.components)
+
+    def at(self, time: float) -> Tuple[LayerOp, ...]:
+        """Get the ops drawn at a time, in z-order"""
+        return self.index.at(time)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Get the resolved values of every op, in z-order"""
+        return [op.describe() for op in self]
@@ -0,0 +1,107 @@
+from fractions import Fraction
+from typing import Iterable, Optional
+
+import numpy as np
+from av.audio.frame import AudioFrame
+
+from composery.components.audio import Audio
+from composery.reader.pcm import get_pcm, read_pcm
+from composery.renderer.options import VideoWriterOptions
+
+CHANNEL_LAYOUTS = {1: "mono", 2: "stereo"}
+
+# Samples louder than this are soft clipped by the limiter
+LIMITER_THRESHOLD = 0.9
+
+
+def get_channel_layout(channels: int) -> str:
+    """Get the name of the channel layout for a number of channels"""
+    assert channels in CHANNEL_LAYOUTS, f"Unsupported audio channels: {channels}"
+    return CHANNEL_LAYOUTS[channels]
+
+
+def limit(samples: np.ndarray, threshold: float = LIMITER_THRESHOLD) -> None:
+    """Soft clip the samples above the threshold in place.
+
+    The samples above the threshold are compressed with a tanh curve that
+    continues the linear part, so the output never exceeds full scale and
+    quiet mixes are left untouched.
+
+    Args:
+        samples (np.ndarray): The float32 samples
+        threshold (float): The level where the limiting starts, below 1
+    """
+    magnitude = np.abs(samples)
+    loud = magnitude > threshold
+    if not loud.any():
+        return
+    headroom = 1 - threshold
+    samples[loud] = np.copysign(
+        threshold + headroom * np.tanh((magnitude[loud] - threshold) / headroom),
+        samples[loud],
+    )
+
+
+class AudioMixer:
+    """Mixes the active audio components into fixed size frames.
+
+    The sources are decoded once to the sample rate and layout of the output
+    by the PCM cache, and the samples of every component are read as views
+    of it and summed with their volume in float32 before limiting. The cost
+    of a frame only depends on the number of active components.
+    """
+
+    __slots__ = ("sample_rate", "samples", "layout", "directory", "_mix", "_scaled")
+
+    def __init__(self, options: VideoWriterOptions):
+        self.sample_rate = options.audio_sample_rate
+        self.samples = options.audio_samples
+        self.layout = get_channel_layout(options.audio_channels)
+        self.directory: Optional[str] = options.audio_cache_directory
+        self._mix = np.zeros((options.audio_channels, self.samples), dtype=np.float32)
+        self._scaled = np.empty_like(self._mix)
+
+    def mix(self, components: Iterable[Audio], start: int) -> AudioFrame:
+        """Mix a frame of the audio components.
+
+        Args:
+            components (Iterable[Audio]): The audio components active during
+                the frame
+            start (int): The index of the first sample of the frame
+
+        Returns:
+            AudioFrame: The fltp frame of `audio_samples` samples
+        """
+        mix = self._mix
+        mix.fill(0)
+        end = start + self.samples
+        for component in components:
+            component_start = round(component.start_at * self.sample_rate)
+            component_end = round(component.end_at * self.sample_rate)
+            if component.trim.end:
+                trimmed_length = component.trim.end - component.trim.start
+                component_end = min(
+                    component_end,
+                    component_start + round(trimmed_length * self.sample_rate),
+                )
+            first, last = max(start, component_start), min(end, component_end)
+            if first >= last or component.volume == 0:
+                continue
+            source_start = (
+                round(component.trim.start * self.sample_rate) + first - component_start
+            )
+            pcm = get_pcm(
+                component.source, self.sample_rate, self.layout, self.directory
+            )
+            samples = read_pcm(pcm, source_start, last - first)
+            if component.volume != 1:
+                # The samples can be a read only view of the cache
+                samples = np.multiply(
+                    samples, component.volume, out=self._scaled[:, : last - first]
+                )
+            mix[:, first - start : last - start] += samples
+        limit(mix)
+        frame = AudioFrame.from_ndarray(mix, format="fltp", layout=self.layout)
+        frame.sample_rate = self.sample_rate
+        frame.time_base = Fraction(1, self.sample_rate)
+        return frame
@@ -1,2 +1,205 @@
-from numpy import ndarray
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from hashlib import blake2b
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterable, Optional, Tuple
+
 from PIL import Image
+
+from composery import stats
+from composery.components.text import Text, TextStyle
+
+DEFAULT_TEXT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def get_text_key(content: str, style: TextStyle) -> str:
+    """Get the hash of the content and the full style of a text"""
+    digest = blake2b(digest_size=16)
+    digest.update(content.encode())
+    digest.update(b"\0")
+    digest.update(style.model_dump_json().encode())
+    return digest.hexdigest()
+
+
+def get_image_size(image: Image.Image) -> int:
+    """Get the number of bytes held by the pixels of an image"""
+    return image.width * image.height * len(image.getbands())
+
+
+class TextCache:
+    """A thread safe LRU cache of rasterized texts with a byte budget.
+
+    Texts are keyed by the hash of their content and style, so identical
+    texts of different components, and of consecutive renders, are only
+    rasterized once. With a directory, the bitmaps are also written as PNG
+    files that other processes load instead of rasterizing them again.
+    """
+
+    __slots__ = (
+        "max_size",
+        "directory",
+        "size",
+        "hits",
+        "disk_hits",
+        "misses",
+        "_images",
+        "_lock",
+    )
+
+    def __init__(
+        self, max_size: int = DEFAULT_TEXT_CACHE_SIZE, directory: Optional[str] = None
+    ):
+        self.max_size = max_size
+        self.directory = directory
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._images: OrderedDict[str, Tuple[Image.Image, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        filename = self._get_filename(key)
+        if filename is None or not os.path.exists(filename):
+            with self._lock:
+                self.misses += 1
+            return
+        with Image.open(filename) as file:
+            image = file.convert("RGBA")
+        with self._lock:
+            self.disk_hits += 1
+        self._store(key, image)
+        return image
+
+    def put(self, key: str, image: Image.Image) -> None:
+        self._store(key, image)
+        filename = self._get_filename(key)
+        if filename is None or os.path.exists(filename):
+            return
+        assert self.directory is not None
+        os.makedirs(self.directory, exist_ok=True)
+        # Written aside and renamed, so other processes never load a
+        # partially written file
+        with NamedTemporaryFile(
+            dir=self.directory, suffix=".tmp", delete=False
+        ) as output:
+            image.save(output, format="PNG")
+        os.replace(output.name, filename)
+
+    def _store(self, key: str, image: Image.Image) -> None:
+        image_size = get_image_size(image)
+        if image_size > self.max_size:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._images[key] = (image, image_size)
+            self.size += image_size
+            self._evict()
+
+    def _get_filename(self, key: str) -> Optional[str]:
+        if self.directory is None:
+            return
+        return os.path.join(self.directory, f"{key}.png")
+
+    def resize(self, max_size: int) -> None:
+        """Change the byte budget, evicting images if needed"""
+        assert max_size >= 0, "Cache size must be greater or equal to 0"
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self) -> None:
+        """Clear the images in memory, the files of the directory are kept"""
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def _evict(self) -> None:
+        while self.size > self.max_size and self._images:
+            _, (_, image_size) = self._images.popitem(last=False)
+            self.size -= image_size
+
+
+TEXT_CACHE = TextCache()
+
+
+def get_text_frame(text: Text, key: Optional[str] = None) -> Image.Image:
+    """Get the rasterized image of a text, rasterizing it on a cache miss
+
+    Args:
+        text (Text): The text component
+        key (Optional[str]): The key of the text, computed when not given
+
+    Returns:
+        Image.Image: The RGBA image of the text
+    """
+    key = key or get_text_key(text.content, text.style)
+    image = TEXT_CACHE.get(key)
+    if image is None:
+        with stats.timer("rasterize"):
+            image = text.generate_frame()
+        TEXT_CACHE.put(key, image)
+    return image
+
+
+class TextRasterizer:
+    """Rasterizes the texts missing from the cache in a pool of processes.
+
+    The worker processes are started and given every text on creation, so
+    the rasterization runs while the caller goes on, for instance while the
+    decoders warm up, and `wait` puts the images in the cache. Identical
+    texts are only rasterized once.
+    """
+
+    __slots__ = ("start_time", "_futures")
+
+    def __init__(self, texts: Iterable[Text], workers: int):
+        assert workers > 0, "Workers must be greater than 0"
+        self.start_time = perf_counter()
+        pending: Dict[str, Text] = {}
+        for text in texts:
+            key = get_text_key(text.content, text.style)
+            if key not in pending and TEXT_CACHE.get(key) is None:
+                pending[key] = text
+        self._futures: Dict[str, Future[Image.Image]] = {}
+        if not pending:
+            return
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(pending)))
+        try:
+            for key, text in pending.items():
+                self._futures[key] = pool.submit(Text.generate_frame, text)
+        finally:
+            # The submitted texts are still rasterized, without blocking
+            pool.shutdown(wait=False)
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def wait(self) -> float:
+        """Wait for the texts and put them in the cache
+
+        Returns:
+            float: The wall time in seconds since the rasterizer was created
+        """
+        for key, future in self._futures.items():
+            TEXT_CACHE.put(key, future.result())
+        end_time = perf_counter()
+        stats.get_stats().add("prepare_text", self.start_time, end_time)
+        return end_time - self.start_time
@@ -1,27 +1,30 @@
-from PIL import Image
+from typing import Optional
 
-from composery.reader import video as reader
+from composery.reader.cache import FrameSize
+from composery.reader.video import VideoReader
+from composery.renderer.compositor import Compositor
 
 
 def process_frame(
-    frame: Image.Image, source: str, time: float, position: tuple[int, int]
-) -> Image.Image:
-    """Get a frame from a video and paste it into another frame
+    compositor: Compositor,
+    reader: VideoReader,
+    time: float,
+    position: tuple[int, int],
+    size: Optional[FrameSize] = None,
+) -> None:
+    """Get a frame from a video and draw it on the compositor
 
     Args:
-        frame (Image.Image): The frame to paste the video frame
-        source (str): The video source
+        compositor (Compositor): The compositor of the frame being rendered
+        reader (VideoReader): The reader of the video source
         time (float): The time to get the frame
-        position (tuple[int, int]): The position to paste the video frame
-
-    Returns:
-        Image.Image: The frame with the video frame pasted
+        position (tuple[int, int]): The position to draw the video frame
+        size (Optional[FrameSize]): The size to scale the frame to when decoded,
+            in the video format of the compositor
     """
 
-    video_frame = reader.get_frame_from_video(source, time)
+    video_frame = reader.read(time, size, compositor.video_format)
     if not video_frame:
-        return frame
+        return
 
-    video_frame = video_frame.to_image()
-    frame.paste(video_frame, position)
-    return frame
+    compositor.draw_video(video_frame, position)
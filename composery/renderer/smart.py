@@ -0,0 +1,399 @@
+import re
+from fractions import Fraction
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from av import CodecContext
+from av.audio.stream import AudioStream
+from av.container import InputContainer
+from av.container import open as open_container
+from av.packet import Packet
+from av.video.codeccontext import VideoCodecContext
+from av.video.stream import VideoStream
+
+from composery import stats
+from composery.logger import logger
+from composery.renderer.output import open_output
+from composery.renderer.parallel import interleave
+from composery.renderer.pipeline import FrameItem, encode_item
+from composery.renderer.plan import VideoOp
+
+if TYPE_CHECKING:
+    from composery.renderer.cpu import CPURenderer
+
+# (start frame, end frame, packets of the source, whether they are copied)
+Gop = Tuple[int, int, int, bool]
+
+# (start frame, end frame) of frames rendered as usual
+FrameRange = Tuple[int, int]
+
+START_CODE = re.compile(rb"\x00\x00\x00?\x01")
+
+# The libx264 profiles of the 4:2:0 8 bit H.264 profile numbers of avcC records
+PROFILES = {66: "baseline", 77: "main", 100: "high"}
+
+
+def to_length_prefixed(data: bytes, length_size: int) -> bytes:
+    """Convert H.264 NAL units from Annex B start codes to length prefixes
+
+    MP4 tracks store NAL units prefixed with their length, and encoders
+    that are not opened by a muxer output start codes.
+    """
+    output = bytearray()
+    for nal_unit in START_CODE.split(data):
+        if nal_unit:
+            output += len(nal_unit).to_bytes(length_size, "big")
+            output += nal_unit
+    return bytes(output)
+
+
+def get_parameter_sets(extradata: bytes, length_size: int) -> bytes:
+    """Get the SPS and PPS of an avcC record as length prefixed NAL units"""
+    output = bytearray()
+    offset = 5
+    for count_mask in (0x1F, 0xFF):
+        count = extradata[offset] & count_mask
+        offset += 1
+        for _ in range(count):
+            size = int.from_bytes(extradata[offset : offset + 2], "big")
+            offset += 2
+            output += size.to_bytes(length_size, "big")
+            output += extradata[offset : offset + size]
+            offset += size
+    return bytes(output)
+
+
+def get_dirty_ranges(gops: Sequence[Gop]) -> List[FrameRange]:
+    """Merge the consecutive GOPs that are not copied into frame ranges"""
+    ranges: List[FrameRange] = []
+    for start_frame, end_frame, _, copied in gops:
+        if copied:
+            continue
+        if ranges and ranges[-1][1] == start_frame:
+            ranges[-1] = (ranges[-1][0], end_frame)
+        else:
+            ranges.append((start_frame, end_frame))
+    return ranges
+
+
+class SmartRender:
+    """Copies the GOPs of a background video that nothing is drawn over.
+
+    A render qualifies when its bottom layer is an H.264 video filling the
+    canvas for the whole composition, at the framerate of the composition.
+    The GOPs of the source whose frames only show that video are muxed as
+    they are, and the others are rendered as usual and encoded with one
+    encoder per run of consecutive GOPs. Each run starts with a keyframe
+    carrying its own parameter sets, and its decode timestamps are delayed
+    like the ones of the source, so the splices decode cleanly.
+    """
+
+    __slots__ = (
+        "renderer",
+        "op",
+        "stream",
+        "frame_ticks",
+        "base_pts",
+        "delay",
+        "length_size",
+        "parameter_sets",
+        "profile",
+        "level",
+        "gops",
+        "dirty_ranges",
+    )
+
+    def __init__(self, renderer: "CPURenderer", op: VideoOp, container: InputContainer):
+        self.renderer = renderer
+        self.op = op
+        self.stream = container.streams.video[0]
+        assert self.stream.time_base, "Stream does not have a time_base"
+        # The duration of a frame in ticks of the stream
+        self.frame_ticks = Fraction(1, renderer.framerate) / self.stream.time_base
+        extradata = bytes(self.stream.codec_context.extradata)
+        self.length_size = (extradata[4] & 3) + 1
+        self.parameter_sets = get_parameter_sets(extradata, self.length_size)
+        self.profile = PROFILES[extradata[1]]
+        self.level = extradata[3]
+        self.base_pts = 0
+        self.delay = 0
+        with stats.timer("analyse"):
+            self.gops = self.get_gops(container)
+        self.dirty_ranges = get_dirty_ranges(self.gops)
+
+    @classmethod
+    def create(cls, renderer: "CPURenderer") -> Optional["SmartRender"]:
+        """Analyse the render, None with the reason logged if it does not qualify"""
+        op = get_background(renderer)
+        if op is None:
+            logger.info("Smart render disabled: no full frame background video")
+            return
+        container = open_container(op.source, "r")
+        try:
+            reason = get_incompatibility(renderer, container)
+            if reason is not None:
+                logger.info(f"Smart render disabled: {reason}")
+                return
+            smart_render = cls(renderer, op, container)
+        finally:
+            container.close()
+        if smart_render.delay < 0:
+            logger.info("Smart render disabled: invalid timestamps")
+            return
+        copied = sum(gop[1] - gop[0] for gop in smart_render.gops if gop[3])
+        logger.info(f"Smart render copies {copied} of {renderer.total_frames} frames")
+        return smart_render
+
+    def get_frame_number(self, pts: int) -> Fraction:
+        return (pts - self.base_pts) / self.frame_ticks
+
+    def get_gops(self, container: InputContainer) -> List[Gop]:
+        """Split the source in GOPs and find the ones that can be copied
+
+        A GOP is copied when its packets are one per frame at the cadence of
+        the composition, with the decode delay of the first GOP, and when
+        the background is drawn alone on all of its frames.
+        """
+        gops: List[Gop] = []
+        # [start frame, packets, frames seen, whether timestamps are regular]
+        current: Optional[list] = None
+
+        def close(end_frame: int) -> None:
+            assert current is not None
+            start_frame, packets, frames, regular = current
+            regular = regular and packets == end_frame - start_frame
+            regular = regular and frames == set(range(start_frame, end_frame))
+            gops.append((start_frame, end_frame, packets, regular))
+
+        for packet in container.demux(self.stream):
+            if packet.dts is None or packet.pts is None:
+                continue
+            if current is None:
+                if not packet.is_keyframe:
+                    self.delay = -1
+                    return []
+                self.base_pts = packet.pts
+                self.delay = packet.pts - packet.dts
+            frame_number = self.get_frame_number(packet.pts)
+            if packet.is_keyframe:
+                if current is not None:
+                    close(int(frame_number))
+                current = [int(frame_number), 0, set(), frame_number.denominator == 1]
+            start_frame, packets = current[0], current[1]
+            # Decode timestamps advance a frame per packet from the keyframe
+            expected_dts = (
+                self.base_pts + (start_frame + packets) * self.frame_ticks - self.delay
+            )
+            current[1] += 1
+            current[2].add(int(frame_number))
+            current[3] = (
+                current[3]
+                and frame_number.denominator == 1
+                and packet.dts == expected_dts
+            )
+        if current is not None:
+            close(current[0] + current[1])
+        return self.clip(gops)
+
+    def clip(self, gops: List[Gop]) -> List[Gop]:
+        """Fit the GOPs to the frames of the composition and mark the ones drawn over"""
+        total_frames = self.renderer.total_frames
+        clipped: List[Gop] = []
+        for start_frame, end_frame, packets, copied in gops:
+            if start_frame >= total_frames:
+                break
+            if end_frame > total_frames:
+                end_frame, copied = total_frames, False
+            copied = copied and self.is_untouched(start_frame, end_frame)
+            clipped.append((start_frame, end_frame, packets, copied))
+        end_frame = clipped[-1][1] if clipped else 0
+        if end_frame < total_frames:
+            # The source ends before the composition
+            clipped.append((end_frame, total_frames, 0, False))
+        return clipped
+
+    def is_untouched(self, start_frame: int, end_frame: int) -> bool:
+        """Check that only the background is drawn on a range of frames"""
+        framerate = self.renderer.framerate
+        return all(
+            self.renderer.get_ops_at_time(frame_number / framerate) == (self.op,)
+            for frame_number in range(start_frame, end_frame)
+        )
+
+    def render(self) -> None:
+        """Write the output, the audio is copied or mixed as usual"""
+        renderer = self.renderer
+        container = open_container(self.op.source, "r")
+        # The container of the analysis is closed
+        self.stream = container.streams.video[0]
+        try:
+            with open_output(renderer.output_filename, renderer.options) as output:
+                video_stream = output.add_stream(template=self.stream)
+                with renderer.audio_output(output) as (audio_stream, items, encoded):
+                    packets = interleave(
+                        self.iter_video_packets(container),
+                        iter_audio_packets(items, audio_stream if encoded else None),
+                    )
+                    for packet in packets:
+                        packet.stream = (
+                            video_stream
+                            if packet.stream.type == "video"
+                            else audio_stream
+                        )
+                        with stats.timer("mux"):
+                            output.mux(packet)
+        finally:
+            container.close()
+
+    def iter_video_packets(self, container: InputContainer) -> Iterator[Packet]:
+        """Get the copied and encoded video packets, in decode order"""
+        packets = (
+            packet
+            for packet in container.demux(self.stream)
+            if packet.dts is not None and packet.pts is not None
+        )
+        frames_done = 0
+        for index, (start_frame, end_frame, source_packets, copied) in enumerate(
+            self.gops
+        ):
+            gop_packets = [next(packets) for _ in range(source_packets)]
+            if copied:
+                if index > 0 and not self.gops[index - 1][3]:
+                    # The encoded run replaced the parameter sets of the source
+                    gop_packets[0] = self.with_parameter_sets(gop_packets[0])
+                for packet in gop_packets:
+                    packet.pts -= self.base_pts
+                    packet.dts -= self.base_pts
+                    yield packet
+                stats.count("copied_frames", end_frame - start_frame)
+            elif index == 0 or self.gops[index - 1][3]:
+                # The first GOP of a run of GOPs that are not copied
+                end_frame = next(
+                    dirty_end
+                    for dirty_start, dirty_end in self.dirty_ranges
+                    if dirty_start == start_frame
+                )
+                yield from self.encode(start_frame, end_frame)
+            else:
+                continue
+            stats.count("frames", end_frame - start_frame)
+            frames_done = end_frame
+            if self.renderer.progress is not None:
+                self.renderer.progress(
+                    frames_done,
+                    self.renderer.total_frames,
+                    frames_done / stats.get_stats().wall_time,
+                )
+
+    def with_parameter_sets(self, packet: Packet) -> Packet:
+        """Get a copy of a keyframe starting with the SPS and PPS of the source"""
+        copy = Packet(self.parameter_sets + bytes(packet))
+        copy.pts = packet.pts
+        copy.dts = packet.dts
+        copy.time_base = packet.time_base
+        copy.is_keyframe = True
+        copy.stream = packet.stream
+        return copy
+
+    def create_encoder(self) -> VideoCodecContext:
+        options = self.renderer.options
+        encoder = CodecContext.create("libx264", "w")
+        assert isinstance(encoder, VideoCodecContext)
+        encoder.width = self.stream.width
+        encoder.height = self.stream.height
+        encoder.pix_fmt = "yuv420p"
+        encoder.time_base = Fraction(1, self.renderer.framerate)
+        encoder.framerate = Fraction(self.renderer.framerate)
+        # Without B-frames the decode delay can be matched to the source
+        encoder.max_b_frames = 0
+        # The splices decode with the profile and level of the source
+        codec_options = {
+            "preset": options.preset.value,
+            "profile": self.profile,
+            "level": str(self.level),
+        }
+        if options.crf is not None:
+            codec_options["crf"] = str(options.crf)
+        else:
+            encoder.bit_rate = int(options.bitrate[:-1]) * 1000
+        encoder.options = codec_options
+        return encoder
+
+    def encode(self, start_frame: int, end_frame: int) -> Iterator[Packet]:
+        """Render and encode a range of frames, starting with a keyframe"""
+        encoder = self.create_encoder()
+        frames = self.renderer.iter_frames(start_frame, end_frame)
+        for index, frame in enumerate(frames):
+            frame.pts = index
+            with stats.timer("encode"):
+                packets = encoder.encode(frame)
+            yield from self.convert(packets, start_frame)
+        with stats.timer("encode"):
+            packets = encoder.encode(None)
+        yield from self.convert(packets, start_frame)
+
+    def convert(self, packets: List[Packet], start_frame: int) -> Iterator[Packet]:
+        """Get encoded packets in the format and timestamps of the source"""
+        for packet in packets:
+            assert packet.pts is not None, "Encoded packet does not have a pts"
+            converted = Packet(to_length_prefixed(bytes(packet), self.length_size))
+            pts = round((start_frame + packet.pts) * self.frame_ticks)
+            converted.pts = pts
+            converted.dts = pts - self.delay
+            converted.time_base = self.stream.time_base
+            converted.is_keyframe = packet.is_keyframe
+            converted.stream = self.stream
+            yield converted
+
+
+def iter_audio_packets(
+    items: Iterable[FrameItem], audio_stream: Optional[AudioStream]
+) -> Iterator[Packet]:
+    """Get the packets of audio items, flushing the encoder of the stream if given"""
+    for item in items:
+        yield from encode_item(item)
+    if audio_stream is not None:
+        with stats.timer("encode"):
+            packets = audio_stream.encode(None)
+        yield from packets
+
+
+def get_background(renderer: "CPURenderer") -> Optional[VideoOp]:
+    """Get the bottom video op if it fills the canvas for the whole render"""
+    ops = list(renderer.plan)
+    if not ops or not isinstance(ops[0], VideoOp):
+        return
+    op = ops[0]
+    if op.start_at > 0 or op.end_at < renderer.duration or op.size is not None:
+        return
+    if op.rect != (0, 0, renderer.width, renderer.height):
+        return
+    return op
+
+
+def get_incompatibility(
+    renderer: "CPURenderer", container: InputContainer
+) -> Optional[str]:
+    """Get why the packets of a source can not be copied, None if they can"""
+    if renderer.options.codec != "h264":
+        return f"the output codec is {renderer.options.codec}"
+    if renderer.options.crf == 0:
+        # Lossless frames need the High 4:4:4 Predictive profile
+        return "the output is lossless"
+    if not container.streams.video:
+        return "the background has no video"
+    video_stream = container.streams.video[0]
+    codec_context = video_stream.codec_context
+    if codec_context.name != "h264":
+        return f"the background codec is {codec_context.name}"
+    if video_stream.format.name != renderer.options.pixel_format.value:
+        return f"the background pixel format is {video_stream.format.name}"
+    if video_stream.format.name != "yuv420p":
+        return f"the background chroma format is {video_stream.format.name}"
+    if video_stream.average_rate != renderer.framerate:
+        return f"the background framerate is {video_stream.average_rate}"
+    extradata = codec_context.extradata
+    if not extradata or extradata[0] != 1:
+        return "the background is not stored with length prefixed NAL units"
+    if extradata[1] not in PROFILES:
+        return f"the background profile is {codec_context.profile}"
+    return
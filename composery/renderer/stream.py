@@ -8,6 +8,7 @@ from av.video.frame import VideoFrame
 from av.video.stream import VideoStream
 
 from composery.renderer.options import VideoWriterOptions
+from composery.renderer.processors.audio import get_channel_layout
 
 Frame = Union[VideoFrame, AudioFrame]
 
@@ -19,27 +20,34 @@ def create_stream(
 ) -> T:
     """Create a setup stream for the av output container"""
     if stream_type == VideoStream:
+        codec_options = {
+            "preset": options.preset.value,
+            "pix_fmt": options.pixel_format.value,
+        }
+        if options.crf is not None:
+            codec_options["crf"] = str(options.crf)
         video_stream = container.add_stream(
-            codec_name=options.codec,
-            rate=options.framerate,
-            options={
-                "crf": str(options.crf),
-                "preset": options.preset.value,
-                "pix_fmt": options.pixel_format.value,
-            },
+            codec_name=options.codec, rate=options.framerate, options=codec_options
         )
         video_stream.width = options.width
         video_stream.height = options.height
         video_stream.thread_type = "AUTO"
+        gop_size = options.gop_size
+        if gop_size is None and options.streaming:
+            # Fragments and segments start on a keyframe
+            gop_size = max(round(options.fragment_duration * options.framerate), 1)
+        if gop_size:
+            video_stream.codec_context.gop_size = gop_size
         video_stream.codec_context.time_base = Fraction(1, options.framerate)
         video_stream.bit_rate = int(options.bitrate[:-1]) * 1000
         return cast(T, video_stream)
 
-    assert isinstance(stream_type, AudioStream), "Invalid stream type"
+    assert stream_type == AudioStream, "Invalid stream type"
     audio_stream = container.add_stream(
         options.audio_codec,
         rate=options.audio_sample_rate,
     )
+    audio_stream.layout = get_channel_layout(options.audio_channels)
     audio_stream.codec_context.time_base = Fraction(1, options.audio_sample_rate)
     audio_stream.bit_rate = int(options.audio_bitrate[:-1]) * 1000
     return cast(T, audio_stream)
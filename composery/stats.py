@@ -0,0 +1,186 @@
+import json
+import os
+from contextvars import ContextVar, copy_context
+from threading import Lock, Thread, get_ident
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# (frames done, total frames, frames per second)
+ProgressCallback = Callable[[int, int, float], None]
+
+# (stage, start, end, thread id)
+TraceEvent = Tuple[str, float, float, int]
+
+
+class StageTimer:
+    """Adds the time spent in a `with` block to a stage of the stats"""
+
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats: "RenderStats", stage: str):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self) -> "StageTimer":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stats.add(self.stage, self.start, perf_counter())
+
+
+class RenderStats:
+    """The time spent in each stage of a render and its counters.
+
+    Stages are timed with the monotonic `perf_counter` and can nest, for
+    instance `composite` includes the `decode` of the video frames it
+    draws. Stages timed on several threads add up the time of every thread.
+    With `trace`, every timed block is also recorded to be exported in the
+    Chrome trace event format.
+    """
+
+    __slots__ = (
+        "trace",
+        "start_time",
+        "end_time",
+        "times",
+        "calls",
+        "counters",
+        "queues",
+        "events",
+        "_lock",
+    )
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.start_time = perf_counter()
+        self.end_time: Optional[float] = None
+        self.times: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.queues: Dict[str, Dict[str, float]] = {}
+        self.events: List[TraceEvent] = []
+        self._lock = Lock()
+
+    def timer(self, stage: str) -> StageTimer:
+        return StageTimer(self, stage)
+
+    def add(self, stage: str, start: float, end: float) -> None:
+        """Add a timed block to a stage"""
+        with self._lock:
+            self.times[stage] = self.times.get(stage, 0.0) + end - start
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            if self.trace:
+                self.events.append((stage, start, end, get_ident()))
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self) -> None:
+        self.end_time = perf_counter()
+
+    @property
+    def wall_time(self) -> float:
+        return (self.end_time or perf_counter()) - self.start_time
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Add the stages and counters of the stats of another process
+
+        Args:
+            other (Dict[str, Any]): The `to_dict` of the other stats
+        """
+        for stage, values in other["stages"].items():
+            with self._lock:
+                self.times[stage] = self.times.get(stage, 0.0) + values["time"]
+                self.calls[stage] = self.calls.get(stage, 0) + values["calls"]
+        for name, value in other["counters"].items():
+            self.count(name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        wall_time = self.wall_time
+        frames = self.counters.get("frames", 0)
+        return {
+            "wall_time": wall_time,
+            "frames": frames,
+            "fps": frames / wall_time if wall_time else 0.0,
+            "stages": {
+                stage: {"time": time, "calls": self.calls[stage]}
+                for stage, time in sorted(self.times.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "queues": self.queues,
+        }
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        """Get the stats as JSON, also writing them to a file when given"""
+        data = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(data)
+        return data
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Get the traced blocks in the Chrome trace event format
+
+        The result can be loaded in chrome://tracing or Perfetto. It is empty
+        unless the stats were created with `trace`.
+        """
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": stage,
+                    "ph": "X",
+                    "ts": (start - self.start_time) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": pid,
+                    "tid": thread_id,
+                }
+                for stage, start, end, thread_id in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+
+# The stats of the render in progress in the current context. Renders on
+# different threads record their own stats, and the threads of a render are
+# started with `thread` to record to the stats of the render.
+STATS: ContextVar[Optional[RenderStats]] = ContextVar("stats", default=None)
+
+
+def start(trace: bool = False) -> RenderStats:
+    """Start recording the stats of a new render in the current context"""
+    render_stats = RenderStats(trace)
+    STATS.set(render_stats)
+    return render_stats
+
+
+def get_stats() -> RenderStats:
+    """Get the stats of the render in progress, new stats if none was started"""
+    render_stats = STATS.get()
+    if render_stats is None:
+        render_stats = start()
+    return render_stats
+
+
+def thread(
+    target: Callable[..., Any], name: str, args: Tuple = (), daemon: bool = False
+) -> Thread:
+    """Create a thread that records to the stats of the render in progress"""
+    context = copy_context()
+    return Thread(target=context.run, args=(target, *args), name=name, daemon=daemon)
+
+
+def timer(stage: str) -> StageTimer:
+    """Time a `with` block as a stage of the render in progress"""
+    return StageTimer(get_stats(), stage)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increase a counter of the render in progress"""
+    get_stats().count(name, value)
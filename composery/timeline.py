@@ -1,20 +1,33 @@
 from enum import Enum
 from timeit import default_timer as timer
-from typing import List, Optional, cast
+from typing import Dict, List, Optional, Sequence, Union, cast
 
-from pydantic import BaseModel, Field, ValidationInfo, computed_field, field_validator
+from pydantic import (
+    BaseModel,
+    Field,
+    PrivateAttr,
+    ValidationInfo,
+    computed_field,
+    field_validator,
+)
 
 from composery.components.video import Video as VideoComponent
 
 from .components.audio import Audio as AudioComponent
 from .components.component import Component, TComponent
+from .index import ComponentIndex
+from .logger import logger
 from .renderer.options import DEFAULT_OPTIONS, VideoWriterOptions
+from .renderer.output import Output, Rendition
+from .renderer.plan import RenderPlan
+from .stats import ProgressCallback, RenderStats
 
 
 class RenderMode(str, Enum):
     """An enum for the rendering mode"""
 
     CPU = "cpu"
+    CPU_PARALLEL = "cpu_parallel"
     GPU = "gpu"
 
 
@@ -30,6 +43,10 @@ class Composition(BaseModel):
     )
     width: int = Field(default=640, gt=0, description="The width of the composition")
     height: int = Field(default=480, gt=0, description="The height of the composition")
+    _index: Optional[ComponentIndex[Component]] = PrivateAttr(default=None)
+    _audio_index: Optional[ComponentIndex[AudioComponent]] = PrivateAttr(default=None)
+    # The compiled plans by scale, see `get_plan`
+    _plans: Dict[float, RenderPlan] = PrivateAttr(default_factory=dict)
 
     @computed_field(repr=False)
     @property
@@ -40,6 +57,60 @@ class Composition(BaseModel):
             if isinstance(component, AudioComponent)
         ]
 
+    def build_index(self) -> None:
+        """Build the interval indexes used to look up the active components"""
+        self._index = ComponentIndex(
+            [
+                component
+                for component in self.components
+                if not isinstance(component, AudioComponent)
+            ]
+        )
+        self._audio_index = ComponentIndex(self.audio_components)
+
+    def detached(self) -> "Composition":
+        """Get a copy without the built index and plans, to send to a worker
+
+        The plans hold the open readers of the video layers, so the copy
+        rebuilds its own index and plans when first used.
+        """
+        composition = self.model_copy()
+        composition._index = None
+        composition._audio_index = None
+        composition._plans = {}
+        return composition
+
+    def build_plan(self, scale: float = 1) -> None:
+        """Compile the render plan of the visual components"""
+        self._plans[scale] = RenderPlan(
+            self.index.components, (self.width, self.height), scale
+        )
+
+    def get_plan(self, scale: float = 1) -> RenderPlan:
+        """Get the plan of the composition scaled by `scale`, compiled once"""
+        if scale not in self._plans:
+            self.build_plan(scale)
+        return self._plans[scale]
+
+    @property
+    def plan(self) -> RenderPlan:
+        """The compiled layer ops drawn by the renderers, for inspection"""
+        return self.get_plan()
+
+    @property
+    def index(self) -> ComponentIndex[Component]:
+        """The index of the visual components"""
+        if self._index is None:
+            self.build_index()
+        return cast(ComponentIndex[Component], self._index)
+
+    @property
+    def audio_index(self) -> ComponentIndex[AudioComponent]:
+        """The index of the audio components"""
+        if self._audio_index is None:
+            self.build_index()
+        return cast(ComponentIndex[AudioComponent], self._audio_index)
+
 
 class Timeline:
     """A class representing a timeline of compositions
@@ -111,6 +182,8 @@ class Timeline:
                 width=self._width,
                 height=self._height,
             )
+            self._timeline.composition.build_index()
+            self._timeline.composition.build_plan()
             # Free the builder
             self.free()
 
@@ -133,19 +206,40 @@ class Timeline:
 
     def render(
         self,
-        filename: str,
+        filename: Union[Output, Sequence[Rendition]],
         mode: RenderMode = RenderMode.CPU,
         options: VideoWriterOptions = DEFAULT_OPTIONS,
-    ) -> None:
+        progress: Optional[ProgressCallback] = None,
+    ) -> RenderStats:
         """Render the timeline
 
         Args:
-            filename (str): The filename to render the timeline to
+            filename (Union[Output, Sequence[Rendition]]): The filename or writable binary
+                file object to render the timeline to, or the directory of the segments
+                and playlist when `options.streaming` is HLS or DASH. A list of renditions
+                renders every rendition from the same composited frames
             mode (RenderMode, optional): The rendering mode. Defaults to RenderMode.CPU.
             options (VideoWriterOptions, optional): The video writer options. Defaults to DEFAULT_OPTIONS.
+            progress (ProgressCallback, optional): Called with the frames done, the total frames and the frames per second.
+
+        Returns:
+            RenderStats: The time spent in each stage of the render and its counters
         """
 
-        if mode == RenderMode.CPU:
+        if isinstance(filename, (list, tuple)):
+            if mode != RenderMode.CPU:
+                raise ValueError("Renditions are only rendered by the CPU renderer")
+            from .renderer.ladder import LadderRenderer
+
+            renderer = LadderRenderer(
+                filename,
+                self.composition.width,
+                self.composition.height,
+                self.composition.duration,
+                self.composition.framerate,
+                options,
+            )
+        elif mode == RenderMode.CPU:
             from .renderer.cpu import CPURenderer
 
             renderer = CPURenderer(
@@ -156,11 +250,53 @@ class Timeline:
                 self.composition.framerate,
                 options,
             )
-            start_time = timer()
-            renderer.render(self)
-            print(f"Rendered in {timer() - start_time} seconds")
+        elif mode == RenderMode.CPU_PARALLEL:
+            from .renderer.parallel import ParallelCPURenderer
+
+            renderer = ParallelCPURenderer(
+                filename,
+                self.composition.width,
+                self.composition.height,
+                self.composition.duration,
+                self.composition.framerate,
+                options,
+            )
         elif mode == RenderMode.GPU:
             raise NotImplementedError("GPU rendering is not supported yet")
+        else:
+            raise ValueError(f"Invalid render mode: {mode}")
+        start_time = timer()
+        render_stats = renderer.render(self, progress)
+        print(f"Rendered in {timer() - start_time} seconds")
+        return render_stats
+
+    @staticmethod
+    def render_batch(
+        timelines: Sequence["Timeline"],
+        filenames: Sequence[Output],
+        options: VideoWriterOptions = DEFAULT_OPTIONS,
+        progress: Optional[ProgressCallback] = None,
+    ) -> RenderStats:
+        """Render timelines that share their video sources, decoding each source frame once
+
+        Args:
+            timelines (Sequence[Timeline]): The timelines to render
+            filenames (Sequence[Output]): The output of each timeline
+            options (VideoWriterOptions, optional): The video writer options of every
+                output, `batch_size` timelines are rendered together. Defaults to DEFAULT_OPTIONS.
+            progress (ProgressCallback, optional): Called with the frames done over all
+                the timelines, their total frames and the frames per second.
+
+        Returns:
+            RenderStats: The time spent in each stage of the batch and its counters
+        """
+        from .renderer.batch import BatchRenderer
+
+        render_stats = BatchRenderer(options).render(timelines, filenames, progress)
+        logger.info(
+            f"Rendered {len(timelines)} timelines in {render_stats.wall_time} seconds"
+        )
+        return render_stats
 
     @property
     def composition(self) -> Composition:
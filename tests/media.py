@@ -0,0 +1,50 @@
+"""Small test videos written with PyAV, shared by the tests."""
+
+from typing import List, Optional
+
+import av
+import numpy as np
+
+WIDTH = 64
+HEIGHT = 48
+
+
+def make_video(
+    path: str,
+    framerate: int,
+    duration: int,
+    codec: str = "libx264",
+    gop_size: Optional[int] = None,
+) -> None:
+    """Write a 64x48 video whose frames each have their own gray level
+
+    Args:
+        path (str): The output path
+        framerate (int): The framerate of the video
+        duration (int): The duration in seconds
+        codec (str): The video codec
+        gop_size (Optional[int]): The distance between keyframes, the
+            default of the encoder when not given
+    """
+    frames = framerate * duration
+    with av.open(path, "w") as container:
+        stream = container.add_stream(codec, rate=framerate)
+        stream.width = WIDTH
+        stream.height = HEIGHT
+        stream.pix_fmt = "yuv420p"
+        if gop_size is not None:
+            stream.codec_context.gop_size = gop_size
+            # No keyframes on scene changes, only every `gop_size` frames
+            stream.codec_context.options = {"sc_threshold": "0"}
+        for index in range(frames):
+            image = np.full((HEIGHT, WIDTH, 3), index * 256 // frames, dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            frame.pts = index
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+
+def decode(path: str) -> List[np.ndarray]:
+    """Decode every frame of the video stream of a file"""
+    with av.open(path) as container:
+        return [frame.to_ndarray() for frame in container.decode(video=0)]
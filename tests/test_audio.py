@@ -0,0 +1,226 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import av
+import numpy as np
+
+from composery import Timeline
+from composery.components.audio import Audio
+from composery.components.component import Trim
+from composery.reader.pcm import free_pcm, get_pcm, read_pcm
+from composery.renderer.options import VideoWriterOptions
+from composery.renderer.processors.audio import AudioMixer, limit
+
+SAMPLE_RATE = 8000
+DURATION = 4
+
+
+def make_ramp(path: str) -> np.ndarray:
+    """Write a wav file whose samples go up by one step per sample"""
+    samples = np.arange(SAMPLE_RATE * DURATION, dtype=np.int16) % 4000
+    stereo = np.stack([samples, samples])
+    with av.open(path, "w") as container:
+        stream = container.add_stream("pcm_s16le", rate=SAMPLE_RATE)
+        stream.layout = "stereo"
+        for start in range(0, stereo.shape[1], 1000):
+            frame = av.AudioFrame.from_ndarray(
+                stereo[:, start : start + 1000].T.reshape(1, -1).copy(),
+                format="s16",
+                layout="stereo",
+            )
+            frame.sample_rate = SAMPLE_RATE
+            frame.pts = start
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+    return stereo.astype(np.float32) / 32768
+
+
+class TestAudio(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "ramp.wav")
+        cls.samples = make_ramp(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.cache_directory = os.path.join(self.directory.name, "pcm")
+        self.options = VideoWriterOptions(
+            audio_sample_rate=SAMPLE_RATE,
+            audio_samples=1000,
+            audio_cache_directory=self.cache_directory,
+        )
+        self.mixer = AudioMixer(self.options)
+
+    def tearDown(self):
+        free_pcm()
+
+    def mix(self, components, start: int) -> np.ndarray:
+        return self.mixer.mix(components, start).to_ndarray()
+
+    def test_pcm_is_decoded_once_and_read_as_views(self):
+        pcm = get_pcm(self.path, SAMPLE_RATE, "stereo", self.cache_directory)
+        np.testing.assert_array_equal(pcm.T, self.samples)
+        samples = read_pcm(pcm, 20000, 1000)
+        self.assertTrue(np.shares_memory(samples, pcm))
+        np.testing.assert_array_equal(samples, self.samples[:, 20000:21000])
+        tail = read_pcm(pcm, SAMPLE_RATE * DURATION - 10, 20)
+        np.testing.assert_array_equal(tail[:, :10], self.samples[:, -10:])
+        self.assertFalse(tail[:, 10:].any())
+        # Other processes map the file written in the cache directory
+        free_pcm()
+        with mock.patch("composery.reader.pcm.decode_pcm") as decode:
+            cached = get_pcm(self.path, SAMPLE_RATE, "stereo", self.cache_directory)
+        decode.assert_not_called()
+        np.testing.assert_array_equal(cached, pcm)
+
+    def test_pcm_is_cached_per_directory(self):
+        get_pcm(self.path, SAMPLE_RATE, "stereo", self.cache_directory)
+        other_directory = os.path.join(self.directory.name, "other-pcm")
+        pcm = get_pcm(self.path, SAMPLE_RATE, "stereo", other_directory)
+        self.assertEqual(len(os.listdir(other_directory)), 1)
+        np.testing.assert_array_equal(pcm.T, self.samples)
+
+    def test_pcm_of_a_rewritten_source_is_decoded_again(self):
+        path = os.path.join(self.directory.name, "rewritten.wav")
+        shutil.copy(self.path, path)
+        get_pcm(path, SAMPLE_RATE, "stereo", self.cache_directory)
+        with av.open(path, "w") as container:
+            stream = container.add_stream("pcm_s16le", rate=SAMPLE_RATE)
+            stream.layout = "stereo"
+            frame = av.AudioFrame.from_ndarray(
+                np.zeros((1, 2000), dtype=np.int16), format="s16", layout="stereo"
+            )
+            frame.sample_rate = SAMPLE_RATE
+            container.mux(stream.encode(frame))
+            container.mux(stream.encode(None))
+        pcm = get_pcm(path, SAMPLE_RATE, "stereo", self.cache_directory)
+        self.assertEqual(pcm.shape, (1000, 2))
+        self.assertFalse(pcm.any())
+
+    def test_pcm_of_late_audio_starts_with_silence(self):
+        path = os.path.join(self.directory.name, "late.mkv")
+        with av.open(path, "w") as container:
+            video_stream = container.add_stream("mpeg4", rate=8)
+            video_stream.width = 64
+            video_stream.height = 48
+            video_stream.pix_fmt = "yuv420p"
+            audio_stream = container.add_stream("pcm_s16le", rate=SAMPLE_RATE)
+            audio_stream.layout = "stereo"
+            for index in range(8):
+                video_frame = av.VideoFrame(64, 48, "yuv420p")
+                video_frame.pts = index
+                container.mux(video_stream.encode(video_frame))
+            container.mux(video_stream.encode(None))
+            # The audio starts half a second after the video
+            frame = av.AudioFrame.from_ndarray(
+                np.full((1, 2000), 16384, dtype=np.int16), format="s16", layout="stereo"
+            )
+            frame.sample_rate = SAMPLE_RATE
+            frame.pts = SAMPLE_RATE // 2
+            container.mux(audio_stream.encode(frame))
+            container.mux(audio_stream.encode(None))
+
+        pcm = get_pcm(path, SAMPLE_RATE, "stereo", self.cache_directory)
+        self.assertEqual(len(pcm), SAMPLE_RATE // 2 + 1000)
+        self.assertFalse(pcm[: SAMPLE_RATE // 2].any())
+        np.testing.assert_array_equal(pcm[SAMPLE_RATE // 2 :], 0.5)
+
+    def test_volume_and_trim(self):
+        audio = Audio(
+            source=self.path,
+            start_at=1,
+            duration=2,
+            volume=0.5,
+            trim=Trim(start=0.5, end=2),
+        )
+        mixed = self.mix([audio], SAMPLE_RATE - 500)
+        self.assertFalse(mixed[:, :500].any())
+        source_start = SAMPLE_RATE // 2
+        np.testing.assert_allclose(
+            mixed[:, 500:], self.samples[:, source_start : source_start + 500] * 0.5
+        )
+        # The trim ends 1.5 seconds after the start of the component
+        mixed = self.mix([audio], SAMPLE_RATE * 2 + 3500)
+        self.assertTrue(mixed[:, :500].any())
+        self.assertFalse(mixed[:, 500:].any())
+
+    def test_overlapping_tracks_are_summed(self):
+        first = Audio(source=self.path, start_at=0, duration=4, volume=0.25)
+        second = Audio(source=self.path, start_at=0, duration=4, volume=0.25)
+        mixed = self.mix([first, second], 0)
+        np.testing.assert_allclose(mixed, self.samples[:, :1000] * 0.5, atol=1e-6)
+
+    def test_limit(self):
+        samples = np.array([[0.5, -0.9, 0.95, -2.0, 10.0]], dtype=np.float32)
+        limit(samples)
+        np.testing.assert_array_equal(samples[0, :2], np.float32([0.5, -0.9]))
+        self.assertTrue(np.all(np.abs(samples) <= 1))
+        self.assertTrue(0.9 < samples[0, 2] < samples[0, 4])
+        self.assertLess(samples[0, 3], -0.9)
+
+
+def make_tone(path: str) -> None:
+    """Write an AAC file of a 440 Hz tone"""
+    time = np.arange(SAMPLE_RATE * DURATION) / SAMPLE_RATE
+    tone = np.float32(0.3) * np.sin(2 * np.pi * 440 * time, dtype=np.float32)
+    with av.open(path, "w", format="mp4") as container:
+        stream = container.add_stream("aac", rate=SAMPLE_RATE)
+        stream.layout = "stereo"
+        for start in range(0, tone.size, 1024):
+            samples = tone[start : start + 1024]
+            frame = av.AudioFrame.from_ndarray(
+                np.stack([samples, samples]), format="fltp", layout="stereo"
+            )
+            frame.sample_rate = SAMPLE_RATE
+            frame.pts = start
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+
+def demux(path: str) -> list:
+    with av.open(path) as container:
+        return [packet for packet in container.demux(audio=0) if packet.dts is not None]
+
+
+class TestAudioPassthrough(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "tone.m4a")
+        self.output = os.path.join(self.directory.name, "output.mp4")
+        make_tone(self.source)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def render(self, volume: float):
+        timeline = Timeline()
+        timeline.add_composition(
+            [Audio(source=self.source, start_at=1, end_at=3, duration=2, volume=volume)]
+        ).with_duration(DURATION).with_framerate(8).with_resolution(64, 48).build()
+        options = VideoWriterOptions(width=64, height=48, audio_sample_rate=SAMPLE_RATE)
+        return timeline.render(self.output, options=options)
+
+    def test_unchanged_audio_is_copied(self):
+        render_stats = self.render(volume=1)
+        packets, source_packets = demux(self.output), demux(self.source)
+        self.assertEqual(render_stats.counters["copied_audio_packets"], len(packets))
+        # Shifted to the start of the component and cut at its end
+        self.assertEqual(packets[0].pts, source_packets[0].pts + SAMPLE_RATE)
+        self.assertLess(packets[-1].pts, 3 * SAMPLE_RATE)
+        for packet, source_packet in zip(packets, source_packets):
+            self.assertEqual(bytes(packet), bytes(source_packet))
+
+    def test_changed_audio_is_mixed(self):
+        render_stats = self.render(volume=0.5)
+        self.assertNotIn("copied_audio_packets", render_stats.counters)
+        self.assertTrue(demux(self.output))
+
+
+# run command: python -m unittest discover tests -v
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from media import decode, make_video
+
+from composery import Timeline
+from composery.components import Text, Video
+from composery.renderer.options import VideoWriterOptions
+
+FRAMERATE = 8
+DURATION = 2
+
+
+class TestBatchRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        make_video(self.source, FRAMERATE, DURATION)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_timeline(self, content: str) -> Timeline:
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.source,
+                    start_at=0,
+                    duration=DURATION,
+                    width=64,
+                    height=48,
+                    allow_audio=False,
+                ),
+                Text(content=content, start_at=0.5, duration=1, z_index=1),
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        return timeline
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.directory.name, f"{name}.mp4")
+
+    def test_sources_are_decoded_once_per_group(self):
+        timelines = [self.create_timeline(content) for content in ("A", "B", "C")]
+        filenames = [self.output(f"batch_{index}") for index in range(3)]
+        options = VideoWriterOptions(width=64, height=48, batch_size=3)
+        render_stats = Timeline.render_batch(timelines, filenames, options=options)
+
+        frames = DURATION * FRAMERATE
+        self.assertEqual(render_stats.counters["frames"], 3 * frames)
+        self.assertEqual(render_stats.counters["frame_cache_misses"], frames)
+        self.assertEqual(render_stats.counters["frame_cache_hits"], 2 * frames)
+        # The same frames as rendering each timeline alone
+        timelines[1].render(self.output("single"), options=options)
+        batch_frames = decode(filenames[1])
+        self.assertEqual(len(batch_frames), frames)
+        for frame, single_frame in zip(batch_frames, decode(self.output("single"))):
+            np.testing.assert_array_equal(frame, single_frame)
+
+    def test_timelines_are_rendered_in_groups(self):
+        timelines = [self.create_timeline(content) for content in ("A", "B", "C")]
+        filenames = [self.output(f"group_{index}") for index in range(3)]
+        options = VideoWriterOptions(width=64, height=48, batch_size=2)
+        progress = []
+        Timeline.render_batch(
+            timelines,
+            filenames,
+            options=options,
+            progress=lambda done, total, _: progress.append((done, total)),
+        )
+
+        frames = DURATION * FRAMERATE
+        self.assertEqual(progress[-1], (3 * frames, 3 * frames))
+        for filename in filenames:
+            self.assertEqual(len(decode(filename)), frames)
+
+
+# run command: python -m unittest discover tests -v
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from av.video.frame import VideoFrame
+from media import make_video
+
+from composery.reader import free, scaler
+from composery.reader.cache import FRAME_CACHE, FrameCache, get_frame_size
+from composery.reader.decoder import get_frame_time
+from composery.reader.video import VideoReader
+
+
+def make_key(pts: int):
+    return ("video.mp4", 0, pts, (64, 48), "yuv420p")
+
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.frame = VideoFrame(64, 48, "yuv420p")
+        self.frame_size = get_frame_size(self.frame)
+
+    def test_hit_and_miss_counters(self):
+        cache = FrameCache(max_size=self.frame_size * 4)
+        self.assertIsNone(cache.get(make_key(0)))
+        cache.put(make_key(0), self.frame)
+        self.assertIs(cache.get(make_key(0)), self.frame)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = FrameCache(max_size=self.frame_size * 2)
+        cache.put(make_key(0), VideoFrame(64, 48, "yuv420p"))
+        cache.put(make_key(1), VideoFrame(64, 48, "yuv420p"))
+        cache.get(make_key(0))
+        cache.put(make_key(2), VideoFrame(64, 48, "yuv420p"))
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, self.frame_size * 2)
+        self.assertIsNotNone(cache.get(make_key(0)))
+        self.assertIsNone(cache.get(make_key(1)))
+        self.assertIsNotNone(cache.get(make_key(2)))
+
+    def test_resize_evicts(self):
+        cache = FrameCache(max_size=self.frame_size * 4)
+        for pts in range(4):
+            cache.put(make_key(pts), VideoFrame(64, 48, "yuv420p"))
+        cache.resize(self.frame_size)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get(make_key(3)))
+
+    def test_frame_larger_than_budget_is_not_cached(self):
+        cache = FrameCache(max_size=self.frame_size - 1)
+        cache.put(make_key(0), self.frame)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class TestScaleFrame(unittest.TestCase):
+    def test_scales_and_converts_with_a_cached_scaler(self):
+        frame = VideoFrame(64, 48, "yuv420p")
+        scaled = scaler.scale_frame(frame, (32, 24), "rgb24")
+        self.assertEqual((scaled.width, scaled.height), (32, 24))
+        self.assertEqual(scaled.format.name, "rgb24")
+        scalers = len(scaler.SCALERS)
+        scaler.scale_frame(VideoFrame(64, 48, "yuv420p"), (32, 24), "rgb24")
+        self.assertEqual(len(scaler.SCALERS), scalers)
+
+    def test_frame_with_target_size_and_format_is_kept(self):
+        frame = VideoFrame(64, 48, "yuv420p")
+        self.assertIs(scaler.scale_frame(frame, (64, 48), "yuv420p"), frame)
+
+
+class TestReadFrame(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "video.mp4")
+        make_video(self.path, 24, 1)
+        FRAME_CACHE.clear()
+
+    def tearDown(self):
+        free()
+        self.directory.cleanup()
+
+    def test_times_between_frames_share_the_next_frame(self):
+        reader = VideoReader(self.path)
+        # Frame 3 is shown at 0.125, after frame 2 at 0.083
+        frame = reader.read(0.1)
+        assert frame is not None
+        self.assertIs(reader.read(0.12), frame)
+        self.assertIs(reader.read(0.125), frame)
+        self.assertEqual((FRAME_CACHE.hits, FRAME_CACHE.misses), (2, 1))
+        stream = reader.cursor().stream
+        self.assertAlmostEqual(get_frame_time(frame, stream), 0.125, places=3)
+
+
+# run command: python -m unittest discover tests -v
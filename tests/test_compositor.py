@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+from av.video.frame import VideoFrame
+from PIL import Image
+
+from composery.renderer.compositor import (
+    NumpyCompositor,
+    PILCompositor,
+    YUVCompositor,
+    get_plane,
+)
+
+WIDTH = 96
+HEIGHT = 64
+
+
+class TestCompositor(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.video_frame = VideoFrame.from_ndarray(
+            rng.integers(0, 256, (40, 50, 3), dtype=np.uint8), format="rgb24"
+        ).reformat(format="yuv420p")
+        self.overlay = Image.fromarray(
+            rng.integers(0, 256, (20, 30, 4), dtype=np.uint8), "RGBA"
+        )
+
+    def composite(self, compositor, positions):
+        compositor.begin()
+        for video_position, overlay_position in positions:
+            compositor.draw_video(self.video_frame, video_position)
+            compositor.draw_image(self.overlay, overlay_position)
+        return compositor.finish()
+
+    def test_numpy_matches_pil(self):
+        positions = [
+            ((0, 0), (10, 10)),
+            ((60, 30), (80, 50)),
+            ((-20, -10), (-5, -5)),
+            ((200, 200), (WIDTH - 1, HEIGHT - 1)),
+        ]
+        expected = self.composite(PILCompositor(WIDTH, HEIGHT), positions)
+        actual = self.composite(NumpyCompositor(WIDTH, HEIGHT), positions)
+        np.testing.assert_array_equal(
+            actual.to_ndarray(format="rgb24"), expected.to_ndarray(format="rgb24")
+        )
+
+    def test_numpy_canvas_is_reset(self):
+        compositor = NumpyCompositor(WIDTH, HEIGHT)
+        self.composite(compositor, [((0, 0), (0, 0))])
+        blank = self.composite(compositor, [])
+        self.assertFalse(blank.to_ndarray(format="rgb24").any())
+
+    def test_yuv_copies_video_planes(self):
+        source = VideoFrame.from_ndarray(
+            np.random.default_rng(1).integers(
+                0, 256, (HEIGHT * 3 // 2, WIDTH), dtype=np.uint8
+            ),
+            format="yuv420p",
+        )
+        compositor = YUVCompositor(WIDTH, HEIGHT)
+        compositor.begin()
+        compositor.draw_video(source, (0, 0))
+        frame = compositor.finish()
+        for index in range(3):
+            np.testing.assert_array_equal(
+                get_plane(frame, index), get_plane(source, index)
+            )
+
+    def test_yuv_close_to_rgb(self):
+        positions = [((0, 0), (10, 10)), ((60, 30), (80, 50)), ((-20, -10), (-6, -4))]
+        # Compared in yuv420p, the pixel format the encoder receives
+        expected = self.composite(NumpyCompositor(WIDTH, HEIGHT), positions)
+        actual = self.composite(YUVCompositor(WIDTH, HEIGHT), positions)
+        difference = np.abs(
+            actual.to_ndarray().astype(np.int16)
+            - expected.reformat(format="yuv420p").to_ndarray()
+        )
+        self.assertLess(difference.mean(), 3)
+
+    def test_overlays_not_drawn_on_the_last_frame_are_dropped(self):
+        for compositor in (
+            NumpyCompositor(WIDTH, HEIGHT),
+            YUVCompositor(WIDTH, HEIGHT),
+        ):
+            for _ in range(8):
+                compositor.begin()
+                compositor.draw_image(self.overlay.copy(), (0, 0))
+                compositor.draw_image(self.overlay, (10, 10))
+                compositor.finish()
+            # The overlay drawn on every frame and the two last copies
+            self.assertEqual(len(compositor._overlays), 3)
+
+
+# run command: python -m unittest discover tests -v
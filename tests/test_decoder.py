@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from media import make_video
+
+from composery.reader import READERS, free, get_reader_id, set_decoder_threading
+from composery.reader.decoder import (
+    DecodeCursor,
+    get_cursor,
+    get_frame_time,
+    seek_frame,
+)
+from composery.reader.video import VideoReader, get_video_size
+
+FRAMERATE = 24
+DURATION = 10
+
+
+class TestDecoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "video.mp4")
+        make_video(cls.path, FRAMERATE, DURATION, codec="mpeg4", gop_size=12)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        reader_id = get_reader_id(self.path, mode="video")
+        self.container = READERS[reader_id]
+        self.stream = self.container.streams.video[0]
+
+    def tearDown(self):
+        free()
+
+    def seek_time(self, time: float) -> float:
+        frame = seek_frame(self.container, self.stream, time)
+        assert frame is not None
+        return get_frame_time(frame, self.stream)
+
+    def test_sequential_frames(self):
+        for index in range(48):
+            time = index / FRAMERATE
+            self.assertAlmostEqual(self.seek_time(time), time, places=3)
+
+    def test_repeated_time_returns_same_frame(self):
+        first = seek_frame(self.container, self.stream, 1.0)
+        second = seek_frame(self.container, self.stream, 1.0)
+        self.assertIs(first, second)
+
+    def test_backward_seek(self):
+        self.assertAlmostEqual(self.seek_time(5.0), 5.0, places=3)
+        self.assertAlmostEqual(self.seek_time(1.0), 1.0, places=3)
+        self.assertAlmostEqual(self.seek_time(0.5), 0.5, places=3)
+
+    def test_far_forward_seek_uses_keyframe(self):
+        self.assertAlmostEqual(self.seek_time(0.0), 0.0, places=3)
+        cursor = get_cursor(self.container, self.stream)
+        with mock.patch.object(
+            DecodeCursor,
+            "_seek_keyframe",
+            autospec=True,
+            side_effect=DecodeCursor._seek_keyframe,
+        ) as seek_keyframe:
+            self.assertAlmostEqual(self.seek_time(0.5), 0.5, places=3)
+            seek_keyframe.assert_not_called()
+            self.assertAlmostEqual(self.seek_time(8.0), 8.0, places=3)
+            seek_keyframe.assert_called_once_with(cursor, mock.ANY)
+
+    def test_out_of_bounds_returns_none(self):
+        self.assertIsNone(seek_frame(self.container, self.stream, DURATION + 5))
+
+    def test_decoder_threading_applies_to_readers_not_decoding_yet(self):
+        # The reader of the test decoded frames, the new one did not
+        reader = READERS[get_reader_id(self.path, mode="audio")]
+        seek_frame(self.container, self.stream, 0)
+        try:
+            set_decoder_threading("FRAME", 2)
+            codec_context = reader.streams.video[0].codec_context
+            self.assertEqual(codec_context.thread_type, "FRAME")
+            self.assertEqual(codec_context.thread_count, 2)
+            self.assertNotEqual(self.stream.codec_context.thread_type, "FRAME")
+        finally:
+            set_decoder_threading("AUTO", 0)
+
+    def test_readers_of_a_source_decode_apart(self):
+        readers = [VideoReader(self.path), VideoReader(self.path)]
+        with mock.patch.object(
+            DecodeCursor,
+            "_seek_keyframe",
+            autospec=True,
+            side_effect=DecodeCursor._seek_keyframe,
+        ) as seek_keyframe:
+            for index in range(24):
+                time = index / FRAMERATE
+                frames = [readers[0].read(time), readers[1].read(time + 5)]
+                for frame, expected in zip(frames, (time, time + 5)):
+                    assert frame is not None
+                    self.assertAlmostEqual(
+                        get_frame_time(frame, self.stream), expected, places=3
+                    )
+            # Only the first read of the second reader seeks
+            seek_keyframe.assert_called_once()
+
+    def test_video_size_is_probed_without_a_reader(self):
+        free()
+        self.assertEqual(get_video_size(self.path), (64, 48))
+        self.assertEqual(READERS, {})
+
+
+# run command: python -m unittest discover tests -v
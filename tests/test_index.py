@@ -0,0 +1,86 @@
+import pickle
+import unittest
+
+from composery.components import Text
+from composery.index import ComponentIndex
+from composery.timeline import Timeline
+
+
+def make_text(start_at: float, end_at: float, z_index: int = 0) -> Text:
+    return Text(
+        content=f"{start_at}-{end_at}",
+        start_at=start_at,
+        end_at=end_at,
+        duration=end_at - start_at,
+        z_index=z_index,
+    )
+
+
+class TestComponentIndex(unittest.TestCase):
+    def setUp(self):
+        self.background = make_text(0, 10, z_index=0)
+        self.first = make_text(1, 3, z_index=1)
+        self.second = make_text(3, 5, z_index=2)
+        self.top = make_text(2, 4, z_index=5)
+        self.index = ComponentIndex(
+            [self.top, self.second, self.first, self.background]
+        )
+
+    def brute_force(self, time: float):
+        return tuple(
+            component
+            for component in self.index.components
+            if component.start_at <= time <= component.end_at
+        )
+
+    def test_matches_linear_scan(self):
+        for step in range(-10, 120):
+            time = step / 10
+            self.assertEqual(self.index.at(time), self.brute_force(time), time)
+
+    def test_z_order(self):
+        self.assertEqual(
+            self.index.at(3), (self.background, self.first, self.second, self.top)
+        )
+
+    def test_end_is_inclusive(self):
+        self.assertIn(self.first, self.index.at(3))
+        self.assertNotIn(self.first, self.index.at(3.0001))
+
+    def test_between(self):
+        self.assertEqual(self.index.between(0, 0.5), (self.background,))
+        self.assertEqual(self.index.between(4.5, 6), (self.background, self.second))
+        self.assertEqual(
+            self.index.between(1.5, 2.5), (self.background, self.first, self.top)
+        )
+
+    def test_between_frames(self):
+        self.assertEqual(
+            self.index.between_frames(97, 120, framerate=24),
+            (self.background, self.second),
+        )
+
+    def test_empty_index(self):
+        self.assertEqual(ComponentIndex([]).at(1), ())
+
+    def test_build_creates_index(self):
+        timeline = Timeline()
+        timeline.add_composition([self.first, self.second]).with_duration(
+            10
+        ).with_framerate(24).with_resolution(1920, 1080).build()
+        self.assertEqual(timeline.composition.index.at(3), (self.first, self.second))
+        self.assertEqual(timeline.composition.audio_index.at(3), ())
+
+    def test_unpickled_index_can_be_queried(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [self.background, self.top, self.second, self.first]
+        ).with_duration(10).with_framerate(24).with_resolution(1920, 1080).build()
+        composition = pickle.loads(pickle.dumps(timeline.composition))
+        expected = [self.background, self.first, self.second, self.top]
+        self.assertEqual(list(composition.index.between(0, 3)), expected)
+        self.assertEqual(list(composition.index.between_frames(0, 96, 24)), expected)
+        self.assertEqual(list(composition.index.at(3.5)), expected[0:1] + expected[2:])
+
+
+# run command: python -m unittest discover tests -v
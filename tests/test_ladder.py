@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import av
+import numpy as np
+from av.video.frame import VideoFrame
+from media import decode
+
+from composery import Timeline
+from composery.components import Text
+from composery.renderer.ladder import LadderRenderer
+from composery.renderer.options import VideoWriterOptions
+from composery.renderer.output import Rendition
+
+
+class TestLadderRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.timeline = Timeline()
+        self.timeline.add_composition(
+            [Text(content="Ladder", start_at=0.5, duration=1, z_index=1)]
+        ).with_duration(2).with_framerate(8).with_resolution(64, 48).build()
+        self.options = VideoWriterOptions(width=64, height=48)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.directory.name, f"{name}.mp4")
+
+    def test_renditions_share_the_composite(self):
+        renditions = [
+            Rendition(filename=self.output("large"), width=64, height=48),
+            Rendition(filename=self.output("small"), width=32, height=24, crf=30),
+            Rendition(filename=self.output("low"), width=32, height=24, bitrate="50k"),
+        ]
+        render_stats = self.timeline.render(renditions, options=self.options)
+
+        # Every frame is composited once for all the renditions
+        self.assertEqual(render_stats.counters["frames"], 16)
+        for rendition in renditions:
+            with av.open(rendition.filename) as container:
+                video_stream = container.streams.video[0]
+                self.assertEqual(
+                    (video_stream.width, video_stream.height),
+                    (rendition.width, rendition.height),
+                )
+                self.assertTrue(container.streams.audio)
+            self.assertEqual(len(decode(rendition.filename)), 16)
+        # The largest rendition is the composite itself
+        self.timeline.render(self.output("single"), options=self.options)
+        for frame, single_frame in zip(
+            decode(self.output("large")), decode(self.output("single"))
+        ):
+            np.testing.assert_array_equal(frame, single_frame)
+
+    def test_renditions_get_frames_of_their_own(self):
+        renditions = [
+            Rendition(filename=self.output("first"), width=64, height=48),
+            Rendition(filename=self.output("second"), width=64, height=48, crf=30),
+        ]
+        renderer = LadderRenderer(renditions, 64, 48, 2, 8, self.options)
+        frame = VideoFrame(64, 48, "yuv420p")
+        first, second = renderer.scale(frame)
+        self.assertIsNot(first, second)
+        np.testing.assert_array_equal(first.to_ndarray(), second.to_ndarray())
+
+
+# run command: python -m unittest discover tests -v
@@ -0,0 +1,52 @@
+import io
+import os
+import tempfile
+import unittest
+
+import av
+
+from composery import Timeline
+from composery.components import Text
+from composery.renderer.options import StreamingFormat, VideoWriterOptions
+from composery.renderer.output import resolve_options
+
+OPTIONS = VideoWriterOptions(width=64, height=48, framerate=8, preset="ultrafast")
+
+
+class TestStreamingOutput(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.timeline = Timeline()
+        self.timeline.add_composition(
+            [Text(content="Live", start_at=0, duration=1, z_index=1)]
+        ).with_duration(3).with_framerate(8).with_resolution(64, 48).build()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_file_objects_are_fragmented(self):
+        self.assertIsNone(resolve_options("video.mp4", OPTIONS).streaming)
+        self.assertEqual(
+            resolve_options(io.BytesIO(), OPTIONS).streaming,
+            StreamingFormat.FRAGMENTED_MP4,
+        )
+        output = io.BytesIO()
+        self.timeline.render(output, options=OPTIONS)
+        data = output.getvalue()
+        self.assertIn(b"moof", data)
+        with av.open(io.BytesIO(data)) as container:
+            self.assertEqual(sum(1 for _ in container.decode(video=0)), 24)
+
+    def test_hls_segments_and_playlist(self):
+        directory = os.path.join(self.directory.name, "hls")
+        options = OPTIONS.model_copy(
+            update={"streaming": StreamingFormat.HLS, "fragment_duration": 1}
+        )
+        self.timeline.render(directory, options=options)
+        with open(os.path.join(directory, "index.m3u8")) as playlist:
+            segments = [line for line in playlist if line.startswith("segment-")]
+        self.assertEqual(len(segments), 3)
+        self.assertTrue(os.path.exists(os.path.join(directory, "init.mp4")))
+
+
+# run command: python -m unittest discover tests -v
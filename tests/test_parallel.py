@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from media import decode, make_video
+
+from composery import Timeline
+from composery.components import Text, Video
+from composery.renderer.options import VideoWriterOptions
+from composery.timeline import RenderMode
+
+FRAMERATE = 8
+DURATION = 3
+
+
+class TestParallelRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        make_video(self.source, FRAMERATE, DURATION)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.directory.name, f"{name}.mp4")
+
+    def test_joined_segments_match_a_serial_render(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.source,
+                    start_at=0,
+                    duration=DURATION,
+                    width=64,
+                    height=48,
+                    allow_audio=False,
+                ),
+                Text(content="Segment", start_at=0.5, duration=2, z_index=1),
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        # Lossless, so the decoded frames are the composited frames
+        options = VideoWriterOptions(
+            width=64, height=48, crf=0, gop_size=8, segment_duration=1, workers=2
+        )
+        timeline.render(self.output("serial"), options=options)
+        timeline.render(
+            self.output("parallel"), mode=RenderMode.CPU_PARALLEL, options=options
+        )
+
+        frames = decode(self.output("parallel"))
+        serial_frames = decode(self.output("serial"))
+        self.assertEqual(len(frames), DURATION * FRAMERATE)
+        self.assertEqual(len(frames), len(serial_frames))
+        for frame, serial_frame in zip(frames, serial_frames):
+            np.testing.assert_array_equal(frame, serial_frame)
+
+    def test_texts_rendered_by_text_workers(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Text(content="First", start_at=0, duration=2),
+                Text(content="Second", start_at=1, duration=2, z_index=1),
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        # The index and plan are built before the render is split
+        timeline.composition.get_plan()
+        options = VideoWriterOptions(
+            width=64,
+            height=48,
+            crf=0,
+            gop_size=8,
+            segment_duration=1,
+            workers=2,
+            text_workers=1,
+        )
+        timeline.render(self.output("serial"), options=options)
+        timeline.render(
+            self.output("parallel"), mode=RenderMode.CPU_PARALLEL, options=options
+        )
+
+        frames = decode(self.output("parallel"))
+        serial_frames = decode(self.output("serial"))
+        self.assertEqual(len(frames), DURATION * FRAMERATE)
+        for frame, serial_frame in zip(frames, serial_frames):
+            np.testing.assert_array_equal(frame, serial_frame)
+
+
+# run command: python -m unittest discover tests -v
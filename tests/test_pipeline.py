@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from threading import Thread
+from typing import Callable, Iterator, List, Optional
+from unittest import mock
+
+import av
+import numpy as np
+from av.video.frame import VideoFrame
+from media import decode, make_video
+
+from composery import Timeline
+from composery.components import Text, Video
+from composery.renderer import pipeline
+from composery.renderer.options import VideoWriterOptions
+from composery.renderer.pipeline import FrameItem, RenderPipeline
+
+FRAMERATE = 8
+DURATION = 2
+
+
+class TestRenderPipeline(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        make_video(self.source, FRAMERATE, DURATION)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.directory.name, f"{name}.mp4")
+
+    def run_pipeline(self, items: Callable[..., Iterator[FrameItem]]) -> BaseException:
+        """Run a pipeline on another thread, failing if it does not return"""
+        errors: List[Optional[BaseException]] = [None]
+
+        def run() -> None:
+            with av.open(self.output("pipeline"), "w") as container:
+                stream = container.add_stream("libx264", rate=FRAMERATE)
+                stream.width = 64
+                stream.height = 48
+                try:
+                    RenderPipeline(2).run(items(stream), (stream,), container)
+                except BaseException as error:
+                    errors[0] = error
+
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "The pipeline deadlocked")
+        error = errors[0]
+        assert error is not None, "The pipeline did not raise"
+        return error
+
+    def test_pipelined_render_matches_serial_render(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.source,
+                    start_at=0,
+                    duration=DURATION,
+                    width=64,
+                    height=48,
+                    allow_audio=False,
+                ),
+                Text(content="Pipeline", start_at=0.5, duration=1, z_index=1),
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        for name, depth in (("serial", 0), ("pipelined", 4)):
+            options = VideoWriterOptions(width=64, height=48, pipeline_depth=depth)
+            timeline.render(self.output(name), options=options)
+
+        frames = decode(self.output("pipelined"))
+        self.assertEqual(len(frames), DURATION * FRAMERATE)
+        for frame, serial_frame in zip(frames, decode(self.output("serial"))):
+            np.testing.assert_array_equal(frame, serial_frame)
+
+    def test_producer_error_is_raised(self):
+        def items(stream) -> Iterator[FrameItem]:
+            for pts in range(3):
+                yield stream, VideoFrame(64, 48, "yuv420p"), pts
+            raise ValueError("broken producer")
+
+        error = self.run_pipeline(items)
+        self.assertEqual(str(error), "broken producer")
+
+    def test_encoder_error_is_raised(self):
+        def items(stream) -> Iterator[FrameItem]:
+            for pts in range(16):
+                yield stream, VideoFrame(64, 48, "yuv420p"), pts
+
+        with mock.patch.object(
+            pipeline, "encode_item", side_effect=ValueError("broken encoder")
+        ):
+            error = self.run_pipeline(items)
+        self.assertEqual(str(error), "broken encoder")
+
+
+# run command: python -m unittest discover tests -v
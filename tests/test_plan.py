@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from media import make_video
+
+from composery import Timeline
+from composery.components import Position, Text, Video
+from composery.reader import free, open_reader
+from composery.renderer.compositor import NumpyCompositor
+from composery.renderer.plan import TextOp, VideoOp
+from composery.renderer.processors.text import TEXT_CACHE
+
+
+class TestRenderPlan(unittest.TestCase):
+    def setUp(self):
+        self.timeline = Timeline()
+        self.timeline.add_composition(
+            [
+                Text(content="Top", start_at=0, duration=2, z_index=2),
+                Text(
+                    content="Bottom",
+                    start_at=1,
+                    duration=2,
+                    z_index=1,
+                    position=Position(x="left", y="bottom"),
+                ),
+            ]
+        ).with_duration(3).with_framerate(8).with_resolution(320, 240).build()
+        self.plan = self.timeline.composition.plan
+
+    def test_ops_are_compiled_in_z_order(self):
+        self.assertEqual(len(self.plan), 2)
+        self.assertTrue(all(isinstance(op, TextOp) for op in self.plan))
+        self.assertEqual(
+            [op.text.content for op in self.plan.at(1.5)], ["Bottom", "Top"]
+        )
+        self.assertEqual([op.text.content for op in self.plan.at(2.5)], ["Bottom"])
+
+    def test_text_rect_is_resolved_once_when_drawn(self):
+        bottom = self.plan.at(2.5)[0]
+        self.assertIsNone(bottom.describe()["rect"])
+        compositor = NumpyCompositor(320, 240)
+        compositor.begin()
+        bottom.draw(compositor, 2.5)
+        x, y, width, height = bottom.describe()["rect"]
+        self.assertEqual((x, y + height), (0, 240))
+        self.assertGreater(width, 0)
+
+    def test_text_is_rasterized_once_without_text_cache(self):
+        top = self.plan.at(0)[0]
+        max_size = TEXT_CACHE.max_size
+        TEXT_CACHE.resize(0)
+        try:
+            misses = TEXT_CACHE.misses
+            compositor = NumpyCompositor(320, 240)
+            for time in (0, 0.5, 1):
+                compositor.begin()
+                top.draw(compositor, time)
+            self.assertEqual(TEXT_CACHE.misses - misses, 1)
+        finally:
+            TEXT_CACHE.resize(max_size)
+
+    def test_scaled_plan_scales_texts_and_positions(self):
+        plan = self.timeline.composition.get_plan(0.5)
+        self.assertEqual(plan.canvas_size, (160, 120))
+        self.assertIs(self.timeline.composition.get_plan(0.5), plan)
+        top = plan.at(0)[0]
+        self.assertEqual(top.text.style.font_size, 36)
+        self.assertNotEqual(top.key, self.plan.at(0)[0].key)
+
+        pixel_timeline = Timeline()
+        pixel_timeline.add_composition(
+            [
+                Text(
+                    content="Pixel",
+                    start_at=0,
+                    duration=1,
+                    position=Position(x=100, y="bottom"),
+                )
+            ]
+        ).with_duration(1).with_framerate(8).with_resolution(320, 240).build()
+        op = pixel_timeline.composition.get_plan(0.5).at(0)[0]
+        compositor = NumpyCompositor(160, 120)
+        compositor.begin()
+        op.draw(compositor, 0)
+        x, y, _, height = op.describe()["rect"]
+        self.assertEqual((x, y + height), (50, 120))
+
+
+class TestVideoOp(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        make_video(self.source, 8, 1)
+
+    def tearDown(self):
+        free()
+        self.directory.cleanup()
+
+    def test_source_size_is_probed_once_when_needed(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(source=self.source, start_at=0, duration=1, width=w, height=h)
+                for w, h in ((64, 48), (32, 24))
+            ]
+        ).with_duration(1).with_framerate(8).with_resolution(64, 48).build()
+        with mock.patch(
+            "composery.reader.video.open_reader", wraps=open_reader
+        ) as opened:
+            full, scaled = timeline.composition.plan
+            opened.assert_not_called()
+            self.assertIsInstance(full, VideoOp)
+            self.assertIsNone(full.size)
+            self.assertEqual(scaled.size, (32, 24))
+            self.assertEqual(scaled.size, (32, 24))
+        # Each reader opens the container it decodes with, once
+        self.assertEqual(opened.call_count, 2)
+
+
+# run command: python -m unittest discover tests -v
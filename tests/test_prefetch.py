@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from media import make_video
+
+from composery import Timeline
+from composery.components import Video
+from composery.reader import free, prefetch
+from composery.reader.cache import FRAME_CACHE
+from composery.reader.decoder import get_frame_time
+from composery.reader.video import VideoReader
+from composery.renderer.options import CompositorBackend, VideoWriterOptions
+
+FRAMERATE = 24
+DURATION = 2
+
+
+class TestFramePrefetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "video.mp4")
+        make_video(cls.path, FRAMERATE, DURATION, codec="mpeg4")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        FRAME_CACHE.clear()
+        self.reader = VideoReader(self.path)
+        self.schedule = [
+            (index / FRAMERATE, None, None) for index in range(DURATION * FRAMERATE)
+        ]
+
+    def tearDown(self):
+        prefetch.stop()
+        free()
+
+    def assertFrameTime(self, frame, time: float) -> None:
+        assert frame is not None
+        stream = self.reader.cursor().stream
+        self.assertAlmostEqual(get_frame_time(frame, stream), time, places=3)
+
+    def test_scheduled_frames_are_prefetched(self):
+        prefetch.start({self.reader: self.schedule}, depth=4)
+        for time, size, format in self.schedule:
+            found, frame = prefetch.get(self.reader, (time, size, format))
+            self.assertTrue(found)
+            self.assertFrameTime(frame, time)
+
+    def test_schedule_mismatch_falls_back_to_decoding(self):
+        prefetch.start({self.reader: self.schedule}, depth=4)
+        self.assertFrameTime(self.reader.read(0), 0)
+        with self.assertLogs("composery", level="WARNING") as logs:
+            self.assertFrameTime(self.reader.read(1), 1)
+        self.assertIn("Prefetch schedule mismatch", logs.output[0])
+        self.assertNotIn(self.reader, prefetch.PREFETCHERS)
+        self.assertFrameTime(self.reader.read(1.5), 1.5)
+
+    def test_stop_drains_a_full_queue(self):
+        prefetch.start({self.reader: self.schedule}, depth=1)
+        prefetcher = prefetch.PREFETCHERS[self.reader]
+        prefetch.stop()
+        self.assertFalse(prefetcher._thread.is_alive())
+        self.assertEqual(prefetch.PREFETCHERS, {})
+        # Without a prefetcher, the reader decodes the frames itself
+        self.assertFrameTime(self.reader.read(0.5), 0.5)
+
+    def test_decoder_error_falls_back_to_decoding(self):
+        with mock.patch.object(
+            prefetch, "read_frame", side_effect=RuntimeError("broken decoder")
+        ), self.assertLogs("composery", level="ERROR") as logs:
+            prefetch.start({self.reader: self.schedule}, depth=4)
+            prefetch.PREFETCHERS[self.reader]._thread.join(timeout=5)
+        self.assertIn("broken decoder", logs.output[0])
+        for time in (0, 0.5, 1):
+            self.assertFrameTime(self.reader.read(time), time)
+        self.assertNotIn(self.reader, prefetch.PREFETCHERS)
+
+
+class TestPrefetchedRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        make_video(self.source, FRAMERATE, DURATION, codec="mpeg4")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_scaled_frames_are_prefetched(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.source,
+                    start_at=0,
+                    duration=DURATION,
+                    width=32,
+                    height=24,
+                    allow_audio=False,
+                )
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        for compositor in CompositorBackend:
+            with self.subTest(compositor=compositor):
+                FRAME_CACHE.clear()
+                options = VideoWriterOptions(
+                    width=64, height=48, compositor=compositor, prefetch_frames=4
+                )
+                with self.assertNoLogs("composery", level="WARNING"):
+                    render_stats = timeline.render(
+                        os.path.join(self.directory.name, "output.mp4"),
+                        options=options,
+                    )
+                # Every frame drawn was taken from the prefetcher
+                self.assertEqual(
+                    render_stats.calls["prefetch_wait"], DURATION * FRAMERATE
+                )
+
+
+# run command: python -m unittest discover tests -v
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import av
+import numpy as np
+from media import make_video
+
+from composery import Timeline
+from composery.components import Text, Video
+from composery.components.audio import Audio
+from composery.renderer.cpu import CPURenderer
+from composery.renderer.options import VideoWriterOptions
+
+
+class TestCPURenderer(unittest.TestCase):
+    def setUp(self):
+        self.timeline = Timeline()
+        self.timeline.add_composition(
+            [
+                Text(content="First", start_at=0, duration=1, z_index=1),
+                Text(content="Second", start_at=1.5, duration=0.5, z_index=1),
+            ]
+        ).with_duration(2).with_framerate(8).with_resolution(64, 48).build()
+        self.renderer = CPURenderer(
+            "unused.mp4", 64, 48, 2, 8, VideoWriterOptions(width=64, height=48)
+        )
+        self.renderer.timeline = self.timeline
+
+    def test_static_spans_reuse_frames(self):
+        frames = list(self.renderer.iter_frames())
+        self.assertEqual(len(frames), 16)
+        # First until 1 inclusive, nothing until 1.5, then Second
+        for span in (frames[0:9], frames[9:12], frames[12:16]):
+            self.assertTrue(all(frame is span[0] for frame in span))
+        self.assertIsNot(frames[9], frames[8])
+        self.assertIsNot(frames[12], frames[11])
+        self.assertEqual(self.renderer.reused_frames, 13)
+
+
+class TestInterleavedRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.video = os.path.join(self.directory.name, "video.mp4")
+        self.audio = os.path.join(self.directory.name, "audio.wav")
+        self.output = os.path.join(self.directory.name, "output.mp4")
+        make_video(self.video, 8, 2)
+        samples = np.zeros((1, 2 * 8000), dtype=np.int16)
+        with av.open(self.audio, "w") as container:
+            stream = container.add_stream("pcm_s16le", rate=8000)
+            stream.layout = "mono"
+            frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+            frame.sample_rate = 8000
+            container.mux(stream.encode(frame))
+            container.mux(stream.encode(None))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_packets_are_muxed_in_decode_order(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.video,
+                    start_at=0,
+                    duration=2,
+                    width=64,
+                    height=48,
+                    allow_audio=False,
+                ),
+                Audio(source=self.audio, start_at=0, duration=2),
+            ]
+        ).with_duration(2).with_framerate(8).with_resolution(64, 48).build()
+        timeline.render(self.output, options=VideoWriterOptions(width=64, height=48))
+
+        with av.open(self.output) as container:
+            self.assertEqual(len(container.streams.audio), 1)
+            times = [
+                packet.dts * packet.time_base
+                for packet in container.demux()
+                if packet.dts is not None
+            ]
+        self.assertEqual(times, sorted(times))
+
+
+# run command: python -m unittest discover tests -v
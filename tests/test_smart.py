@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from media import decode, make_video
+
+from composery import Timeline
+from composery.components import Text, Video
+from composery.renderer.options import VideoWriterOptions
+from composery.renderer.smart import get_dirty_ranges
+
+FRAMERATE = 8
+DURATION = 4
+
+
+class TestSmartRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.mp4")
+        self.output = os.path.join(self.directory.name, "output.mp4")
+        make_video(self.source, FRAMERATE, DURATION, gop_size=8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_dirty_ranges_merge_consecutive_gops(self):
+        gops = [(0, 8, 8, True), (8, 16, 8, False), (16, 24, 8, False)]
+        gops += [(24, 32, 8, True), (32, 36, 0, False)]
+        self.assertEqual(get_dirty_ranges(gops), [(8, 24), (32, 36)])
+
+    def build(self) -> Timeline:
+        timeline = Timeline()
+        timeline.add_composition(
+            [
+                Video(
+                    source=self.source,
+                    start_at=0,
+                    duration=DURATION,
+                    width=64,
+                    height=48,
+                    allow_audio=False,
+                ),
+                Text(content="Caption", start_at=1.25, duration=0.5, z_index=1),
+            ]
+        ).with_duration(DURATION).with_framerate(FRAMERATE).with_resolution(
+            64, 48
+        ).build()
+        return timeline
+
+    def test_copies_gops_without_overlays(self):
+        timeline = self.build()
+        options = VideoWriterOptions(width=64, height=48, smart_render=True)
+        render_stats = timeline.render(self.output, options=options)
+
+        self.assertEqual(render_stats.counters["copied_frames"], 24)
+        frames, source_frames = decode(self.output), decode(self.source)
+        self.assertEqual(len(frames), DURATION * FRAMERATE)
+        # Only the GOP of the caption is encoded again
+        for index in (*range(8), *range(16, 32)):
+            np.testing.assert_array_equal(frames[index], source_frames[index])
+
+    def test_lossless_output_is_not_spliced(self):
+        timeline = self.build()
+        reference = os.path.join(self.directory.name, "reference.mp4")
+        timeline.render(
+            reference, options=VideoWriterOptions(width=64, height=48, crf=0)
+        )
+        options = VideoWriterOptions(width=64, height=48, crf=0, smart_render=True)
+        with self.assertLogs("composery", level="INFO") as logs:
+            render_stats = timeline.render(self.output, options=options)
+
+        self.assertIn(
+            "INFO:composery:Smart render disabled: the output is lossless", logs.output
+        )
+        self.assertNotIn("copied_frames", render_stats.counters)
+        frames, reference_frames = decode(self.output), decode(reference)
+        self.assertEqual(len(frames), DURATION * FRAMERATE)
+        for frame, reference_frame in zip(frames, reference_frames):
+            np.testing.assert_array_equal(frame, reference_frame)
+
+
+# run command: python -m unittest discover tests -v
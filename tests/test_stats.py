@@ -0,0 +1,77 @@
+import io
+import unittest
+from threading import Barrier, Thread
+
+from composery import Timeline
+from composery.components import Text
+from composery.renderer.options import VideoWriterOptions
+from composery.stats import RenderStats
+
+
+class TestRenderStats(unittest.TestCase):
+    def test_stages_counters_and_merge(self):
+        render_stats = RenderStats(trace=True)
+        for _ in range(3):
+            with render_stats.timer("encode"):
+                pass
+        render_stats.count("frames", 2)
+        render_stats.merge(
+            {"stages": {"encode": {"time": 1.0, "calls": 1}}, "counters": {"frames": 3}}
+        )
+        render_stats.finish()
+        data = render_stats.to_dict()
+        self.assertEqual(data["stages"]["encode"]["calls"], 4)
+        self.assertGreaterEqual(data["stages"]["encode"]["time"], 1.0)
+        self.assertEqual(data["frames"], 5)
+        events = render_stats.to_chrome_trace()["traceEvents"]
+        self.assertEqual([event["name"] for event in events], ["encode"] * 3)
+        self.assertTrue(all(event["ph"] == "X" for event in events))
+
+    def test_render_reports_progress_and_stats(self):
+        timeline = Timeline()
+        timeline.add_composition(
+            [Text(content="Stats", start_at=0, duration=1, z_index=1)]
+        ).with_duration(1).with_framerate(8).with_resolution(64, 48).build()
+        progress = []
+        render_stats = timeline.render(
+            io.BytesIO(),
+            options=VideoWriterOptions(width=64, height=48, framerate=8),
+            progress=lambda done, total, fps: progress.append((done, total)),
+        )
+        self.assertEqual(progress, [(done, 8) for done in range(1, 9)])
+        data = render_stats.to_dict()
+        self.assertEqual(data["frames"], 8)
+        self.assertEqual(data["counters"]["reused_frames"], 7)
+        for stage in ("composite", "convert", "encode", "mux", "mix"):
+            self.assertIn(stage, data["stages"])
+
+    def test_concurrent_renders_record_their_own_stats(self):
+        timelines = []
+        for duration in (1, 2):
+            timeline = Timeline()
+            timeline.add_composition(
+                [Text(content="Stats", start_at=0, duration=duration, z_index=1)]
+            ).with_duration(duration).with_framerate(8).with_resolution(64, 48).build()
+            timelines.append(timeline)
+        # The frames are produced and encoded on the threads of the pipeline,
+        # which record to the stats of their render
+        options = VideoWriterOptions(width=64, height=48, framerate=8, pipeline_depth=2)
+        barrier = Barrier(len(timelines))
+        results = {}
+
+        def render(timeline: Timeline) -> None:
+            barrier.wait()
+            results[timeline] = timeline.render(io.BytesIO(), options=options)
+
+        threads = [Thread(target=render, args=(timeline,)) for timeline in timelines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for timeline, frames in zip(timelines, (8, 16)):
+            data = results[timeline].to_dict()
+            self.assertEqual(data["frames"], frames)
+            self.assertIn("encode", data["stages"])
+
+
+# run command: python -m unittest discover tests -v
@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from composery.components.text import DEFAULT_TEXT_STYLE, Text, get_font
+from composery.renderer.processors.text import (
+    TextCache,
+    TextRasterizer,
+    get_text_frame,
+    get_text_key,
+)
+
+STYLE = DEFAULT_TEXT_STYLE.model_copy(update={"font_size": 12})
+
+
+class TestTextCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_depends_on_content_and_style(self):
+        key = get_text_key("Subscribe!", STYLE)
+        self.assertEqual(key, get_text_key("Subscribe!", STYLE.model_copy()))
+        self.assertNotEqual(key, get_text_key("Subscribe", STYLE))
+        other_style = STYLE.model_copy(update={"color": "red"})
+        self.assertNotEqual(key, get_text_key("Subscribe!", other_style))
+
+    def test_identical_texts_are_rasterized_once(self):
+        cache = TextCache()
+        texts = [
+            Text(content="Subscribe!", start_at=i, duration=1, style=STYLE)
+            for i in range(3)
+        ]
+        with mock.patch(
+            "composery.renderer.processors.text.TEXT_CACHE", cache
+        ), mock.patch.object(
+            Text, "generate_frame", return_value=Image.new("RGBA", (8, 8))
+        ) as generate_frame:
+            images = [get_text_frame(text) for text in texts]
+        generate_frame.assert_called_once()
+        self.assertTrue(all(image is images[0] for image in images))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_rasterizer_fills_the_cache(self):
+        cache = TextCache()
+        texts = [
+            Text(content=content, start_at=i, duration=1, style=STYLE)
+            for i, content in enumerate(["Speaker", "Subscribe!", "Speaker"])
+        ]
+        with mock.patch("composery.renderer.processors.text.TEXT_CACHE", cache):
+            rasterizer = TextRasterizer(texts, workers=2)
+            self.assertEqual(len(rasterizer), 2)
+            self.assertGreater(rasterizer.wait(), 0)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(
+                get_text_frame(texts[2]).tobytes(),
+                texts[0].generate_frame().tobytes(),
+            )
+
+    def test_evicts_least_recently_used(self):
+        image_size = 8 * 8 * 4
+        cache = TextCache(max_size=image_size * 2)
+        for key in ("a", "b"):
+            cache.put(key, Image.new("RGBA", (8, 8)))
+        cache.get("a")
+        cache.put("c", Image.new("RGBA", (8, 8)))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.size, image_size * 2)
+
+    def test_disk_tier_is_shared_between_caches(self):
+        image = Image.new("RGBA", (8, 8), (255, 0, 0, 128))
+        TextCache(directory=self.directory.name).put("key", image)
+        cache = TextCache(directory=self.directory.name)
+        loaded = cache.get("key")
+        assert loaded is not None
+        self.assertEqual(loaded.tobytes(), image.tobytes())
+        self.assertEqual((cache.disk_hits, cache.misses), (1, 0))
+        self.assertIs(cache.get("key"), loaded)
+
+    def test_fonts_are_loaded_once(self):
+        self.assertIs(get_font(STYLE.font_path, 12), get_font(STYLE.font_path, 12))
+
+
+# run command: python -m unittest discover tests -v